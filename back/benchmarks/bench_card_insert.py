@@ -0,0 +1,124 @@
+"""Скорость записи карточек: по строке через ORM и пачкой через FlashcardRepository.
+
+    python -m back.benchmarks.bench_card_insert [--rows 100 1000 5000] [--repeat 3] [--url URL]
+
+По умолчанию база — временный файл SQLite. Для Postgres передайте --url
+(или DATABASE_URL) пустой тестовой базы: таблицы создаются через create_all,
+строки бенчмарка удаляются после каждого замера.
+
+Режимы:
+  orm-commit  — db.add + commit на каждую карточку (прежняя потоковая запись);
+  orm-add     — db.add на каждую карточку, один commit;
+  bulk        — FlashcardRepository.replace: DELETE и один executemany INSERT.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from back.db.database import Base
+import back.models.user  # noqa: F401
+import back.models.refresh_token  # noqa: F401
+import back.models.upload  # noqa: F401
+from back.models.flashcards import Flashcard
+from back.models.upload import Upload, UploadStatus
+from back.models.user import User
+from back.repositories.flashcards import FlashcardRepository
+
+repo = FlashcardRepository()
+
+
+def _cards(count: int) -> list[dict]:
+    return [{"q": f"Вопрос {i}?", "a": f"Ответ {i} " * 8} for i in range(count)]
+
+
+def orm_commit(db, upload_id: int, cards: list[dict]):
+    db.query(Flashcard).filter(Flashcard.upload_id == upload_id).delete()
+    db.commit()
+    for card in cards:
+        db.add(Flashcard(upload_id=upload_id, question=card["q"], answer=card["a"]))
+        db.commit()
+
+
+def orm_add(db, upload_id: int, cards: list[dict]):
+    db.query(Flashcard).filter(Flashcard.upload_id == upload_id).delete()
+    for card in cards:
+        db.add(Flashcard(upload_id=upload_id, question=card["q"], answer=card["a"]))
+    db.commit()
+
+
+def bulk(db, upload_id: int, cards: list[dict]):
+    repo.replace(db, upload_id, cards)
+    db.commit()
+
+
+MODES = {"orm-commit": orm_commit, "orm-add": orm_add, "bulk": bulk}
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--url", default=os.getenv("BENCH_DATABASE_URL"))
+    args = parser.parse_args()
+
+    tmp = None
+    url = args.url
+    if not url:
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        url = f"sqlite:///{tmp.name}"
+
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    db = Session()
+
+    user = User(username=f"bench-{time.time_ns()}", hashed_password="-")
+    db.add(user)
+    db.commit()
+    upload = Upload(
+        user_id=user.id,
+        filename="bench.pdf",
+        title="bench",
+        object_key=f"bench/{user.username}.pdf",
+        content_type="application/pdf",
+        size=0,
+        status=UploadStatus.done,
+    )
+    db.add(upload)
+    db.commit()
+
+    print(f"database: {engine.dialect.name}")
+    print(f"{'rows':>6} " + " ".join(f"{name + ', rows/s':>18}" for name in MODES))
+    try:
+        for count in args.rows:
+            cards = _cards(count)
+            rates = []
+            for fn in MODES.values():
+                elapsed = _best_of(args.repeat, lambda: fn(db, upload.id, cards))
+                rates.append(count / elapsed)
+            print(f"{count:>6} " + " ".join(f"{rate:>18,.0f}" for rate in rates))
+    finally:
+        db.delete(upload)
+        db.delete(user)
+        db.commit()
+        db.close()
+        engine.dispose()
+        if tmp:
+            os.unlink(tmp.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Сравнение бэкендов извлечения текста на своём корпусе PDF.
+
+    python -m back.benchmarks.bench_extractors path/to/*.pdf
+    python -m back.benchmarks.bench_extractors --generated 50
+
+Каждый документ прогоняется через каждый бэкенд без fallback, затем — через
+режим по умолчанию (pdfium + pdfplumber для пустых страниц).
+"""
+import argparse
+import time
+from pathlib import Path
+
+from back.benchmarks.sample_pdf import make_book
+from back.services import pdf_parser
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*", type=Path)
+    parser.add_argument("--generated", type=int, default=0, help="добавить сгенерированный документ на N страниц")
+    args = parser.parse_args()
+
+    corpus = [(path.name, path.read_bytes()) for path in args.files]
+    if args.generated:
+        corpus.append((f"generated-{args.generated}p", make_book(args.generated)))
+    if not corpus:
+        parser.error("нужен хотя бы один PDF или --generated N")
+
+    print(f"{'document':<32} {'backend':<12} {'pages':>6} {'ms/page':>9} {'chars':>9}")
+    for name, data in corpus:
+        for backend in pdf_parser.EXTRACTORS.values():
+            count = backend.page_count(data)
+            started = time.perf_counter()
+            texts = backend.extract(data, list(range(count)))
+            elapsed = time.perf_counter() - started
+            print(
+                f"{name[:32]:<32} {backend.name:<12} {count:>6} "
+                f"{elapsed * 1000 / max(count, 1):>9.2f} {sum(map(len, texts)):>9}"
+            )
+
+    pdf_parser.reset_extractor_stats()
+    for _, data in corpus:
+        pdf_parser.extract_pages_from_pdf_bytes(data, max_pages=None, parallel=False)
+
+    print("\ndefault pipeline:")
+    for backend, stats in pdf_parser.get_extractor_stats().items():
+        print(f"  {backend:<12} pages={stats['pages']:<6} ms/page={stats['ms_per_page']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Пропускная способность проверки паролей (логинов в секунду) на пуле argon2.
+
+    python -m back.benchmarks.bench_login [--logins 64] [--workers 1 2 4] [--target-ms 250]
+
+Для каждого размера пула отправляется --logins одновременных проверок
+одного пароля и считаются логины в секунду — всего и на одно ядро
+(min(workers, число CPU)). С --target-ms сначала подбирается time_cost,
+как это делает API при PASSWORD_HASH_TARGET_MS.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from back.services import auth, passwords
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, max(cpus // 2, 1), cpus}))
+    parser.add_argument("--target-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.target_ms:
+        time_cost, elapsed = passwords.calibrate(args.target_ms)
+        passwords.configure_cost(
+            time_cost=time_cost,
+            memory_cost=passwords.PASSWORD_ARGON2_MEMORY_COST,
+            parallelism=passwords.PASSWORD_ARGON2_PARALLELISM,
+        )
+        print(f"calibrated time_cost={time_cost} ({elapsed:.1f} ms per hash, target {args.target_ms:.0f} ms)")
+
+    print(f"cost: {passwords.current_cost()}  cpus: {cpus}")
+    hashed = auth.hash_password("benchmark-password")
+
+    print(f"{'workers':>7} {'logins/s':>10} {'logins/s/core':>14} {'p50 ms':>8}")
+    for workers in args.workers:
+        pool = passwords.HashingPool(workers, max_queue=args.logins, max_wait=600)
+        latencies = []
+
+        def login():
+            started = time.perf_counter()
+            pool.run(auth.verify_password, "benchmark-password", hashed)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        # Клиентских потоков столько же, сколько логинов: все запросы приходят разом.
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.logins) as clients:
+            list(clients.map(lambda _: login(), range(args.logins)))
+        elapsed = time.perf_counter() - started
+        pool.shutdown()
+
+        rate = args.logins / elapsed
+        p50 = sorted(latencies)[len(latencies) // 2]
+        print(f"{workers:>7} {rate:>10.1f} {rate / min(workers, cpus):>14.1f} {p50:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
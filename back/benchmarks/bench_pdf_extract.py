@@ -0,0 +1,50 @@
+"""Сравнение последовательного и параллельного извлечения текста из PDF.
+
+    python -m back.benchmarks.bench_pdf_extract [--pages 10 50 100 300] [--repeat 3]
+
+Пул процессов прогревается до замеров, поэтому в результатах нет стоимости
+запуска воркеров — как и в долгоживущем процессе API.
+"""
+import argparse
+import time
+
+from back.benchmarks.sample_pdf import make_book
+from back.services import pdf_parser
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 100, 300])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk", type=int, default=None, help="страниц на чанк (по умолчанию PDF_PAGES_PER_CHUNK)")
+    args = parser.parse_args()
+
+    pdf_parser.extract_pages_from_pdf_bytes(make_book(pdf_parser.PDF_POOL_SIZE), max_pages=None, parallel=True)
+
+    print(f"pool size: {pdf_parser.PDF_POOL_SIZE}")
+    print(f"{'pages':>6} {'sequential, s':>14} {'parallel, s':>12} {'speedup':>8}")
+    for count in args.pages:
+        data = make_book(count)
+        seq = _best_of(args.repeat, lambda: pdf_parser.extract_pages_from_pdf_bytes(data, max_pages=None, parallel=False))
+        par = _best_of(
+            args.repeat,
+            lambda: pdf_parser.extract_pages_from_pdf_bytes(
+                data, max_pages=None, parallel=True, pages_per_chunk=args.chunk
+            ),
+        )
+        print(f"{count:>6} {seq:>14.3f} {par:>12.3f} {seq / par:>7.2f}x")
+
+    pdf_parser.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
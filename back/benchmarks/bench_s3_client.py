@@ -0,0 +1,55 @@
+"""Задержка вызова S3 с новым клиентом на каждый вызов и с общим клиентом.
+
+    python -m back.benchmarks.bench_s3_client [--calls 200] [--live]
+
+Без --live замеряется generate_presigned_url: сеть не нужна, и разница
+целиком приходится на создание клиента (загрузку моделей botocore).
+С --live дополнительно выполняется head_bucket к S3_ENDPOINT_URL, где
+общий клиент ещё и переиспользует keep-alive соединения.
+"""
+import argparse
+import statistics
+import time
+
+from back.services import storage
+
+
+def _measure(calls: int, get_client, op) -> list[float]:
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        op(get_client())
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def _report(name: str, samples: list[float]):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<28} mean={statistics.mean(samples):8.3f} ms  p50={statistics.median(samples):8.3f} ms  p95={p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--live", action="store_true")
+    args = parser.parse_args()
+
+    def presign(client):
+        client.generate_presigned_url(
+            "get_object", Params={"Bucket": storage.S3_BUCKET_NAME, "Key": "bench.pdf"}, ExpiresIn=60
+        )
+
+    def head(client):
+        client.head_bucket(Bucket=storage.S3_BUCKET_NAME)
+
+    ops = [("presign", presign)] + ([("head_bucket", head)] if args.live else [])
+
+    storage.get_s3_client()
+    for op_name, op in ops:
+        _report(f"{op_name}: new client/call", _measure(args.calls, storage.build_s3_client, op))
+        _report(f"{op_name}: shared client", _measure(args.calls, storage.get_s3_client, op))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Генератор простых текстовых PDF для бенчмарков и тестов (без внешних зависимостей)."""
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(lines: list[str]) -> bytes:
+    ops = ["BT", "/F1 11 Tf", "14 TL", "50 790 Td"]
+    for line in lines:
+        ops.append(f"({_escape(line)}) Tj T*")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1", "replace")
+
+
+def make_text_pdf(pages: list[str]) -> bytes:
+    """Собирает PDF, в котором каждая строка pages — текст отдельной страницы."""
+    objects: list[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    catalog_id = add(b"")
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    page_ids = []
+    for text in pages:
+        stream = _page_stream(text.splitlines() or [""])
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(
+            add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                % (pages_id, font_id, content_id)
+            )
+        )
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids).encode()
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        catalog_id,
+        xref_at,
+    )
+    return bytes(out)
+
+
+def make_book(page_count: int, lines_per_page: int = 40) -> bytes:
+    pages = []
+    for p in range(page_count):
+        pages.append(
+            "\n".join(
+                f"Page {p + 1} line {i + 1}: the quick brown fox jumps over the lazy dog."
+                for i in range(lines_per_page)
+            )
+        )
+    return make_text_pdf(pages)
@@ -1,13 +1,27 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
-from back.routers import upload, auth, uploads, cards, ai, events, books
+from back.routers import upload, auth, uploads, cards, ai, events, books, metrics
+from back.services import passwords, storage, token_sweeper
 
-app = FastAPI(title="PDF Flashcards API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    storage.start_warm_up()
+    passwords.calibrate_on_startup()
+    sweeper = token_sweeper.start()
+    yield
+    if sweeper:
+        sweeper.cancel()
+    passwords.pool.shutdown()
+
+
+app = FastAPI(title="PDF Flashcards API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +39,7 @@ app.include_router(cards.router)
 app.include_router(ai.router)
 app.include_router(events.router)
 app.include_router(books.router)
+app.include_router(metrics.router)
 
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime, JSON
+from datetime import datetime
+
+from back.db.database import Base
+
+
+class BookSearchCacheEntry(Base):
+    """Ответ Google Books на нормализованный запрос; переживает перезапуск API."""
+
+    __tablename__ = "book_search_cache"
+
+    key = Column(String(64), primary_key=True)
+    query = Column(String, nullable=False)
+    items = Column(JSON, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # После expires_at запись устарела, но ещё отдаётся, когда внешний API недоступен.
+    expires_at = Column(DateTime, nullable=False, index=True)
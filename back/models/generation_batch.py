@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+
+from back.db.database import Base
+
+
+class GenerationBatch(Base):
+    """Группа задач генерации, поставленных одним запросом /ai/generate_cards/batch."""
+
+    __tablename__ = "generation_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    priority = Column(Integer, default=0, nullable=False)
+    # Сколько задач пакета воркеры выполняют одновременно.
+    max_parallel = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
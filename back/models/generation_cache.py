@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from datetime import datetime
+
+from back.db.database import Base
+
+
+class GenerationCacheEntry(Base):
+    """Результат генерации для одного набора входов: текста, модели, версии промпта и числа карточек."""
+
+    __tablename__ = "generation_cache"
+
+    key = Column(String(64), primary_key=True)
+    text_hash = Column(String(64), nullable=False)
+    model = Column(String, nullable=False)
+    prompt_version = Column(String, nullable=False)
+    max_cards = Column(Integer, nullable=False)
+    cards = Column(JSON, nullable=False)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # По last_used_at вытесняются самые давно не использованные записи.
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    hits = Column(Integer, default=0, nullable=False)
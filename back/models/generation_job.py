@@ -0,0 +1,53 @@
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Enum, ForeignKey, Index
+from datetime import datetime
+import enum
+
+from back.db.database import Base
+
+
+class JobStatus(str, enum.Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    error = "error"
+    cancelled = "cancelled"
+
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    upload_id = Column(Integer, ForeignKey("uploads.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    batch_id = Column(Integer, ForeignKey("generation_batches.id", ondelete="CASCADE"), nullable=True, index=True)
+    # Больше — раньше; внутри одного приоритета очередь чередует пользователей.
+    priority = Column(Integer, default=0, nullable=False)
+
+    status = Column(Enum(JobStatus), default=JobStatus.queued, nullable=False)
+
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    # Ограничение числа окон текста для этой задачи; None — GEN_MAX_WINDOWS.
+    max_windows = Column(Integer, nullable=True)
+    # Генерировать заново, не заглядывая в кэш генерации.
+    force = Column(Boolean, default=False, nullable=False)
+    # Запрошена отмена выполняющейся задачи; воркер замечает флаг и обрывает генерацию.
+    cancel_requested = Column(Boolean, default=False, nullable=False)
+
+    # Очередь выдаёт задачу только после run_after (используется для backoff при повторах).
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Пока задача running, воркер продлевает locked_until; истёкшая блокировка = упавший воркер.
+    locked_until = Column(DateTime, nullable=True)
+    # Аренда: уникальный токен каждого захвата. Завершить задачу может только её владелец —
+    # воркер, чью блокировку сочли истёкшей, не перезапишет результат нового.
+    locked_by = Column(String(32), nullable=True)
+
+    last_error = Column(String, nullable=True)
+    created = Column(Integer, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+Index("ix_generation_jobs_status_run_after", GenerationJob.status, GenerationJob.run_after)
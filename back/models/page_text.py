@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, Text
+from back.db.database import Base
+
+
+class PageText(Base):
+    """Извлечённый текст страницы PDF. Общий для всех загрузок с одинаковым содержимым."""
+
+    __tablename__ = "page_texts"
+
+    content_hash = Column(String(64), primary_key=True)
+    page_no = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False, default="")
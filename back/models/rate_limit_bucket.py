@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Float, Integer
+from back.db.database import Base
+
+
+class RateLimitBucket(Base):
+    """Состояние token bucket, общее для всех процессов API.
+
+    tokens — остаток на момент updated_at (unix-время в секундах); пополнение
+    до текущего момента досчитывается при каждом обращении. version растёт с
+каждой записью: по нему условное обновление замечает конкурентную запись.
+    """
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String(128), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+
+from back.db.database import Base
+
+
+class StoredObject(Base):
+    """Объект в S3, общий для всех загрузок с одинаковым SHA-256 содержимого."""
+
+    __tablename__ = "stored_objects"
+
+    content_hash = Column(String(64), primary_key=True)
+    object_key = Column(String, unique=True, nullable=False)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
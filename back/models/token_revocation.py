@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from back.db.database import Base
+
+
+class TokenRevocation(Base):
+    """Журнал отзыва access-токенов; процессы API подтягивают его инкрементально по id.
+
+    min_version — токены пользователя с ver меньше этого значения недействительны;
+    sid — отозвана одна сессия (jti refresh-токена, с которым выдан access-токен).
+    После expires_at все затронутые токены истекли сами, и запись можно удалять.
+    """
+    __tablename__ = "token_revocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    min_version = Column(Integer, nullable=True)
+    sid = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
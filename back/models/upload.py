@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -20,14 +20,19 @@ class Upload(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
     title = Column(String, nullable=False)
-    object_key = Column(String, unique=True, nullable=False)
+    # Несколько загрузок одного и того же файла ссылаются на общий объект (см. StoredObject).
+    object_key = Column(String, nullable=False, index=True)
     content_type = Column(String, nullable=False)
     size = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)
+    page_count = Column(Integer, nullable=True)
 
     timestamp = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
 
     status = Column(Enum(UploadStatus), default=UploadStatus.uploaded, nullable=False)
+    # Растёт при каждом изменении набора карточек; из него строится ETag GET /cards.
+    cards_version = Column(Integer, default=0, nullable=False)
 
     user = relationship("User", back_populates="uploads")
     cards = relationship(
@@ -35,4 +40,9 @@ class Upload(Base):
         backref="upload",
         cascade="all, delete-orphan",
         passive_deletes=True,
-    )
\ No newline at end of file
+    )
+
+
+# id замыкает индекс: по (поле, id) идут ORDER BY и условие курсора в GET /uploads.
+Index("ix_uploads_user_timestamp", Upload.user_id, Upload.timestamp, Upload.id)
+Index("ix_uploads_user_title", Upload.user_id, Upload.title, Upload.id)
@@ -18,6 +18,8 @@ class User(Base):
     hashed_password = Column(String)
 
     role = Column(Enum(UserRole), default=UserRole.user, nullable=False)
+    # Входит в access-токены; увеличение отзывает все выданные токены (см. token_revocation).
+    token_version = Column(Integer, default=0, nullable=False)
 
     uploads = relationship("Upload", back_populates="user")
 
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from back.models.book_search_cache import BookSearchCacheEntry
+
+
+class BookSearchCacheRepository:
+    def get(self, db: Session, key: str) -> BookSearchCacheEntry | None:
+        """Запись по ключу, в том числе устаревшая — свежесть проверяет вызывающий по expires_at."""
+        return db.query(BookSearchCacheEntry).filter(BookSearchCacheEntry.key == key).first()
+
+    def put(self, db: Session, *, key: str, query: str, items: list[dict], ttl: float) -> None:
+        now = datetime.utcnow()
+        db.merge(
+            BookSearchCacheEntry(
+                key=key,
+                query=query,
+                items=items,
+                created_at=now,
+                expires_at=now + timedelta(seconds=ttl),
+            )
+        )
+        try:
+            db.commit()
+        except IntegrityError:
+            # Тот же запрос параллельно записал другой процесс.
+            db.rollback()
+
+    def evict(self, db: Session, *, stale_ttl: float) -> int:
+        """Удаляет записи, устаревшие больше чем на stale_ttl секунд."""
+        deleted = (
+            db.query(BookSearchCacheEntry)
+            .filter(BookSearchCacheEntry.expires_at < datetime.utcnow() - timedelta(seconds=stale_ttl))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return deleted
+
+    def stats(self, db: Session) -> dict:
+        return {"entries": db.query(func.count(BookSearchCacheEntry.key)).scalar()}
@@ -0,0 +1,36 @@
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from back.models.flashcards import Flashcard
+from back.models.upload import Upload
+
+
+class FlashcardRepository:
+    """Запись карточек пачками: один INSERT на набор строк вместо unit-of-work на каждую.
+
+    Методы не коммитят — границы транзакции задаёт вызывающий. Каждое изменение
+    увеличивает Upload.cards_version в той же транзакции.
+    """
+
+    def insert_many(self, db: Session, upload_id: int, cards: list[dict]) -> int:
+        """cards — [{"q": ..., "a": ...}]; вставляются одним executemany."""
+        if not cards:
+            return 0
+        db.execute(
+            insert(Flashcard),
+            [{"upload_id": upload_id, "question": card["q"], "answer": card["a"]} for card in cards],
+        )
+        self._bump_version(db, upload_id)
+        return len(cards)
+
+    def replace(self, db: Session, upload_id: int, cards: list[dict]) -> int:
+        """Заменяет набор карточек загрузки; до commit читатели видят прежний набор."""
+        db.query(Flashcard).filter(Flashcard.upload_id == upload_id).delete(synchronize_session=False)
+        if not cards:
+            self._bump_version(db, upload_id)
+        return self.insert_many(db, upload_id, cards)
+
+    def _bump_version(self, db: Session, upload_id: int) -> None:
+        db.query(Upload).filter(Upload.id == upload_id).update(
+            {"cards_version": Upload.cards_version + 1}, synchronize_session=False
+        )
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from back.models.generation_cache import GenerationCacheEntry
+
+
+class GenerationCacheRepository:
+    def get(self, db: Session, key: str, *, ttl: int) -> GenerationCacheEntry | None:
+        """Запись по ключу, если она не старше ttl секунд; попадание обновляет last_used_at."""
+        entry = db.query(GenerationCacheEntry).filter(GenerationCacheEntry.key == key).first()
+        if not entry:
+            return None
+
+        now = datetime.utcnow()
+        if entry.created_at < now - timedelta(seconds=ttl):
+            db.delete(entry)
+            db.commit()
+            return None
+
+        entry.last_used_at = now
+        entry.hits += 1
+        db.commit()
+        return entry
+
+    def put(
+        self,
+        db: Session,
+        *,
+        key: str,
+        text_hash: str,
+        model: str,
+        prompt_version: str,
+        max_cards: int,
+        cards: list[dict],
+    ) -> None:
+        now = datetime.utcnow()
+        db.merge(
+            GenerationCacheEntry(
+                key=key,
+                text_hash=text_hash,
+                model=model,
+                prompt_version=prompt_version,
+                max_cards=max_cards,
+                cards=cards,
+                created_at=now,
+                last_used_at=now,
+                hits=0,
+            )
+        )
+        try:
+            db.commit()
+        except IntegrityError:
+            # Тот же результат параллельно записала другая задача.
+            db.rollback()
+
+    def evict(self, db: Session, *, ttl: int, max_entries: int) -> int:
+        """Удаляет просроченные записи и самые давно использованные сверх max_entries."""
+        expired = (
+            db.query(GenerationCacheEntry)
+            .filter(GenerationCacheEntry.created_at < datetime.utcnow() - timedelta(seconds=ttl))
+            .delete(synchronize_session=False)
+        )
+
+        overflow = 0
+        total = db.query(func.count(GenerationCacheEntry.key)).scalar()
+        if total > max_entries:
+            stale = (
+                db.query(GenerationCacheEntry.key)
+                .order_by(GenerationCacheEntry.last_used_at.asc())
+                .limit(total - max_entries)
+                .subquery()
+            )
+            overflow = (
+                db.query(GenerationCacheEntry)
+                .filter(GenerationCacheEntry.key.in_(db.query(stale.c.key)))
+                .delete(synchronize_session=False)
+            )
+
+        db.commit()
+        return expired + overflow
+
+    def stats(self, db: Session) -> dict:
+        entries, hits = db.query(func.count(GenerationCacheEntry.key), func.sum(GenerationCacheEntry.hits)).one()
+        return {"entries": entries, "hits": hits or 0}
@@ -0,0 +1,364 @@
+import uuid
+
+from sqlalchemy import exists, func, or_
+from sqlalchemy.orm import Session, aliased
+from datetime import datetime, timedelta
+
+from back.models.generation_batch import GenerationBatch
+from back.models.generation_job import GenerationJob, JobStatus
+from back.models.upload import Upload, UploadStatus
+
+
+ACTIVE_STATUSES = (JobStatus.queued, JobStatus.running)
+
+
+class GenerationJobRepository:
+    def enqueue(
+        self,
+        db: Session,
+        *,
+        upload_id: int,
+        user_id: int,
+        max_attempts: int,
+        max_windows: int | None = None,
+        force: bool = False,
+        batch_id: int | None = None,
+        priority: int = 0,
+        commit: bool = True,
+    ) -> GenerationJob:
+        """commit=False — только flush: задача войдёт в транзакцию вызывающего."""
+        job = GenerationJob(
+            upload_id=upload_id,
+            user_id=user_id,
+            status=JobStatus.queued,
+            max_attempts=max_attempts,
+            max_windows=max_windows,
+            force=force,
+            batch_id=batch_id,
+            priority=priority,
+            run_after=datetime.utcnow(),
+        )
+        db.add(job)
+        self._finish(db, job, commit)
+        return job
+
+    def _finish(self, db: Session, obj, commit: bool) -> None:
+        if commit:
+            db.commit()
+            db.refresh(obj)
+        else:
+            db.flush()
+
+    def get(self, db: Session, job_id: int) -> GenerationJob | None:
+        return db.query(GenerationJob).filter(GenerationJob.id == job_id).first()
+
+    def get_active_for_upload(self, db: Session, upload_id: int) -> GenerationJob | None:
+        return (
+            db.query(GenerationJob)
+            .filter(
+                GenerationJob.upload_id == upload_id,
+                GenerationJob.status.in_(ACTIVE_STATUSES),
+                GenerationJob.cancel_requested.is_(False),
+            )
+            .order_by(GenerationJob.id.desc())
+            .first()
+        )
+
+    def count_active(self, db: Session, *, user_id: int | None = None) -> int:
+        query = db.query(GenerationJob).filter(GenerationJob.status.in_(ACTIVE_STATUSES))
+        if user_id is not None:
+            query = query.filter(GenerationJob.user_id == user_id)
+        return query.count()
+
+    def _running_by(self, db: Session, column):
+        return (
+            db.query(column.label("owner"), func.count(GenerationJob.id).label("running"))
+            .filter(GenerationJob.status == JobStatus.running)
+            .group_by(column)
+            .subquery()
+        )
+
+    def claim_next(
+        self,
+        db: Session,
+        *,
+        visibility_timeout: int,
+        batch: int = 5,
+        max_running_per_user: int | None = None,
+    ) -> GenerationJob | None:
+        """Забирает следующую задачу с учётом приоритета и честности между пользователями.
+
+        Сначала идут задачи с большим priority, среди равных — пользователей,
+        у которых сейчас выполняется меньше всего задач. Пользователь с
+        max_running_per_user выполняющимися задачами и пакет, достигший своего
+        max_parallel, пропускаются, как и загрузки, по которым ещё работает
+        прежняя (например, отменённая) задача. Лимиты проверяются без блокировок
+        и могут ненадолго превышаться при одновременном захвате.
+        """
+        now = datetime.utcnow()
+        per_user = self._running_by(db, GenerationJob.user_id)
+        per_batch = self._running_by(db, GenerationJob.batch_id)
+        previous = aliased(GenerationJob)
+        user_running = func.coalesce(per_user.c.running, 0)
+        batch_running = func.coalesce(per_batch.c.running, 0)
+
+        query = (
+            db.query(GenerationJob.id)
+            .outerjoin(per_user, per_user.c.owner == GenerationJob.user_id)
+            .outerjoin(per_batch, per_batch.c.owner == GenerationJob.batch_id)
+            .outerjoin(GenerationBatch, GenerationBatch.id == GenerationJob.batch_id)
+            .filter(
+                GenerationJob.status == JobStatus.queued,
+                GenerationJob.run_after <= now,
+                or_(GenerationJob.batch_id.is_(None), batch_running < GenerationBatch.max_parallel),
+                ~exists().where(previous.upload_id == GenerationJob.upload_id, previous.status == JobStatus.running),
+            )
+        )
+        if max_running_per_user is not None:
+            query = query.filter(user_running < max_running_per_user)
+
+        candidates = (
+            query.order_by(
+                GenerationJob.priority.desc(),
+                user_running.asc(),
+                GenerationJob.run_after.asc(),
+                GenerationJob.id.asc(),
+            )
+            .limit(batch)
+            .all()
+        )
+
+        for (job_id,) in candidates:
+            # Условный UPDATE: задачу забирает ровно один воркер, даже если несколько
+            # процессов увидели её одновременно.
+            claimed = (
+                db.query(GenerationJob)
+                .filter(GenerationJob.id == job_id, GenerationJob.status == JobStatus.queued)
+                .update(
+                    {
+                        "status": JobStatus.running,
+                        "attempts": GenerationJob.attempts + 1,
+                        "locked_until": now + timedelta(seconds=visibility_timeout),
+                        "locked_by": uuid.uuid4().hex,
+                        "started_at": now,
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db.commit()
+            if claimed:
+                return self.get(db, job_id)
+
+        return None
+
+    def _owned(self, db: Session, job_id: int, lease: str | None, *, expired: bool = False):
+        """Выполняющаяся задача, пока она принадлежит аренде lease (expired — и блокировка истекла)."""
+        owner = GenerationJob.locked_by.is_(None) if lease is None else GenerationJob.locked_by == lease
+        query = db.query(GenerationJob).filter(
+            GenerationJob.id == job_id,
+            GenerationJob.status == JobStatus.running,
+            owner,
+        )
+        if expired:
+            query = query.filter(GenerationJob.locked_until < datetime.utcnow())
+        return query
+
+    def _apply(self, db: Session, job: GenerationJob, query, values: dict) -> bool:
+        """Условный UPDATE вместе с изменениями сессии вызывающего; при 0 строк всё откатывается."""
+        if not query.update(values, synchronize_session=False):
+            db.rollback()
+            return False
+        db.commit()
+        db.refresh(job)
+        return True
+
+    def heartbeat(self, db: Session, job_id: int, *, lease: str | None, visibility_timeout: int) -> bool:
+        """Продлевает блокировку; False — аренда потеряна (задачу вернули в очередь или завершили)."""
+        updated = (
+            self._owned(db, job_id, lease)
+            .update(
+                {"locked_until": datetime.utcnow() + timedelta(seconds=visibility_timeout)},
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return bool(updated)
+
+    def complete(self, db: Session, job: GenerationJob, *, created: int, lease: str | None) -> bool:
+        """Завершает задачу, если аренда ещё своя; иначе откатывает и изменения вызывающего."""
+        return self._apply(
+            db,
+            job,
+            self._owned(db, job.id, lease),
+            {
+                "status": JobStatus.done,
+                "created": created,
+                "locked_until": None,
+                "locked_by": None,
+                "last_error": None,
+                "finished_at": datetime.utcnow(),
+            },
+        )
+
+    def fail(
+        self,
+        db: Session,
+        job: GenerationJob,
+        *,
+        error: str,
+        retry_delay: int | None,
+        lease: str | None,
+        expired: bool = False,
+        upload: Upload | None = None,
+    ) -> JobStatus | None:
+        """Возвращает задачу в очередь или переводит в error; None — аренда уже не своя.
+
+        При окончательной ошибке upload переводится в error в той же
+        транзакции, чтобы recover не успел поставить загрузку заново между
+        двумя записями.
+        """
+        values = {"last_error": error[:500], "locked_until": None, "locked_by": None}
+        if retry_delay is not None and job.attempts < job.max_attempts:
+            values.update(status=JobStatus.queued, run_after=datetime.utcnow() + timedelta(seconds=retry_delay))
+        else:
+            values.update(status=JobStatus.error, finished_at=datetime.utcnow())
+            if upload is not None:
+                upload.status = UploadStatus.error
+                db.add(upload)
+
+        if not self._apply(db, job, self._owned(db, job.id, lease, expired=expired), values):
+            return None
+        return values["status"]
+
+    def request_cancel(self, db: Session, job: GenerationJob, *, reason: str, commit: bool = True) -> None:
+        """Отменяет задачу: ожидающую — сразу, выполняющуюся — флагом для воркера.
+
+        Условные UPDATE не дают отменить как ожидающую задачу, которую воркер
+        только что забрал.
+        """
+        cancelled = (
+            db.query(GenerationJob)
+            .filter(GenerationJob.id == job.id, GenerationJob.status == JobStatus.queued)
+            .update(
+                {
+                    "status": JobStatus.cancelled,
+                    "cancel_requested": True,
+                    "last_error": reason,
+                    "locked_until": None,
+                    "finished_at": datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+        )
+        if not cancelled:
+            (
+                db.query(GenerationJob)
+                .filter(GenerationJob.id == job.id, GenerationJob.status == JobStatus.running)
+                .update({"cancel_requested": True, "last_error": reason}, synchronize_session=False)
+            )
+        if commit:
+            db.commit()
+        db.refresh(job)
+
+    def mark_cancelled(
+        self, db: Session, job: GenerationJob, *, reason: str, lease: str | None, expired: bool = False
+    ) -> bool:
+        return self._apply(
+            db,
+            job,
+            self._owned(db, job.id, lease, expired=expired),
+            {
+                "status": JobStatus.cancelled,
+                "cancel_requested": True,
+                "last_error": reason,
+                "locked_until": None,
+                "locked_by": None,
+                "finished_at": datetime.utcnow(),
+            },
+        )
+
+    def should_stop(self, db: Session, job_id: int) -> bool:
+        """True, если задачу больше не нужно выполнять: отмена запрошена или задачу удалили вместе с загрузкой."""
+        row = (
+            db.query(GenerationJob.status, GenerationJob.cancel_requested)
+            .filter(GenerationJob.id == job_id)
+            .first()
+        )
+        return row is None or row.cancel_requested or row.status != JobStatus.running
+
+    def list_active_for_uploads(self, db: Session, upload_ids: list[int]) -> list[GenerationJob]:
+        return (
+            db.query(GenerationJob)
+            .filter(GenerationJob.upload_id.in_(upload_ids), GenerationJob.status.in_(ACTIVE_STATUSES))
+            .all()
+        )
+
+    def list_expired(self, db: Session) -> list[GenerationJob]:
+        return (
+            db.query(GenerationJob)
+            .filter(
+                GenerationJob.status == JobStatus.running,
+                GenerationJob.locked_until < datetime.utcnow(),
+            )
+            .all()
+        )
+
+    def create_batch(
+        self, db: Session, *, user_id: int, priority: int, max_parallel: int, commit: bool = True
+    ) -> GenerationBatch:
+        batch = GenerationBatch(user_id=user_id, priority=priority, max_parallel=max_parallel)
+        db.add(batch)
+        self._finish(db, batch, commit)
+        return batch
+
+    def get_batch(self, db: Session, batch_id: int) -> GenerationBatch | None:
+        return db.query(GenerationBatch).filter(GenerationBatch.id == batch_id).first()
+
+    def list_batch_jobs(self, db: Session, batch_id: int) -> list[GenerationJob]:
+        return db.query(GenerationJob).filter(GenerationJob.batch_id == batch_id).order_by(GenerationJob.id).all()
+
+    def record_done(
+        self,
+        db: Session,
+        *,
+        upload_id: int,
+        user_id: int,
+        created: int,
+        batch_id: int | None = None,
+        priority: int = 0,
+        commit: bool = True,
+    ) -> GenerationJob:
+        """Завершённая задача без выполнения — результат взят из кэша генерации."""
+        now = datetime.utcnow()
+        job = GenerationJob(
+            upload_id=upload_id,
+            user_id=user_id,
+            batch_id=batch_id,
+            priority=priority,
+            status=JobStatus.done,
+            max_attempts=0,
+            created=created,
+            run_after=now,
+            started_at=now,
+            finished_at=now,
+        )
+        db.add(job)
+        self._finish(db, job, commit)
+        return job
+
+    def queue_stats(self, db: Session, *, since: datetime) -> dict:
+        counts = dict(
+            db.query(GenerationJob.status, func.count(GenerationJob.id))
+            .filter(GenerationJob.status.in_(ACTIVE_STATUSES) | (GenerationJob.finished_at >= since))
+            .group_by(GenerationJob.status)
+            .all()
+        )
+        finished = (
+            db.query(GenerationJob.started_at, GenerationJob.finished_at, GenerationJob.created)
+            .filter(GenerationJob.status == JobStatus.done, GenerationJob.finished_at >= since)
+            .all()
+        )
+        return {
+            "counts": {status.value: counts.get(status, 0) for status in JobStatus},
+            "finished": finished,
+        }
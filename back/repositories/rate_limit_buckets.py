@@ -0,0 +1,41 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from back.models.rate_limit_bucket import RateLimitBucket
+
+
+class RateLimitBucketRepository:
+    def load(self, db: Session, keys: list[str]) -> dict[str, tuple[float, float, int]]:
+        """{key: (tokens, updated_at, version)} для существующих корзин."""
+        rows = db.query(RateLimitBucket).filter(RateLimitBucket.key.in_(keys)).all()
+        return {row.key: (row.tokens, row.updated_at, row.version) for row in rows}
+
+    def save(self, db: Session, changes: dict[str, tuple[float, float, int | None]]) -> bool:
+        """Записывает {key: (tokens, updated_at, прочитанная version или None)} одной транзакцией.
+
+        Обновление условное: если корзину успел изменить другой процесс
+        (version уже не та) или создать её одновременно с нами, ничего не
+        записывается и возвращается False — вызывающий перечитывает состояние.
+        """
+        try:
+            for key, (tokens, updated_at, version) in sorted(changes.items()):
+                if version is None:
+                    db.add(RateLimitBucket(key=key, tokens=tokens, updated_at=updated_at, version=0))
+                    db.flush()
+                    continue
+                updated = (
+                    db.query(RateLimitBucket)
+                    .filter(RateLimitBucket.key == key, RateLimitBucket.version == version)
+                    .update(
+                        {"tokens": tokens, "updated_at": updated_at, "version": version + 1},
+                        synchronize_session=False,
+                    )
+                )
+                if not updated:
+                    db.rollback()
+                    return False
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
@@ -1,6 +1,8 @@
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from datetime import datetime
 from back.models.refresh_token import RefreshToken
+from back.models.user import User
 
 
 class RefreshTokenRepository:
@@ -20,6 +22,43 @@ class RefreshTokenRepository:
     def get_by_jti(self, db: Session, jti: str) -> RefreshToken | None:
         return db.query(RefreshToken).filter(RefreshToken.jti == jti).first()
 
+    def get_with_user(self, db: Session, jti: str) -> tuple[RefreshToken, User] | None:
+        """Токен и его владелец одним запросом — для ротации при /auth/refresh."""
+        return (
+            db.query(RefreshToken, User)
+            .join(User, User.id == RefreshToken.user_id)
+            .filter(RefreshToken.jti == jti)
+            .first()
+        )
+
+    def rotate(
+        self,
+        db: Session,
+        rt: RefreshToken,
+        *,
+        jti: str,
+        token_hash: str,
+        expires_at: datetime,
+    ) -> RefreshToken | None:
+        """Отзывает rt и создаёт ему замену в одной транзакции.
+
+        Отзыв — условный UPDATE: если тот же токен параллельно уже обменяли,
+        возвращается None и новый токен не создаётся.
+        """
+        revoked = (
+            db.query(RefreshToken)
+            .filter(RefreshToken.id == rt.id, RefreshToken.revoked == False)
+            .update({"revoked": True}, synchronize_session=False)
+        )
+        if not revoked:
+            db.rollback()
+            return None
+
+        new = RefreshToken(jti=jti, token_hash=token_hash, user_id=rt.user_id, expires_at=expires_at, revoked=False)
+        db.add(new)
+        db.commit()
+        return new
+
     def revoke(self, db: Session, rt: RefreshToken) -> None:
         rt.revoked = True
         db.add(rt)
@@ -32,10 +71,19 @@ class RefreshTokenRepository:
         ).update({"revoked": True})
         db.commit()
 
-    def delete_expired(self, db: Session) -> int:
-        now = datetime.utcnow()
-        q = db.query(RefreshToken).filter(RefreshToken.expires_at < now)
-        cnt = q.count()
-        q.delete(synchronize_session=False)
+    def delete_expired(self, db: Session, *, revoked_before: datetime | None = None, batch_size: int = 1000) -> int:
+        """Удаляет одну пачку истёкших (и отозванных раньше revoked_before) токенов.
+
+        Пачка ограничена batch_size, чтобы DELETE не держал долгих блокировок
+        на большой таблице; вызывающий повторяет, пока возвращается полная пачка.
+        """
+        condition = RefreshToken.expires_at < datetime.utcnow()
+        if revoked_before is not None:
+            condition = or_(condition, and_(RefreshToken.revoked == True, RefreshToken.created_at < revoked_before))
+
+        ids = [row_id for (row_id,) in db.query(RefreshToken.id).filter(condition).limit(batch_size)]
+        if not ids:
+            return 0
+        deleted = db.query(RefreshToken).filter(RefreshToken.id.in_(ids)).delete(synchronize_session=False)
         db.commit()
-        return cnt
\ No newline at end of file
+        return deleted
\ No newline at end of file
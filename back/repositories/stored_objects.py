@@ -0,0 +1,64 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from back.models.stored_object import StoredObject
+
+
+class StoredObjectRepository:
+    def acquire(self, db: Session, *, content_hash: str, object_key: str, size: int) -> tuple[StoredObject, bool]:
+        """Берёт ссылку на объект с данным хэшем; при отсутствии регистрирует object_key.
+
+        Возвращает (объект, создан ли он сейчас). Если объект уже был, вызывающий
+        должен удалить свою свежезагруженную копию и использовать obj.object_key.
+        Коммит остаётся за вызывающим: ссылка фиксируется вместе с загрузкой,
+        которая её держит.
+        """
+        for _ in range(2):
+            updated = (
+                db.query(StoredObject)
+                .filter(StoredObject.content_hash == content_hash)
+                .update({"ref_count": StoredObject.ref_count + 1}, synchronize_session=False)
+            )
+            if updated:
+                return self.get(db, content_hash), False
+
+            obj = StoredObject(content_hash=content_hash, object_key=object_key, size=size, ref_count=1)
+            try:
+                with db.begin_nested():
+                    db.add(obj)
+                return obj, True
+            except IntegrityError:
+                # Такой же файл зарегистрировал параллельный запрос — берём ссылку на него.
+                pass
+
+        raise RuntimeError("Could not acquire stored object")
+
+    def get(self, db: Session, content_hash: str) -> StoredObject | None:
+        return db.query(StoredObject).filter(StoredObject.content_hash == content_hash).first()
+
+    def release(self, db: Session, content_hash: str | None, object_key: str) -> bool:
+        """Снимает одну ссылку. True — ссылок не осталось и объект в S3 можно удалять.
+
+        Загрузки без записи в stored_objects (созданные до дедупликации) владеют
+        своим объектом единолично, для них всегда возвращается True.
+        Коммит остаётся за вызывающим.
+        """
+        if not content_hash:
+            return True
+
+        # Счётчик меняется одним UPDATE, а не чтением и записью через ORM: иначе
+        # release мог бы затереть параллельный acquire устаревшим значением.
+        updated = (
+            db.query(StoredObject)
+            .filter(StoredObject.content_hash == content_hash, StoredObject.object_key == object_key)
+            .update({"ref_count": StoredObject.ref_count - 1}, synchronize_session=False)
+        )
+        if not updated:
+            return True
+
+        deleted = (
+            db.query(StoredObject)
+            .filter(StoredObject.content_hash == content_hash, StoredObject.ref_count <= 0)
+            .delete(synchronize_session=False)
+        )
+        return bool(deleted)
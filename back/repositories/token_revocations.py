@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from back.models.token_revocation import TokenRevocation
+
+
+class TokenRevocationRepository:
+    def add(
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        expires_at: datetime,
+        min_version: int | None = None,
+        sid: str | None = None,
+    ) -> None:
+        """Добавляет запись в текущую транзакцию; коммит за вызывающим."""
+        db.add(TokenRevocation(user_id=user_id, min_version=min_version, sid=sid, expires_at=expires_at))
+
+    def list_after(self, db: Session, last_id: int, *, now: datetime) -> list[TokenRevocation]:
+        return (
+            db.query(TokenRevocation)
+            .filter(TokenRevocation.id > last_id, TokenRevocation.expires_at > now)
+            .order_by(TokenRevocation.id)
+            .all()
+        )
+
+    def delete_expired(self, db: Session, *, batch_size: int = 1000) -> int:
+        ids = [
+            row_id
+            for (row_id,) in db.query(TokenRevocation.id)
+            .filter(TokenRevocation.expires_at < datetime.utcnow())
+            .limit(batch_size)
+        ]
+        if not ids:
+            return 0
+        deleted = db.query(TokenRevocation).filter(TokenRevocation.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        return deleted
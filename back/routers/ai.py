@@ -1,97 +1,183 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-import json
-import re
-import os
-import requests
 
 from back.db.database import get_db
-from back.models.upload import Upload, UploadStatus
-from back.models.flashcards import Flashcard
+from back.models.generation_job import JobStatus
+from back.models.upload import Upload
 from back.models.user import UserRole
 from back.routers.auth import get_current_user
-from back.services.pdf_parser import extract_text_from_pdf_bytes
-from back.services.ai_prompt import build_cards_prompt
-from back.services.storage import download_bytes
+from back.schemas.generation import BatchGenerateRequest
+from back.services.card_generation import GEN_MAX_WINDOWS
+from back.services.generation_queue import (
+    PRIORITIES,
+    QueueFull,
+    batch_progress,
+    cancel_job,
+    complete_from_cache,
+    enqueue_generation,
+    schedule_batch,
+    repo as jobs_repo,
+)
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
-MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3")
 
+def _job_payload(job) -> dict:
+    return {
+        "job_id": job.id,
+        "upload_id": job.upload_id,
+        "status": job.status.value if hasattr(job.status, "value") else job.status,
+        "attempts": job.attempts,
+        "created": job.created,
+        "error": job.last_error,
+        "cancel_requested": job.cancel_requested,
+    }
 
-@router.post("/generate_cards/{upload_id}")
+
+def _access_error(upload: Upload | None, current_user) -> tuple[int, str] | None:
+    if not upload:
+        return 404, "Файл не найден"
+    if upload.user_id != current_user.id and current_user.role != UserRole.admin:
+        return 403, "Forbidden"
+    return None
+
+
+def _queue_full(e: QueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+@router.post("/generate_cards/batch", status_code=202)
+def generate_cards_batch(
+    payload: BatchGenerateRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    if payload.priority == "high" and current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Высокий приоритет доступен только администратору")
+    if payload.max_windows is not None and payload.max_windows > GEN_MAX_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"max_windows не больше {GEN_MAX_WINDOWS}")
+
+    upload_ids = list(dict.fromkeys(payload.upload_ids))
+    uploads = {u.id: u for u in db.query(Upload).filter(Upload.id.in_(upload_ids)).all()}
+
+    items = {}
+    allowed = []
+    for upload_id in upload_ids:
+        error = _access_error(uploads.get(upload_id), current_user)
+        if error:
+            items[upload_id] = {"upload_id": upload_id, "job_id": None, "status": "rejected", "error": error[1]}
+        else:
+            allowed.append(uploads[upload_id])
+
+    batch_id = None
+    if allowed:
+        try:
+            batch, jobs = schedule_batch(
+                db,
+                allowed,
+                user_id=current_user.id,
+                priority=PRIORITIES[payload.priority],
+                max_parallel=payload.max_parallel,
+                max_windows=payload.max_windows,
+                force=payload.force,
+            )
+        except QueueFull as e:
+            raise _queue_full(e)
+        batch_id = batch.id
+        for job in jobs:
+            items[job.upload_id] = _job_payload(job)
+
+    return {"batch_id": batch_id, "items": [items[upload_id] for upload_id in upload_ids]}
+
+
+@router.get("/batches/{batch_id}")
+def get_batch(
+    batch_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    batch = jobs_repo.get_batch(db, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Пакет не найден")
+
+    if batch.user_id != current_user.id and current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    progress = batch_progress(db, batch)
+    progress["items"] = [_job_payload(job) for job in progress.pop("jobs")]
+    return progress
+
+
+@router.post("/generate_cards/{upload_id}", status_code=202)
 def generate_cards(
     upload_id: int,
+    response: Response,
+    max_windows: int | None = Query(None, ge=1, le=GEN_MAX_WINDOWS),
+    force: bool = False,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
     upload = db.query(Upload).filter(Upload.id == upload_id).first()
-    if not upload:
-        raise HTTPException(status_code=404, detail="Файл не найден")
+    error = _access_error(upload, current_user)
+    if error:
+        raise HTTPException(status_code=error[0], detail=error[1])
+
+    if not force:
+        created = complete_from_cache(db, upload, max_windows=max_windows)
+        if created is not None:
+            response.status_code = 200
+            return {
+                "job_id": None,
+                "upload_id": upload.id,
+                "status": "done",
+                "attempts": 0,
+                "created": created,
+                "error": None,
+                "cached": True,
+            }
 
-    if upload.user_id != current_user.id and current_user.role != UserRole.admin:
+    try:
+        job = enqueue_generation(db, upload, max_windows=max_windows, force=force)
+    except QueueFull as e:
+        raise _queue_full(e)
+    return _job_payload(job)
+
+
+@router.get("/jobs/{job_id}")
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    job = jobs_repo.get(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+
+    if job.user_id != current_user.id and current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    upload.status = UploadStatus.generating
-    db.commit()
+    return _job_payload(job)
 
-    try:
-        file_bytes = download_bytes(upload.object_key)
-
-        text = extract_text_from_pdf_bytes(file_bytes, max_pages=5)
-        if not text.strip():
-            raise HTTPException(status_code=400, detail="Нет текста")
-
-        prompt = build_cards_prompt(text)
-
-        with requests.post(
-            f"{OLLAMA_URL}/api/chat",
-            json={
-                "model": MODEL_NAME,
-                "stream": True,
-                "messages": [{"role": "user", "content": prompt}],
-            },
-            stream=True,
-            timeout=300,
-        ) as resp:
-            if resp.status_code != 200:
-                raise HTTPException(status_code=502, detail="Ошибка модели")
-
-            full_text = ""
-            for line in resp.iter_lines():
-                if not line:
-                    continue
-                try:
-                    data = json.loads(line.decode("utf-8"))
-                    full_text += data.get("message", {}).get("content", "")
-                except Exception:
-                    pass
-
-        match = re.search(r"\{.*\}", full_text, re.DOTALL)
-        if not match:
-            raise Exception("Нет JSON в ответе")
-
-        parsed = json.loads(match.group(0))
-        cards = parsed.get("cards", [])
-
-        db.query(Flashcard).filter(Flashcard.upload_id == upload_id).delete()
-
-        created = 0
-        for c in cards:
-            q = (c.get("q") or "").strip()
-            a = (c.get("a") or "").strip()
-            if q and a:
-                db.add(Flashcard(upload_id=upload_id, question=q, answer=a))
-                created += 1
-
-        upload.status = UploadStatus.done
-        db.commit()
-        db.refresh(upload)
-
-        return {"created": created}
-
-    except Exception:
-        upload.status = UploadStatus.error
-        db.commit()
-        raise
\ No newline at end of file
+
+@router.post("/jobs/{job_id}/cancel")
+def cancel_generation_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    job = jobs_repo.get(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+
+    if job.user_id != current_user.id and current_user.role != UserRole.admin:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    if job.status not in (JobStatus.queued, JobStatus.running):
+        raise HTTPException(status_code=409, detail="Задача уже завершена")
+
+    cancel_job(db, job)
+    return _job_payload(job)
@@ -5,11 +5,24 @@ from datetime import timedelta
 from back.db.database import get_db, Base, engine, SessionLocal
 from back.models.user import User, UserRole
 from back.models.refresh_token import RefreshToken  
+from back.models.upload import Upload
+from back.models.generation_job import GenerationJob
+from back.models.generation_batch import GenerationBatch
+from back.models.page_text import PageText
+from back.models.stored_object import StoredObject
+from back.models.generation_cache import GenerationCacheEntry
+from back.models.token_revocation import TokenRevocation
+from back.models.book_search_cache import BookSearchCacheEntry
+from back.models.rate_limit_bucket import RateLimitBucket
 from back.schemas.user import UserCreate, UserLogin, UserOut
-from back.services.auth import hash_password, verify_password, create_access_token, SECRET_KEY, ALGORITHM
+from back.services.auth import SECRET_KEY, ALGORITHM
+from back.services import passwords
+from back.services.passwords import HashingBusy
 
 from back.repositories.refresh_tokens import RefreshTokenRepository
 from back.services.sessions import SessionService
+from back.services import token_revocation, user_cache
+from back.services.user_cache import CachedUser
 
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
@@ -25,40 +38,93 @@ def get_session_service() -> SessionService:
     return SessionService(RefreshTokenRepository())
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+def get_current_user(token: str = Depends(oauth2_scheme)) -> CachedUser:
+    """Пользователь из access-токена.
+
+    Токены с uid/role/ver проверяются без обращения к БД: подпись, срок и
+    набор отозванных версий и сессий в памяти. Токены старого формата
+    (только sub) проверяются по БД через user_cache, пока не истекут.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str | None = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("type", "access") != "access":
             raise JWTError()
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный токен")
 
+    if "uid" not in payload:
+        return _load_user(username)
+
+    try:
+        user_id = int(payload["uid"])
+        role = UserRole(payload.get("role"))
+        version = int(payload.get("ver", 0))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный токен")
+
+    if token_revocation.revocations.is_revoked(user_id=user_id, version=version, sid=payload.get("sid")):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Токен отозван")
+    return CachedUser(id=user_id, username=username, email=None, role=role)
+
+
+def _load_user(username: str) -> CachedUser:
+    cached = user_cache.get(username)
+    if cached:
+        return cached
+
     db = SessionLocal()
     try:
         user = db.query(User).filter(User.username == username).first()
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Пользователь не найден")
-        return user
+        return user_cache.put(user)
     finally:
         db.close()
 
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
+def _hashing_busy(e: HashingBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+async def _check_password(db: Session, user: User | None, password: str) -> bool:
+    """Проверяет пароль на пуле argon2; хэш с устаревшими параметрами заменяется новым."""
+    if not user:
+        return False
+    try:
+        ok, new_hash = await passwords.verify_password(password, user.hashed_password)
+    except HashingBusy as e:
+        raise _hashing_busy(e)
+    if ok and new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+    return ok
+
+
+def require_admin(current_user: CachedUser = Depends(get_current_user)) -> CachedUser:
     if current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Forbidden")
     return current_user
 
 
+# Обработчики, считающие argon2, асинхронные: ожидание пула хэширования не
+# должно занимать потоки threadpool, общие для всех синхронных эндпоинтов.
 @router.post("/register", response_model=UserOut)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     if db.query(User).filter(User.username == user.username).first():
         raise HTTPException(status_code=400, detail="Пользователь с таким именем уже существует")
 
     is_first_user = db.query(User).count() == 0
     role = UserRole.admin if is_first_user else UserRole.user
 
-    hashed_pw = hash_password(user.password)
+    try:
+        hashed_pw = await passwords.hash_password(user.password)
+    except HashingBusy as e:
+        raise _hashing_busy(e)
     db_user = User(username=user.username, email=user.email, hashed_password=hashed_pw, role=role)
     db.add(db_user)
     db.commit()
@@ -67,13 +133,13 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-def login(
+async def login(
     user: UserLogin,
     db: Session = Depends(get_db),
     sessions: SessionService = Depends(get_session_service),
 ):
     db_user = db.query(User).filter(User.username == user.username).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    if not await _check_password(db, db_user, user.password):
         raise HTTPException(status_code=401, detail="Неверное имя пользователя или пароль")
 
     return sessions.issue_tokens(db, db_user)
@@ -103,23 +169,30 @@ def logout(
 
 
 @router.get("/me", response_model=UserOut)
-def read_current_user(current_user: User = Depends(get_current_user)):
-    return current_user
+def read_current_user(current_user: CachedUser = Depends(get_current_user)):
+    # В токене нет email — профиль берётся из БД (через user_cache).
+    return _load_user(current_user.username)
 
 
 @router.put("/change-password")
-def change_password(
+async def change_password(
     old_password: str = Body(...),
     new_password: str = Body(...),
-    current_user: User = Depends(get_current_user),
+    current_user: CachedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    if not verify_password(old_password, current_user.hashed_password):
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if not await _check_password(db, user, old_password):
         raise HTTPException(status_code=400, detail="Неверный текущий пароль")
 
-    current_user.hashed_password = hash_password(new_password)
-    db.add(current_user)
+    try:
+        user.hashed_password = await passwords.hash_password(new_password)
+    except HashingBusy as e:
+        raise _hashing_busy(e)
+    token_revocation.revoke_user_tokens(db, user)
     db.commit()
+    token_revocation.revocations.refresh()
+    user_cache.invalidate(user.username)
     return {"message": "Пароль успешно изменён"}
 
 
@@ -128,7 +201,7 @@ def change_password(
 def admin_set_role(
     username: str = Body(...),
     role: str = Body(...),
-    _: User = Depends(require_admin),
+    _: CachedUser = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
     target = db.query(User).filter(User.username == username).first()
@@ -139,5 +212,9 @@ def admin_set_role(
         raise HTTPException(status_code=400, detail="Некорректная роль")
 
     target.role = UserRole(role)
+    # Роль зашита в access-токены: старые отзываются, новая роль придёт с обновлённым токеном.
+    token_revocation.revoke_user_tokens(db, target)
     db.commit()
+    token_revocation.revocations.refresh()
+    user_cache.invalidate(target.username)
     return {"message": "Роль обновлена", "username": target.username, "role": target.role.value}
\ No newline at end of file
@@ -1,3 +1,5 @@
+import math
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
@@ -6,6 +8,7 @@ from back.models.upload import Upload
 from back.models.user import User, UserRole
 from back.routers.auth import get_current_user
 from back.services.books_api import search_books
+from back.services.rate_limit import RateLimited
 
 router = APIRouter(prefix="/books", tags=["books"])
 
@@ -27,8 +30,12 @@ def get_books_by_upload(
     query = (q or upload.title or upload.filename or "").strip()
 
     try:
-        return search_books(query)
-    except RuntimeError as e:
-        if str(e) == "Rate limit exceeded":
-            raise HTTPException(status_code=429, detail="Слишком много запросов к внешнему API")
+        return search_books(query, user_id=current_user.id)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много запросов к внешнему API",
+            headers={"Retry-After": str(max(math.ceil(e.retry_after), 1))},
+        )
+    except RuntimeError:
         raise HTTPException(status_code=502, detail="Внешний API временно недоступен")
\ No newline at end of file
@@ -1,19 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
 from back.db.database import get_db
 from back.models.user import User, UserRole
 from back.models.flashcards import Flashcard
 from back.models.upload import Upload
 from back.routers.auth import get_current_user
+from back.services.pagination import encode_cursor, decode_cursor
 
 router = APIRouter(prefix="/cards", tags=["cards"])
 
+CARD_FIELDS = ("id", "upload_id", "question", "answer", "created_at")
+
+
+def _parse_fields(fields: str | None) -> tuple[str, ...]:
+    if not fields:
+        return CARD_FIELDS
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not names or any(name not in CARD_FIELDS for name in names):
+        raise HTTPException(status_code=400, detail="Некорректный список полей")
+    return names
+
+
+def _etag(upload: Upload, fields: tuple[str, ...], limit: int | None, cursor: str | None) -> str:
+    """Сильный ETag представления: версия набора карточек плюс параметры запроса."""
+    raw = f"{upload.id}:{upload.cards_version}:{','.join(fields)}:{limit}:{cursor}"
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _not_modified(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match сравнивается слабо: префикс W/ не мешает совпадению.
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in tags
+
+
 @router.get("/{upload_id}")
 def get_cards(
     upload_id: int,
+    request: Request,
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = Query(None),
+    fields: str | None = Query(None, description="Поля через запятую, например question,answer"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    """Карточки загрузки в порядке создания.
+
+    Без limit отдаётся весь набор. С limit следующая страница запрашивается
+    по cursor из заголовка X-Next-Cursor. Ответ 304 на If-None-Match
+    определяется по версии набора в uploads и не читает строки карточек.
+    """
     upload = db.query(Upload).filter(Upload.id == upload_id).first()
     if not upload:
         raise HTTPException(status_code=404, detail="Файл не найден")
@@ -21,5 +64,29 @@ def get_cards(
     if upload.user_id != current_user.id and current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    cards = db.query(Flashcard).filter(Flashcard.upload_id == upload_id).all()
-    return cards
\ No newline at end of file
+    names = _parse_fields(fields)
+    etag = _etag(upload, names, limit, cursor)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _not_modified(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    columns = [getattr(Flashcard, name) for name in names]
+    query = (
+        db.query(Flashcard.id.label("_key"), *columns)
+        .filter(Flashcard.upload_id == upload_id)
+        .order_by(Flashcard.id.asc())
+    )
+    if cursor:
+        try:
+            last_id = int(decode_cursor(cursor)["id"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Некорректный курсор")
+        query = query.filter(Flashcard.id > last_id)
+
+    rows = query.limit(limit + 1).all() if limit else query.all()
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor({"id": rows[-1]._key})
+
+    items = [{name: getattr(row, name) for name in names} for row in rows]
+    return JSONResponse(content=jsonable_encoder(items), headers=headers)
@@ -5,27 +5,86 @@ import json
 from sqlalchemy.orm import Session
 from back.db.database import get_db
 from back.models.upload import Upload, UploadStatus
-from back.models.user import User
-from back.services.auth import SECRET_KEY, ALGORITHM
-from jose import JWTError, jwt
+from back.routers.auth import get_current_user
+from back.services.status_bus import bus as status_bus
+import os
 
 router = APIRouter(prefix="/events", tags=["events"])
 
+SSE_RECONCILE_INTERVAL = float(os.getenv("SSE_RECONCILE_INTERVAL", "60"))
+SSE_KEEPALIVE_INTERVAL = float(os.getenv("SSE_KEEPALIVE_INTERVAL", "15"))
+# Не чаще одного события прогресса на загрузку за этот интервал для одного клиента.
+SSE_PROGRESS_INTERVAL = float(os.getenv("SSE_PROGRESS_INTERVAL", "1"))
+
+FINAL_STATUSES = {UploadStatus.done.value, UploadStatus.error.value}
+
 active_connections = {}
 
 user_last_statuses = {}
 
+
+def _load_statuses(user_id: int) -> list[tuple[int, str]]:
+    db_gen = get_db()
+    db = next(db_gen)
+    try:
+        rows = db.query(Upload.id, Upload.status).filter(Upload.user_id == user_id).all()
+        return [(upload_id, status.value) for upload_id, status in rows]
+    finally:
+        try:
+            next(db_gen)
+        except StopIteration:
+            pass
+
+
+def _status_message(last_statuses: dict, upload_id: int, current_status: str) -> str | None:
+    last_sent = last_statuses.get(upload_id)
+    if last_sent == current_status:
+        return None
+
+    event_type = 'final' if current_status in FINAL_STATUSES else 'status_update'
+    print(f"Отправка обновления: upload_id={upload_id}, {last_sent} -> {current_status}")
+    last_statuses[upload_id] = current_status
+    return f"data: {json.dumps({
+        'upload_id': upload_id,
+        'status': current_status,
+        'type': event_type
+    })}\n\n"
+
+
+def _flush_progress(pending: dict, last_sent: dict, now: float) -> list[str]:
+    """Отдаёт накопленный прогресс загрузок, для которых истёк SSE_PROGRESS_INTERVAL.
+
+    pending хранит только последнее событие по загрузке, поэтому промежуточные
+    состояния быстрой генерации склеиваются.
+    """
+    messages = []
+    for upload_id in list(pending):
+        if now - last_sent.get(upload_id, float("-inf")) < SSE_PROGRESS_INTERVAL:
+            continue
+        event = pending.pop(upload_id)
+        last_sent[upload_id] = now
+        messages.append(f"data: {json.dumps({
+            'upload_id': upload_id,
+            'status': event['status'],
+            'progress': event['progress'],
+            'type': 'progress'
+        })}\n\n")
+    return messages
+
+
+def _next_flush_in(pending: dict, last_sent: dict, now: float) -> float | None:
+    if not pending:
+        return None
+    due = min(last_sent.get(upload_id, float("-inf")) + SSE_PROGRESS_INTERVAL for upload_id in pending)
+    return max(due - now, 0)
+
+
 async def authenticate_user(token: str, db: Session):
+    # Та же проверка, что у защищённых маршрутов: подпись, срок и отзыв токена.
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str | None = payload.get("sub")
-        if username is None:
-            return None
-    except JWTError:
+        return get_current_user(token)
+    except HTTPException:
         return None
-    
-    user = db.query(User).filter(User.username == username).first()
-    return user
 
 @router.get("/uploads-status")
 async def stream_uploads_status(
@@ -63,91 +122,70 @@ async def stream_uploads_status(
         
         yield f"data: {json.dumps({'test': 'connection_established', 'user_id': user_id})}\n\n"
         
-        iteration = 0
+        subscription = status_bus.subscribe(user_id)
+        last_statuses = user_last_statuses[user_id]
+        loop = asyncio.get_running_loop()
         
         try:
+            print(f"Начальная синхронизация для user_id={user_id}")
+            for upload_id, current_status in await asyncio.to_thread(_load_statuses, user_id):
+                yield f"data: {json.dumps({
+                    'upload_id': upload_id,
+                    'status': current_status,
+                    'type': 'initial'
+                })}\n\n"
+                last_statuses[upload_id] = current_status
+            
+            last_reconcile = loop.time()
+            pending_progress: dict[int, dict] = {}
+            progress_sent: dict[int, float] = {}
+            
             while True:
-                iteration += 1
-                
                 if await request.is_disconnected():
-                    print(f"Клиент отключился на итерации {iteration}")
+                    print(f"Клиент отключился, user_id={user_id}")
                     break
                 
-                db_gen = get_db()
-                new_db = next(db_gen)
+                timeout = SSE_KEEPALIVE_INTERVAL
+                flush_in = _next_flush_in(pending_progress, progress_sent, loop.time())
+                if flush_in is not None:
+                    timeout = min(timeout, flush_in)
                 
-                try:
-                    all_uploads = new_db.query(Upload).filter(
-                        Upload.user_id == user_id
-                    ).all()
-                    
-                    if iteration == 1:
-                        print(f"Начальная синхронизация для user_id={user_id}")
-                        for upload in all_uploads:
-                            if upload.id not in user_last_statuses[user_id]:
-                                yield f"data: {json.dumps({
-                                    'upload_id': upload.id,
-                                    'status': upload.status.value,
-                                    'type': 'initial'
-                                })}\n\n"
-                                user_last_statuses[user_id][upload.id] = upload.status.value
-                    
-                    active_uploads = new_db.query(Upload).filter(
-                        Upload.user_id == user_id,
-                        Upload.status.in_([UploadStatus.generating, UploadStatus.uploaded])
-                    ).all()
-                    
-                    for upload in active_uploads:
-                        current_status = upload.status.value
-                        last_sent = user_last_statuses[user_id].get(upload.id)
-                        
-                        if last_sent != current_status:
-                            print(f"Отправка обновления: upload_id={upload.id}, {last_sent} -> {current_status}")
-                            yield f"data: {json.dumps({
-                                'upload_id': upload.id,
-                                'status': current_status,
-                                'type': 'status_update'
-                            })}\n\n"
-                            user_last_statuses[user_id][upload.id] = current_status
-                    
-                    if iteration > 1:  
-                        completed_uploads = new_db.query(Upload).filter(
-                            Upload.user_id == user_id,
-                            Upload.status.in_([UploadStatus.done, UploadStatus.error])
-                        ).all()
-                        
-                        for upload in completed_uploads:
-                            current_status = upload.status.value
-                            last_sent = user_last_statuses[user_id].get(upload.id)
-                            
-                            if last_sent and last_sent != current_status and last_sent in ['generating', 'uploaded']:
-                                print(f"Финальный статус: upload_id={upload.id}, {last_sent} -> {current_status}")
-                                yield f"data: {json.dumps({
-                                    'upload_id': upload.id,
-                                    'status': current_status,
-                                    'type': 'final'
-                                })}\n\n"
-                                user_last_statuses[user_id][upload.id] = current_status
-                                user_last_statuses[user_id].pop(upload.id, None)
+                event = await subscription.get(timeout=timeout)
                 
-                except Exception as db_error:
-                    print(f"Ошибка БД: {db_error}")
-                finally:
-                    try:
-                        next(db_gen)
-                    except StopIteration:
-                        pass
+                if event is not None and "progress" in event:
+                    pending_progress[event["upload_id"]] = event
+                elif event is not None:
+                    message = _status_message(last_statuses, event["upload_id"], event["status"])
+                    if message:
+                        # Прогресс, не успевший уйти до финального статуса, уже неактуален.
+                        if event["status"] in FINAL_STATUSES:
+                            pending_progress.pop(event["upload_id"], None)
+                        yield message
                 
-                if iteration % 20 == 0:
-                    print(f"Итерация {iteration}, активных соединений: {len(active_connections)}")
+                flushed = _flush_progress(pending_progress, progress_sent, loop.time())
+                for message in flushed:
+                    yield message
                 
-                await asyncio.sleep(3)
+                if event is None and not flushed:
+                    yield ": keepalive\n\n"
+                
+                # Шина — основной источник; редкая сверка с БД страхует от потерянных событий.
+                if loop.time() - last_reconcile >= SSE_RECONCILE_INTERVAL:
+                    last_reconcile = loop.time()
+                    try:
+                        for upload_id, current_status in await asyncio.to_thread(_load_statuses, user_id):
+                            message = _status_message(last_statuses, upload_id, current_status)
+                            if message:
+                                yield message
+                    except Exception as db_error:
+                        print(f"Ошибка БД: {db_error}")
                 
         except asyncio.CancelledError:
             print(f"SSE соединение закрыто для user_id={user_id}")
         except Exception as e:
             print(f"Ошибка: {e}")
         finally:
+            status_bus.unsubscribe(subscription)
             active_connections.pop(user_id, None)
             user_last_statuses.pop(user_id, None)
             print(f"Очищено для user_id={user_id}")
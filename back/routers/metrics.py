@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from back.db.database import get_db
+from back.models.user import User
+from back.routers.auth import require_admin
+from back.services.pdf_parser import get_extractor_stats
+from back.services.status_bus import bus as status_bus
+from back.services import books_api, passwords, token_revocation, token_sweeper, user_cache
+from back.services.card_generation import generation_cache
+from back.services.generation_queue import queue_metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/pdf-extractors")
+def pdf_extractor_metrics(_: User = Depends(require_admin)):
+    return get_extractor_stats()
+
+
+@router.get("/status-bus")
+def status_bus_metrics(_: User = Depends(require_admin)):
+    return status_bus.get_stats()
+
+
+@router.get("/auth-cache")
+def auth_cache_metrics(_: User = Depends(require_admin)):
+    return user_cache.stats()
+
+
+@router.get("/token-revocations")
+def token_revocation_metrics(_: User = Depends(require_admin)):
+    return token_revocation.revocations.get_stats()
+
+
+@router.get("/token-sweeper")
+def token_sweeper_metrics(_: User = Depends(require_admin)):
+    return token_sweeper.get_stats()
+
+
+@router.get("/password-hashing")
+def password_hashing_metrics(_: User = Depends(require_admin)):
+    return passwords.pool.get_stats()
+
+
+@router.get("/books-cache")
+def books_cache_metrics(db: Session = Depends(get_db), _: User = Depends(require_admin)):
+    return {**books_api.cache_stats(), "persistent": books_api.persistent.stats(db)}
+
+
+@router.get("/generation-cache")
+def generation_cache_metrics(db: Session = Depends(get_db), _: User = Depends(require_admin)):
+    return generation_cache.stats(db)
+
+
+@router.get("/generation-queue")
+def generation_queue_metrics(db: Session = Depends(get_db), _: User = Depends(require_admin)):
+    return queue_metrics(db)
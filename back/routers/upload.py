@@ -1,6 +1,8 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import datetime
+import hashlib
 import os
 import uuid
 
@@ -8,18 +10,65 @@ from back.db.database import get_db
 from back.models.user import User
 from back.models.upload import Upload
 from back.routers.auth import get_current_user
+from back.repositories.stored_objects import StoredObjectRepository
 from back.services.storage import (
-    upload_bytes,
+    S3MultipartWriter,
+    delete_object,
     ensure_bucket,
     ALLOWED_CONTENT_TYPES,
     MAX_FILE_SIZE,
+    MAX_FILE_SIZE_MB,
 )
+from back.services import text_cache
+from back.services.status_bus import publish_status
 
 router = APIRouter(tags=["uploads"])
 
+stored_objects = StoredObjectRepository()
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+TOO_LARGE_DETAIL = f"Файл превышает {MAX_FILE_SIZE_MB} МБ"
+
+
+async def _stream_to_storage(file: UploadFile, object_key: str) -> tuple[int, str]:
+    """Копирует файл в S3 частями, считая размер и SHA-256 на лету.
+
+    Лимит размера проверяется на каждом чанке, поэтому слишком большой файл
+    отбрасывается, не дочитываясь до конца, а незавершённая multipart-загрузка
+    удаляется.
+    """
+    writer = S3MultipartWriter(object_key, file.content_type)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                raise HTTPException(status_code=400, detail=TOO_LARGE_DETAIL)
+            digest.update(chunk)
+            await run_in_threadpool(writer.write, chunk)
+
+        if size:
+            await run_in_threadpool(writer.complete)
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    return size, digest.hexdigest()
+
+
+async def _discard_object(object_key: str) -> None:
+    try:
+        await run_in_threadpool(delete_object, object_key)
+    except Exception:
+        pass
+
 
 @router.post("/upload-pdf")
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
@@ -29,36 +78,50 @@ async def upload_file(
     if file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="Допустим только PDF")
 
-    data = await file.read()
-
-    if not data:
-        raise HTTPException(status_code=400, detail="Файл пустой")
-
-    if len(data) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail="Файл превышает 10 МБ")
+    # Размер уже известен из multipart-разбора — заведомо большой файл отклоняем сразу.
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=400, detail=TOO_LARGE_DETAIL)
 
     ext = os.path.splitext(file.filename or "")[1].lower() or ".pdf"
     object_key = f"user_{current_user.id}/{uuid.uuid4().hex}{ext}"
 
-    upload_bytes(data, object_key, file.content_type)
+    size, content_hash = await _stream_to_storage(file, object_key)
+
+    if not size:
+        raise HTTPException(status_code=400, detail="Файл пустой")
+
+    stored, created = stored_objects.acquire(db, content_hash=content_hash, object_key=object_key, size=size)
 
     upload_entry = Upload(
         user_id=current_user.id,
         filename=file.filename,
         title=file.filename,
-        object_key=object_key,
+        object_key=stored.object_key,
         content_type=file.content_type,
-        size=len(data),
+        size=size,
+        content_hash=content_hash,
         timestamp=datetime.utcnow(),
     )
 
     db.add(upload_entry)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        # Ссылка на объект откатилась вместе с загрузкой — свежая копия никому не нужна.
+        db.rollback()
+        await _discard_object(object_key)
+        raise
+    if not created:
+        # Такой файл уже хранится: загрузка ссылается на общий объект, свежая копия не нужна.
+        await _discard_object(object_key)
     db.refresh(upload_entry)
+    publish_status(upload_entry)
+
+    background_tasks.add_task(text_cache.warm, upload_entry.id)
 
     return {
         "id": upload_entry.id,
         "filename": upload_entry.filename,
         "title": upload_entry.title,
         "size": upload_entry.size,
-    }
\ No newline at end of file
+    }
@@ -1,16 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, BackgroundTasks
+from sqlalchemy import and_, func, literal, or_, tuple_
 from sqlalchemy.orm import Session
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from datetime import datetime
+import json
 
 from back.db.database import get_db
-from back.models.upload import Upload
+from back.models.upload import Upload, UploadStatus
 from back.models.user import User, UserRole
 from back.routers.auth import get_current_user
-from back.services.pdf_parser import extract_text_from_pdf_bytes
-from back.services.storage import download_bytes, delete_object, generate_presigned_url
+from back.repositories.stored_objects import StoredObjectRepository
+from back.services import generation_queue, text_cache
+from back.services.pagination import encode_cursor, decode_cursor
+from back.services.storage import delete_object, generate_presigned_url
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
 
+stored_objects = StoredObjectRepository()
+
+
+ALLOWED_SORT = {"timestamp", "title", "filename", "status", "size"}
+ALLOWED_ORDER = {"asc", "desc"}
+
+
+def _upload_item(u: Upload) -> dict:
+    return {
+        "id": u.id,
+        "filename": u.filename,
+        "title": u.title,
+        "timestamp": u.timestamp.isoformat() if u.timestamp else None,
+        "status": u.status.value if hasattr(u.status, "value") else u.status,
+        "size": u.size,
+        "content_type": u.content_type,
+    }
+
+
+def _sort_value_to_cursor(u: Upload, sort_by: str):
+    value = getattr(u, sort_by)
+    if sort_by == "timestamp":
+        return value.isoformat() if value else None
+    if sort_by == "status":
+        return value.value if hasattr(value, "value") else value
+    return value
+
+
+def _sort_value_from_cursor(value, sort_by: str):
+    if value is None:
+        return None
+    if sort_by == "timestamp":
+        return datetime.fromisoformat(value)
+    if sort_by == "status":
+        return UploadStatus(value)
+    return value
+
+
+def _keyset_filter(cursor: str, sort_by: str, order: str):
+    try:
+        payload = decode_cursor(cursor)
+        if payload.get("s") != sort_by or payload.get("o") != order:
+            raise ValueError("Cursor does not match sort")
+        value = _sort_value_from_cursor(payload["v"], sort_by)
+        last_id = int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+    # NULL считается больше любого значения (см. _order_by): при asc такие строки
+    # идут в конце, при desc — в начале.
+    column = getattr(Upload, sort_by)
+    if value is None:
+        same = and_(column.is_(None), Upload.id > last_id if order == "asc" else Upload.id < last_id)
+        return same if order == "asc" else or_(same, column.isnot(None))
+
+    key = tuple_(column, Upload.id)
+    bound = tuple_(literal(value, column.type), literal(last_id))
+    return or_(key > bound, column.is_(None)) if order == "asc" else key < bound
+
+
+def _order_by(sort_by: str, order: str):
+    # Порядок NULL задан явно и совпадает с порядком PostgreSQL по умолчанию,
+    # чтобы индексы (user_id, timestamp|title) подходили для обоих направлений.
+    column = getattr(Upload, sort_by)
+    if order == "asc":
+        return column.asc().nulls_last(), Upload.id.asc()
+    return column.desc().nulls_first(), Upload.id.desc()
+
 
 @router.get("/")
 def get_user_uploads(
@@ -20,47 +93,78 @@ def get_user_uploads(
     limit: int = Query(100, ge=1, le=1000),
     sort_by: str = Query("timestamp"),
     order: str = Query("desc"),
+    cursor: str | None = Query(None),
 ):
-    allowed_sort = {"timestamp", "title", "filename", "status", "size"}
-    allowed_order = {"asc", "desc"}
-
-    if sort_by not in allowed_sort:
+    """Страница истории загрузок.
+
+    Обычный режим — LIMIT/OFFSET по page и отдельный COUNT. Если передан
+    cursor (значение next_cursor из предыдущего ответа), выборка идёт по
+    ключу (sort_by, id) без OFFSET и без COUNT, поэтому глубокие страницы
+    стоят столько же, сколько первая.
+    """
+    if sort_by not in ALLOWED_SORT:
         raise HTTPException(status_code=400, detail="Некорректное поле сортировки")
 
-    if order not in allowed_order:
+    if order not in ALLOWED_ORDER:
         raise HTTPException(status_code=400, detail="Некорректный порядок сортировки")
 
-    query = db.query(Upload).filter(Upload.user_id == current_user.id)
+    query = db.query(Upload).filter(Upload.user_id == current_user.id).order_by(*_order_by(sort_by, order))
 
-    sort_column = getattr(Upload, sort_by)
-    if order == "asc":
-        query = query.order_by(sort_column.asc())
+    if cursor:
+        uploads = query.filter(_keyset_filter(cursor, sort_by, order)).limit(limit + 1).all()
+        total = None
     else:
-        query = query.order_by(sort_column.desc())
+        total = db.query(func.count(Upload.id)).filter(Upload.user_id == current_user.id).scalar()
+        uploads = query.offset((page - 1) * limit).limit(limit + 1).all()
+
+    has_more = len(uploads) > limit
+    uploads = uploads[:limit]
 
-    uploads_all = query.all()
-    total = len(uploads_all)
-    uploads = uploads_all[(page - 1) * limit : page * limit]
+    next_cursor = None
+    if has_more:
+        last = uploads[-1]
+        next_cursor = encode_cursor(
+            {"s": sort_by, "o": order, "v": _sort_value_to_cursor(last, sort_by), "id": last.id}
+        )
 
     return {
-        "items": [
-            {
-                "id": u.id,
-                "filename": u.filename,
-                "title": u.title,
-                "timestamp": u.timestamp.isoformat() if u.timestamp else None,
-                "status": u.status.value if hasattr(u.status, "value") else u.status,
-                "size": u.size,
-                "content_type": u.content_type,
-            }
-            for u in uploads
-        ],
-        "page": page,
-        "pages": (total + limit - 1) // limit,
+        "items": [_upload_item(u) for u in uploads],
+        "page": None if cursor else page,
+        "pages": None if total is None else (total + limit - 1) // limit,
         "total": total,
+        "next_cursor": next_cursor,
     }
 
 
+def _release_objects(db: Session, uploads: list[Upload]) -> list[str]:
+    """Снимает ссылки загрузок на общие объекты и возвращает ключи, оставшиеся без владельцев.
+
+    Объекты в S3 удаляются только после commit, чтобы откат транзакции не
+    оставил загрузки без файла.
+    """
+    orphaned = []
+    removed_ids = [u.id for u in uploads]
+    for u in uploads:
+        if not stored_objects.release(db, u.content_hash, u.object_key):
+            continue
+        orphaned.append(u.object_key)
+        if u.content_hash and not (
+            db.query(Upload.id)
+            .filter(Upload.content_hash == u.content_hash, Upload.id.notin_(removed_ids))
+            .first()
+        ):
+            text_cache.purge(db, u.content_hash)
+    return orphaned
+
+
+def _delete_objects(object_keys: list[str]) -> None:
+    for key in object_keys:
+        try:
+            delete_object(key)
+        except Exception:
+            pass
+
+
 @router.put("/{upload_id}")
 def update_upload(
     upload_id: int,
@@ -111,20 +215,30 @@ def clear_user_uploads(
 ):
     user_uploads = db.query(Upload).filter(Upload.user_id == current_user.id).all()
 
-    for u in user_uploads:
-        try:
-            delete_object(u.object_key)
-        except Exception:
-            pass
+    generation_queue.cancel_for_uploads(db, [u.id for u in user_uploads])
+    orphaned = _release_objects(db, user_uploads)
 
     db.query(Upload).filter(Upload.user_id == current_user.id).delete()
     db.commit()
+
+    _delete_objects(orphaned)
     return {"message": "История загрузок успешно очищена"}
 
 
+def _ndjson(meta: dict, pages):
+    yield json.dumps(meta, ensure_ascii=False) + "\n"
+    for page_no, text in pages:
+        yield json.dumps({"page": page_no + 1, "text": text}, ensure_ascii=False) + "\n"
+
+
 @router.get("/{upload_id}/text")
 def get_upload_text(
     upload_id: int,
+    background_tasks: BackgroundTasks,
+    from_page: int = Query(1, ge=1),
+    to_page: int | None = Query(None, ge=1),
+    stream: bool = Query(False),
+    layout: bool = Query(False),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -135,21 +249,34 @@ def get_upload_text(
     if upload.user_id != current_user.id and current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    file_bytes = download_bytes(upload.object_key)
-    text = extract_text_from_pdf_bytes(file_bytes, max_pages=None)
-
-    return JSONResponse(
-        {
-            "id": upload.id,
-            "filename": upload.filename,
-            "title": upload.title,
-            "text": text,
-            "size": upload.size,
-            "content_type": upload.content_type,
-            "timestamp": upload.timestamp.isoformat() if upload.timestamp else None,
-            "status": upload.status.value if hasattr(upload.status, "value") else upload.status,
-        }
-    )
+    if to_page is not None and to_page < from_page:
+        raise HTTPException(status_code=400, detail="Некорректный диапазон страниц")
+
+    if upload.page_count is None and not layout:
+        background_tasks.add_task(text_cache.warm, upload.id)
+
+    meta = {
+        "id": upload.id,
+        "filename": upload.filename,
+        "title": upload.title,
+        "size": upload.size,
+        "content_type": upload.content_type,
+        "timestamp": upload.timestamp.isoformat() if upload.timestamp else None,
+        "status": upload.status.value if hasattr(upload.status, "value") else upload.status,
+        "page_count": upload.page_count,
+        "from_page": from_page,
+        "to_page": to_page,
+    }
+    pages = text_cache.iter_pages(upload.id, from_page - 1, to_page, layout=layout)
+
+    if stream:
+        return StreamingResponse(
+            _ndjson(meta, pages),
+            media_type="application/x-ndjson",
+        )
+
+    text = "\n\n".join(text for _, text in pages if text)
+    return JSONResponse({**meta, "text": text})
 
 
 @router.get("/{upload_id}/download-url")
@@ -182,11 +309,11 @@ def delete_upload(
     if upload.user_id != current_user.id and current_user.role != UserRole.admin:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    try:
-        delete_object(upload.object_key)
-    except Exception:
-        pass
+    generation_queue.cancel_for_uploads(db, [upload.id])
+    orphaned = _release_objects(db, [upload])
 
     db.delete(upload)
     db.commit()
+
+    _delete_objects(orphaned)
     return {"message": "Файл удалён"}
\ No newline at end of file
@@ -0,0 +1,14 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+# Не больше JOB_QUEUE_LIMIT_PER_USER по умолчанию: больший пакет никогда не прошёл бы в очередь.
+BATCH_MAX_ITEMS = 30
+
+
+class BatchGenerateRequest(BaseModel):
+    upload_ids: list[int] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    priority: Literal["low", "normal", "high"] = "normal"
+    max_parallel: int | None = Field(None, ge=1)
+    max_windows: int | None = Field(None, ge=1)
+    force: bool = False
@@ -1,4 +1,11 @@
-def build_cards_prompt(text: str, max_cards: int = 7) -> str:
+# Меняется при любой правке шаблона: входит в ключ кэша генерации.
+PROMPT_VERSION = "1"
+
+
+def build_cards_prompt(text: str, max_cards: int = 7, max_chars: int | None = 1000) -> str:
+    # Окна из chunking уже ограничены по токенам и передаются с max_chars=None.
+    if max_chars is not None:
+        text = text[:max_chars]
     return f"""
 ВНИМАНИЕ — ПРОЧИТАЙ ВНИМАТЕЛЬНО:
 Ты — помощник, который создаёт учебные флеш-карточки строго по тексту.
@@ -27,5 +34,5 @@ def build_cards_prompt(text: str, max_cards: int = 7) -> str:
 }}
 
 ТЕКСТ ДЛЯ АНАЛИЗА:
-\"\"\"{text[:1000]}\"\"\"
+\"\"\"{text}\"\"\"
 """
\ No newline at end of file
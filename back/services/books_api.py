@@ -1,27 +1,139 @@
+"""Поиск книг в Google Books с кэшем ответов.
+
+Бюджет внешнего API общий для всех процессов: token bucket на
+BOOKS_RATE_LIMIT_PER_MINUTE запросов (всплеск до BOOKS_RATE_LIMIT_BURST) плюс
+корзина каждого пользователя (BOOKS_USER_RATE_LIMIT_*), см. rate_limit.
+Запрос почти всегда один и тот же (название загрузки), поэтому ответы
+кэшируются по нормализованному запросу и параметрам:
+
+- в памяти (LRU на BOOKS_CACHE_SIZE записей) и в таблице book_search_cache,
+  чтобы кэш пережил перезапуск;
+- непустой ответ живёт BOOKS_CACHE_TTL секунд, пустой — BOOKS_NEGATIVE_TTL;
+- одновременные одинаковые запросы ждут один вызов API (single-flight).
+
+Если токенов нет дольше BOOKS_RATE_LIMIT_MAX_WAIT секунд или Google
+отвечает 429/ошибкой, отдаётся устаревшая запись (stale: true), а при её
+отсутствии — пустой ответ с degraded: true вместо ошибки пользователю.
+Исчерпавший свой лимит пользователь без устаревшей записи получает
+RateLimited (429 с Retry-After); этот отказ касается только его — другие
+пользователи, ждавшие тот же запрос, повторяют его сами. Устаревшие записи
+хранятся ещё BOOKS_STALE_TTL секунд.
+"""
+import hashlib
+import logging
 import os
+import threading
 import time
-from typing import Any
+from datetime import datetime
+from typing import Any, Callable
 
 import requests
 
+from back.db.database import SessionLocal
+from back.repositories.book_search_cache import BookSearchCacheRepository
+from back.services.rate_limit import DatabaseBucketStore, MemoryBucketStore, RateLimited, TokenBucketLimiter
+from back.services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
 GOOGLE_BOOKS_URL = "https://www.googleapis.com/books/v1/volumes"
 GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY", "")
 BOOKS_TIMEOUT = float(os.getenv("BOOKS_TIMEOUT", "5"))
 BOOKS_MAX_RESULTS = int(os.getenv("BOOKS_MAX_RESULTS", "6"))
 BOOKS_RATE_LIMIT_PER_MINUTE = int(os.getenv("BOOKS_RATE_LIMIT_PER_MINUTE", "20"))
+BOOKS_RATE_LIMIT_BURST = int(os.getenv("BOOKS_RATE_LIMIT_BURST", "5"))
+BOOKS_USER_RATE_LIMIT_PER_MINUTE = int(os.getenv("BOOKS_USER_RATE_LIMIT_PER_MINUTE", "6"))
+BOOKS_USER_RATE_LIMIT_BURST = int(os.getenv("BOOKS_USER_RATE_LIMIT_BURST", "3"))
+BOOKS_RATE_LIMIT_MAX_WAIT = float(os.getenv("BOOKS_RATE_LIMIT_MAX_WAIT", "2"))
+# database — общий для всех процессов лимит; memory — только в пределах процесса.
+BOOKS_RATE_LIMIT_STORE = os.getenv("BOOKS_RATE_LIMIT_STORE", "database")
+BOOKS_CACHE_SIZE = int(os.getenv("BOOKS_CACHE_SIZE", "2000"))
+BOOKS_CACHE_TTL = int(os.getenv("BOOKS_CACHE_TTL", str(24 * 3600)))
+BOOKS_NEGATIVE_TTL = int(os.getenv("BOOKS_NEGATIVE_TTL", "3600"))
+BOOKS_STALE_TTL = int(os.getenv("BOOKS_STALE_TTL", str(7 * 24 * 3600)))
+# Сколько помнить в памяти вынужденный (устаревший или пустой) ответ, прежде чем снова звать API.
+BOOKS_DEGRADED_TTL = int(os.getenv("BOOKS_DEGRADED_TTL", "60"))
+
+PRINT_TYPE = "books"
+LANG_RESTRICT = "ru"
+
+limiter = TokenBucketLimiter(
+    MemoryBucketStore() if BOOKS_RATE_LIMIT_STORE == "memory" else DatabaseBucketStore(),
+    name="books",
+    global_capacity=BOOKS_RATE_LIMIT_BURST,
+    global_per_minute=BOOKS_RATE_LIMIT_PER_MINUTE,
+    user_capacity=BOOKS_USER_RATE_LIMIT_BURST,
+    user_per_minute=BOOKS_USER_RATE_LIMIT_PER_MINUTE,
+    max_wait=BOOKS_RATE_LIMIT_MAX_WAIT,
+)
+
+_memory = TTLCache(maxsize=BOOKS_CACHE_SIZE, ttl=BOOKS_CACHE_TTL)
+persistent = BookSearchCacheRepository()
+
+_stats_lock = threading.Lock()
+_stats = {"api_calls": 0, "coalesced": 0, "persistent_hits": 0, "stale_served": 0, "degraded": 0}
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
 
-_request_window: list[float] = []
 
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Exception | None = None
 
-def _check_rate_limit():
-    now = time.time()
-    global _request_window
-    _request_window = [t for t in _request_window if now - t < 60]
 
-    if len(_request_window) >= BOOKS_RATE_LIMIT_PER_MINUTE:
-        raise RuntimeError("Rate limit exceeded")
+class SingleFlight:
+    """Одновременные вызовы с одним ключом выполняют fn один раз и получают общий результат.
 
-    _request_window.append(now)
+    Ошибку ведущего, для которой shared_error возвращает False (она касается
+    только его вызова), ожидающие не получают — каждый повторяет вызов сам.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(
+        self,
+        key: str,
+        fn: Callable[[], Any],
+        *,
+        shared_error: Callable[[Exception], bool] = lambda e: True,
+    ) -> Any:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+
+            if leader:
+                break
+
+            _count("coalesced")
+            call.done.wait()
+            if call.error is None:
+                return call.result
+            if shared_error(call.error):
+                raise call.error
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+_inflight = SingleFlight()
 
 
 def _normalize_item(item: dict[str, Any]) -> dict[str, Any]:
@@ -40,18 +152,20 @@ def _normalize_item(item: dict[str, Any]) -> dict[str, Any]:
     }
 
 
-def search_books(query: str) -> dict[str, Any]:
-    query = (query or "").strip()
-    if not query:
-        return {"items": [], "source": "google_books"}
+def _cache_key(query: str) -> str:
+    raw = f"{query.casefold()}|{BOOKS_MAX_RESULTS}|{PRINT_TYPE}|{LANG_RESTRICT}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
 
-    _check_rate_limit()
+def _fetch(query: str, user_id: int | None = None) -> list[dict[str, Any]]:
+    limiter.acquire(user_id)
+    _count("api_calls")
 
     params = {
         "q": query,
         "maxResults": BOOKS_MAX_RESULTS,
-        "printType": "books",
-        "langRestrict": "ru",
+        "printType": PRINT_TYPE,
+        "langRestrict": LANG_RESTRICT,
     }
 
     if GOOGLE_BOOKS_API_KEY:
@@ -66,11 +180,13 @@ def search_books(query: str) -> dict[str, Any]:
                 params=params,
                 timeout=BOOKS_TIMEOUT,
             )
+            if response.status_code == 429:
+                # Повтор через секунду квоту не вернёт.
+                raise RateLimited("upstream", retry_after=60)
             response.raise_for_status()
             data = response.json()
 
-            items = [_normalize_item(x) for x in data.get("items", [])]
-            return {"items": items, "source": "google_books"}
+            return [_normalize_item(x) for x in data.get("items", [])]
         except requests.Timeout:
             last_error = "timeout"
         except requests.RequestException:
@@ -78,4 +194,101 @@ def search_books(query: str) -> dict[str, Any]:
 
         time.sleep(0.8)
 
-    raise RuntimeError(last_error or "external_api_error")
\ No newline at end of file
+    raise RuntimeError(last_error or "external_api_error")
+
+
+def _read_persistent(key: str):
+    db = SessionLocal()
+    try:
+        entry = persistent.get(db, key)
+        return (entry.items, entry.expires_at) if entry else None
+    except Exception:
+        logger.exception("books cache read failed")
+        return None
+    finally:
+        db.close()
+
+
+def _write_persistent(key: str, query: str, items: list[dict], ttl: float) -> None:
+    db = SessionLocal()
+    try:
+        persistent.put(db, key=key, query=query, items=items, ttl=ttl)
+        persistent.evict(db, stale_ttl=BOOKS_STALE_TTL)
+    except Exception:
+        logger.exception("books cache write failed")
+    finally:
+        db.close()
+
+
+def _response(items: list[dict], **flags) -> dict[str, Any]:
+    return {"items": items, "source": "google_books", **flags}
+
+
+def _load(key: str, query: str, user_id: int | None) -> dict[str, Any]:
+    stored = _read_persistent(key)
+    if stored:
+        items, expires_at = stored
+        remaining = (expires_at - datetime.utcnow()).total_seconds()
+        if remaining > 0:
+            _count("persistent_hits")
+            _memory.set(key, _response(items), ttl=remaining)
+            return _response(items)
+
+    try:
+        items = _fetch(query, user_id)
+    except RuntimeError as e:
+        if isinstance(e, RateLimited) and e.scope == "user":
+            # Лимит ведущего пользователя — не повод отдавать устаревшее всем, кто ждёт тот же запрос.
+            raise
+        elif stored:
+            _count("stale_served")
+            result = _response(stored[0], stale=True)
+        elif isinstance(e, RateLimited):
+            _count("degraded")
+            result = _response([], degraded=True)
+        else:
+            raise
+        logger.warning("books api unavailable (%s), serving %s", e, "stale" if stored else "empty")
+        _memory.set(key, result, ttl=BOOKS_DEGRADED_TTL)
+        return result
+
+    ttl = BOOKS_CACHE_TTL if items else BOOKS_NEGATIVE_TTL
+    result = _response(items)
+    _memory.set(key, result, ttl=ttl)
+    _write_persistent(key, query, items, ttl)
+    return result
+
+
+def _shared_error(error: Exception) -> bool:
+    return not (isinstance(error, RateLimited) and error.scope == "user")
+
+
+def search_books(query: str, *, user_id: int | None = None) -> dict[str, Any]:
+    query = " ".join((query or "").split())
+    if not query:
+        return _response([])
+
+    key = _cache_key(query)
+    cached = _memory.get(key)
+    if cached is not None:
+        return cached
+    try:
+        return _inflight.do(key, lambda: _load(key, query, user_id), shared_error=_shared_error)
+    except RateLimited as e:
+        if e.scope != "user":
+            raise
+        stored = _read_persistent(key)
+        if not stored:
+            raise
+        _count("stale_served")
+        return _response(stored[0], stale=True)
+
+
+def clear_cache() -> None:
+    _memory.clear()
+
+
+def cache_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    return {**stats, "memory": _memory.stats(), "rate_limit": limiter.get_stats()}
@@ -0,0 +1,306 @@
+import hashlib
+import logging
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+import httpx
+from sqlalchemy.orm import Session
+
+from back.models.upload import Upload
+from back.repositories.flashcards import FlashcardRepository
+from back.repositories.generation_cache import GenerationCacheRepository
+from back.services.ai_prompt import PROMPT_VERSION, build_cards_prompt
+from back.services import ollama_client, text_cache
+from back.services.card_stream import CardStreamParser
+from back.services.chunking import estimate_tokens, split_windows
+from back.services.generation_progress import GenerationProgress
+from back.services.status_bus import publish_progress
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3")
+
+GEN_MAX_PAGES = int(os.getenv("GEN_MAX_PAGES", "200"))
+GEN_WINDOW_TOKENS = int(os.getenv("GEN_WINDOW_TOKENS", "1500"))
+GEN_MAX_WINDOWS = int(os.getenv("GEN_MAX_WINDOWS", "8"))
+GEN_WINDOW_CONCURRENCY = int(os.getenv("GEN_WINDOW_CONCURRENCY", "2"))
+GEN_CARDS_PER_WINDOW = int(os.getenv("GEN_CARDS_PER_WINDOW", "7"))
+GEN_CACHE_TTL = int(os.getenv("GEN_CACHE_TTL", str(30 * 24 * 3600)))
+GEN_CACHE_MAX_ENTRIES = int(os.getenv("GEN_CACHE_MAX_ENTRIES", "5000"))
+# Карточки из потока копятся и пишутся одним INSERT: по GEN_CARD_FLUSH_SIZE штук
+# или когда новых карточек не было GEN_CARD_FLUSH_INTERVAL секунд.
+GEN_CARD_FLUSH_SIZE = int(os.getenv("GEN_CARD_FLUSH_SIZE", "20"))
+GEN_CARD_FLUSH_INTERVAL = float(os.getenv("GEN_CARD_FLUSH_INTERVAL", "0.5"))
+
+generation_cache = GenerationCacheRepository()
+flashcards = FlashcardRepository()
+
+
+class GenerationError(RuntimeError):
+    def __init__(self, message: str, *, retryable: bool = True, retry_after: int | None = None):
+        super().__init__(message)
+        self.retryable = retryable
+        # Подсказка очереди, через сколько секунд повторять (например, модель перегружена).
+        self.retry_after = retry_after
+
+
+class GenerationCancelled(GenerationError):
+    def __init__(self, message: str = "Генерация отменена"):
+        super().__init__(message, retryable=False)
+
+
+def _stream_model(prompt: str, cancel: threading.Event | None = None) -> Iterator[str]:
+    """Отдаёт куски ответа модели по мере генерации.
+
+    Если вызывающий закрывает генератор раньше конца ответа, соединение с
+    Ollama рвётся и модель прекращает генерацию.
+    """
+    try:
+        yield from ollama_client.iter_chat(MODEL_NAME, [{"role": "user", "content": prompt}], cancel=cancel)
+    except ollama_client.Cancelled:
+        raise GenerationCancelled()
+    except ollama_client.ModelBusy as e:
+        raise GenerationError(str(e), retry_after=e.retry_after)
+    except ollama_client.OllamaError:
+        raise GenerationError("Ошибка модели")
+    except httpx.HTTPError as e:
+        raise GenerationError(f"Модель недоступна: {e}")
+
+
+def _cards_for_window(window: str) -> int:
+    """Число карточек пропорционально объёму окна: короткий хвост документа даёт меньше карточек."""
+    share = estimate_tokens(window) / GEN_WINDOW_TOKENS
+    return max(1, min(GEN_CARDS_PER_WINDOW, round(GEN_CARDS_PER_WINDOW * share)))
+
+
+def _generate_window(
+    window: str,
+    on_card: Callable[[dict], None],
+    on_token: Callable[[], None] | None = None,
+    cancel: threading.Event | None = None,
+) -> int:
+    """Передаёт карточки окна в on_card по мере их появления в ответе модели.
+
+    Как только набрано нужное число карточек, поток ответа закрывается,
+    чтобы модель не тратила время на лишний текст.
+    """
+    max_cards = _cards_for_window(window)
+    parser = CardStreamParser()
+    found = 0
+
+    stream = _stream_model(build_cards_prompt(window, max_cards=max_cards, max_chars=None), cancel)
+    try:
+        for piece in stream:
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled()
+            if on_token:
+                on_token()
+            for card in parser.feed(piece):
+                on_card(card)
+                found += 1
+                if found >= max_cards:
+                    return found
+    finally:
+        stream.close()
+
+    if not parser.seen_json:
+        raise GenerationError("Нет JSON в ответе")
+    return found
+
+
+def _card_key(question: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", question.casefold()).split())
+
+
+def _run_windows(
+    windows: list[str],
+    on_card: Callable[[dict], None],
+    progress: GenerationProgress | None = None,
+    cancel: threading.Event | None = None,
+    flush: Callable[[], None] | None = None,
+) -> int:
+    """Прогоняет окна через модель не более чем в GEN_WINDOW_CONCURRENCY потоков.
+
+    on_card вызывается в текущем потоке (у него сессия БД) по мере прихода
+    карточек из любого окна; flush — там же, когда карточки перестают
+    приходить, и в конце. Сбой отдельного окна не отменяет результат
+    остальных; ошибка поднимается, только если не удалось ни одно окно.
+    Возвращает число упавших окон.
+    """
+    events: queue.Queue = queue.Queue()
+
+    def run(window):
+        tokens = 0
+
+        def on_token():
+            nonlocal tokens
+            tokens += 1
+            if progress:
+                progress.add_tokens()
+
+        try:
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled()
+            _generate_window(window, lambda card: events.put(("card", card)), on_token, cancel)
+            events.put(("done", None))
+        except Exception as e:
+            events.put(("done", e))
+        finally:
+            if progress:
+                progress.window_done(tokens)
+
+    errors = []
+    workers = max(1, min(GEN_WINDOW_CONCURRENCY, len(windows)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for window in windows:
+            pool.submit(run, window)
+
+        pending = len(windows)
+        while pending:
+            try:
+                kind, value = events.get(timeout=GEN_CARD_FLUSH_INTERVAL if flush else None)
+            except queue.Empty:
+                flush()
+                continue
+            if kind == "card":
+                on_card(value)
+                continue
+            pending -= 1
+            if value is not None:
+                errors.append(value)
+
+    if flush:
+        flush()
+    if cancel is not None and cancel.is_set():
+        raise GenerationCancelled()
+    unexpected = [e for e in errors if not isinstance(e, GenerationError)]
+    if unexpected:
+        raise unexpected[0]
+    if errors and len(errors) == len(windows):
+        raise errors[0]
+    if errors:
+        logger.warning("%s of %s windows failed: %s", len(errors), len(windows), errors[0])
+    return len(errors)
+
+
+def _windows_for(pages: list[str], max_windows: int | None) -> list[str]:
+    return split_windows(pages, GEN_WINDOW_TOKENS, max_windows or GEN_MAX_WINDOWS)
+
+
+def _cache_key(windows: list[str]) -> tuple[str, str, int]:
+    """Ключ кэша генерации: хэш текста окон, модель, версия промпта и число карточек."""
+    text_hash = hashlib.sha256("\x00".join(windows).encode("utf-8")).hexdigest()
+    max_cards = sum(_cards_for_window(w) for w in windows)
+    key = hashlib.sha256(f"{text_hash}|{MODEL_NAME}|{PROMPT_VERSION}|{max_cards}".encode("utf-8")).hexdigest()
+    return key, text_hash, max_cards
+
+
+def _apply_cached(db: Session, upload: Upload, windows: list[str]) -> int | None:
+    key, _, _ = _cache_key(windows)
+    entry = generation_cache.get(db, key, ttl=GEN_CACHE_TTL)
+    if entry is None:
+        return None
+
+    flashcards.replace(db, upload.id, entry.cards)
+    return len(entry.cards)
+
+
+def apply_cached_cards(db: Session, upload: Upload, *, max_windows: int | None = None) -> int | None:
+    """Подставляет карточки из кэша генерации без обращения к модели и S3.
+
+    Используется API до постановки задачи в очередь: проверяется только текст,
+    уже лежащий в page_texts. None — в кэше нет результата, нужна генерация.
+    Коммит остаётся за вызывающим.
+    """
+    if not upload.content_hash:
+        return None
+
+    windows = _windows_for(text_cache.load_pages(db, upload.content_hash, GEN_MAX_PAGES), max_windows)
+    if not windows:
+        return None
+    return _apply_cached(db, upload, windows)
+
+
+def generate_cards_for_upload(
+    db: Session,
+    upload: Upload,
+    *,
+    max_windows: int | None = None,
+    force: bool = False,
+    cancel: threading.Event | None = None,
+) -> int:
+    """Генерирует карточки загрузки; force=True игнорирует кэш генерации (но обновляет его).
+
+    Установленный cancel прерывает запросы к модели и поднимает GenerationCancelled.
+    """
+    pages = text_cache.get_pages(db, upload, max_pages=GEN_MAX_PAGES)
+    windows = _windows_for(pages, max_windows)
+    if not windows:
+        raise GenerationError("Нет текста", retryable=False)
+
+    if not force:
+        cached = _apply_cached(db, upload, windows)
+        if cached is not None:
+            return cached
+
+    # Карточки сохраняются и объявляются клиентам пачками, не дожидаясь конца генерации.
+    # Прежний набор удаляется в одной транзакции с первой пачкой нового: если модель
+    # не дала ни одной карточки, старые карточки остаются.
+    seen: set[str] = set()
+    saved: list[dict] = []
+    buffer: list[dict] = []
+    replaced = False
+    progress = GenerationProgress(
+        lambda snapshot: publish_progress(upload, snapshot),
+        windows=len(windows),
+        expected_cards=sum(_cards_for_window(w) for w in windows),
+    )
+
+    def persist(card: dict):
+        q = str(card.get("q") or "").strip()
+        a = str(card.get("a") or "").strip()
+        key = _card_key(q)
+        if not q or not a or key in seen:
+            return
+        seen.add(key)
+        saved.append({"q": q, "a": a})
+        buffer.append(saved[-1])
+        if len(buffer) >= GEN_CARD_FLUSH_SIZE:
+            flush()
+
+    def flush():
+        nonlocal replaced
+        if not buffer:
+            return
+        if replaced:
+            flashcards.insert_many(db, upload.id, buffer)
+        else:
+            flashcards.replace(db, upload.id, buffer)
+            replaced = True
+        db.commit()
+        buffer.clear()
+        progress.set_cards(len(saved))
+
+    failed = _run_windows(windows, persist, progress, cancel, flush)
+    if not replaced:
+        flashcards.replace(db, upload.id, [])
+    progress.finish()
+
+    # Неполный результат (часть окон упала) не кэшируется, чтобы повтор мог его улучшить.
+    if not failed:
+        key, text_hash, max_cards = _cache_key(windows)
+        generation_cache.put(
+            db,
+            key=key,
+            text_hash=text_hash,
+            model=MODEL_NAME,
+            prompt_version=PROMPT_VERSION,
+            max_cards=max_cards,
+            cards=saved,
+        )
+        generation_cache.evict(db, ttl=GEN_CACHE_TTL, max_entries=GEN_CACHE_MAX_ENTRIES)
+    return len(saved)
@@ -0,0 +1,60 @@
+"""Инкрементальный разбор карточек из потокового ответа модели.
+
+Модель отвечает JSON вида {"cards": [{"q": ..., "a": ...}, ...]}, но приходит
+он кусками. Парсер проходит каждый символ один раз и держит в памяти только
+текущий «листовой» объект — без вложенных {...}, каким и является карточка.
+Как только такой объект закрылся, он разбирается json.loads и, если в нём
+есть q и a, сразу отдаётся вызывающему.
+"""
+import json
+
+
+class CardStreamParser:
+    def __init__(self):
+        self._capture: list[str] | None = None
+        self._in_string = False
+        self._escaped = False
+        self.seen_json = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        cards = []
+        start = 0 if self._capture is not None else None
+
+        for i, ch in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                # Вложенная скобка: внешний объект не карточка, кандидатом становится внутренний.
+                self.seen_json = True
+                self._capture = []
+                start = i
+            elif ch == "}" and self._capture is not None:
+                self._capture.append(chunk[start:i + 1])
+                card = self._parse("".join(self._capture))
+                if card:
+                    cards.append(card)
+                self._capture = None
+                start = None
+
+        if self._capture is not None and start is not None:
+            self._capture.append(chunk[start:])
+        return cards
+
+    @staticmethod
+    def _parse(text: str) -> dict | None:
+        try:
+            obj = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(obj, dict) or "q" not in obj or "a" not in obj:
+            return None
+        return obj
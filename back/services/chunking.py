@@ -0,0 +1,95 @@
+"""Разбиение текста документа на окна для генерации карточек.
+
+Размер окна задаётся в токенах. Точный токенизатор модели здесь недоступен,
+поэтому используется оценка CHARS_PER_TOKEN символов на токен — с запасом
+для русского текста.
+"""
+import re
+
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _split_oversized(text: str, token_budget: int) -> list[str]:
+    """Делит слишком длинный абзац по предложениям, а в крайнем случае — по символам."""
+    limit = token_budget * CHARS_PER_TOKEN
+    parts: list[str] = []
+    current = ""
+    for sentence in _SENTENCE_RE.split(text):
+        while len(sentence) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(sentence[:limit])
+            sentence = sentence[limit:]
+        if current and len(current) + 1 + len(sentence) > limit:
+            parts.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _blocks(pages: list[str], token_budget: int) -> list[str]:
+    """Страницы, которые помещаются в окно, остаются целыми; остальные режутся по абзацам."""
+    blocks: list[str] = []
+    for page in pages:
+        page = page.strip()
+        if not page:
+            continue
+        if estimate_tokens(page) <= token_budget:
+            blocks.append(page)
+            continue
+        for paragraph in _PARAGRAPH_RE.split(page):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if estimate_tokens(paragraph) <= token_budget:
+                blocks.append(paragraph)
+            else:
+                blocks.extend(_split_oversized(paragraph, token_budget))
+    return blocks
+
+
+def _spread(windows: list[str], max_windows: int) -> list[str]:
+    """Равномерно выбирает max_windows окон, чтобы покрыть весь документ, а не только начало."""
+    if len(windows) <= max_windows:
+        return windows
+    if max_windows == 1:
+        return windows[:1]
+    step = (len(windows) - 1) / (max_windows - 1)
+    return [windows[round(i * step)] for i in range(max_windows)]
+
+
+def split_windows(pages: list[str], token_budget: int, max_windows: int | None = None) -> list[str]:
+    """Собирает страницы в окна не больше token_budget токенов.
+
+    Границы окон проходят по страницам или абзацам; если окон больше
+    max_windows, берутся равномерно распределённые по документу.
+    """
+    windows: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+
+    for block in _blocks(pages, token_budget):
+        tokens = estimate_tokens(block)
+        if current and current_tokens + tokens > token_budget:
+            windows.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += tokens
+
+    if current:
+        windows.append("\n\n".join(current))
+
+    if max_windows is not None:
+        windows = _spread(windows, max_windows)
+    return windows
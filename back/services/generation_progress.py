@@ -0,0 +1,87 @@
+"""Прогресс генерации карточек: токены, карточки, скорость и оценка времени.
+
+Токены считаются по кускам потокового ответа Ollama (обычно один кусок —
+один токен). Пока не завершилось ни одно окно, объём ответа оценивается как
+GEN_TOKENS_PER_CARD токенов на карточку; дальше — по среднему числу токенов
+в уже завершённых окнах.
+
+События публикуются не чаще раза в GEN_PROGRESS_INTERVAL секунд: быстрая
+модель не должна превращать каждый токен в сообщение шины.
+"""
+import os
+import threading
+import time
+from typing import Callable
+
+GEN_PROGRESS_INTERVAL = float(os.getenv("GEN_PROGRESS_INTERVAL", "0.5"))
+GEN_TOKENS_PER_CARD = int(os.getenv("GEN_TOKENS_PER_CARD", "60"))
+
+
+class GenerationProgress:
+    def __init__(
+        self,
+        publish: Callable[[dict], None],
+        *,
+        windows: int,
+        expected_cards: int,
+        interval: float = GEN_PROGRESS_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.publish = publish
+        self.windows = windows
+        self.expected_cards = expected_cards
+        self.interval = interval
+        self.clock = clock
+        self.started = clock()
+        self.tokens = 0
+        self.cards = 0
+        self.windows_done = 0
+        self._tokens_in_done_windows = 0
+        self._last_published: float | None = None
+        self._lock = threading.Lock()
+
+    def add_tokens(self, count: int = 1) -> None:
+        with self._lock:
+            self.tokens += count
+        self._maybe_publish()
+
+    def set_cards(self, count: int) -> None:
+        with self._lock:
+            self.cards = count
+        self._maybe_publish()
+
+    def window_done(self, tokens: int) -> None:
+        with self._lock:
+            self.windows_done += 1
+            self._tokens_in_done_windows += tokens
+        self._maybe_publish()
+
+    def finish(self) -> None:
+        self._maybe_publish(force=True)
+
+    def _expected_tokens(self) -> int:
+        if self.windows_done:
+            return round(self._tokens_in_done_windows / self.windows_done * self.windows)
+        return self.expected_cards * GEN_TOKENS_PER_CARD
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = self.clock() - self.started
+            rate = self.tokens / elapsed if elapsed > 0 and self.tokens else None
+            remaining = max(self._expected_tokens() - self.tokens, 0)
+            return {
+                "tokens": self.tokens,
+                "cards": self.cards,
+                "windows_done": self.windows_done,
+                "windows_total": self.windows,
+                "tokens_per_second": round(rate, 2) if rate else None,
+                "eta_seconds": round(remaining / rate, 1) if rate else None,
+            }
+
+    def _maybe_publish(self, force: bool = False) -> None:
+        with self._lock:
+            now = self.clock()
+            if not force and self._last_published is not None and now - self._last_published < self.interval:
+                return
+            self._last_published = now
+        self.publish(self.snapshot())
@@ -0,0 +1,496 @@
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from back.db.database import SessionLocal
+from back.models.generation_batch import GenerationBatch
+from back.models.generation_job import GenerationJob, JobStatus
+from back.models.upload import Upload, UploadStatus
+from back.repositories.generation_jobs import GenerationJobRepository
+from back.services.card_generation import (
+    GenerationCancelled,
+    GenerationError,
+    apply_cached_cards,
+    generate_cards_for_upload,
+)
+from back.services.status_bus import publish_status
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "600"))
+JOB_RETRY_BASE_DELAY = int(os.getenv("JOB_RETRY_BASE_DELAY", "15"))
+# Сколько задач может ждать или выполняться одновременно; сверх этого API отвечает 503.
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+# Та же граница для одного пользователя: его пакет не может занять всю очередь.
+JOB_QUEUE_LIMIT_PER_USER = int(os.getenv("JOB_QUEUE_LIMIT_PER_USER", "30"))
+JOB_QUEUE_RETRY_AFTER = int(os.getenv("JOB_QUEUE_RETRY_AFTER", "30"))
+# Сколько задач одного пользователя выполняется одновременно, чтобы пакет одного не занимал все воркеры.
+JOB_MAX_RUNNING_PER_USER = int(os.getenv("JOB_MAX_RUNNING_PER_USER", "2"))
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+THROUGHPUT_WINDOW = int(os.getenv("THROUGHPUT_WINDOW", "3600"))
+# Как часто воркер проверяет, не отменили ли выполняющуюся задачу.
+JOB_CANCEL_POLL_INTERVAL = float(os.getenv("JOB_CANCEL_POLL_INTERVAL", "2"))
+
+PRIORITIES = {"low": -1, "normal": 0, "high": 1}
+
+repo = GenerationJobRepository()
+
+# Флаги отмены выполняющихся в этом процессе задач: job_id -> Event, который видит генерация.
+_cancel_events: dict[int, threading.Event] = {}
+# Аренды (locked_by) этих же задач — с ними heartbeat продлевает блокировку.
+_leases: dict[int, str | None] = {}
+_cancel_lock = threading.Lock()
+
+
+# Ключ advisory-блокировки Postgres, под которой проверяется ёмкость очереди.
+ADMISSION_LOCK_KEY = 0x6A0B51
+
+
+class QueueFull(RuntimeError):
+    def __init__(self, retry_after: int, message: str = "Очередь генерации переполнена"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def enqueue_generation(
+    db: Session,
+    upload: Upload,
+    *,
+    max_windows: int | None = None,
+    force: bool = False,
+    batch_id: int | None = None,
+    priority: int = 0,
+) -> GenerationJob:
+    active = repo.get_active_for_upload(db, upload.id)
+    if _same_request(active, max_windows=max_windows, force=force):
+        return active
+
+    ensure_capacity(db, 1, user_id=upload.user_id)
+    try:
+        job = _add_job(db, upload, active, max_windows=max_windows, force=force, batch_id=batch_id, priority=priority)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(job)
+    if active:
+        _signal_cancel(active.id)
+    publish_status(upload)
+    return job
+
+
+def _same_request(active: GenerationJob | None, *, max_windows: int | None, force: bool) -> bool:
+    return active is not None and active.force == force and active.max_windows == max_windows
+
+
+def _add_job(
+    db: Session,
+    upload: Upload,
+    active: GenerationJob | None,
+    *,
+    max_windows: int | None,
+    force: bool,
+    batch_id: int | None,
+    priority: int,
+) -> GenerationJob:
+    """Добавляет задачу в текущую транзакцию; коммит и оповещения за вызывающим."""
+    if active:
+        # Новый запрос с другими параметрами заменяет текущую генерацию.
+        repo.request_cancel(db, active, reason="Заменена новой генерацией", commit=False)
+
+    upload.status = UploadStatus.generating
+    db.add(upload)
+    return repo.enqueue(
+        db,
+        upload_id=upload.id,
+        user_id=upload.user_id,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        max_windows=max_windows,
+        force=force,
+        batch_id=batch_id,
+        priority=priority,
+        commit=False,
+    )
+
+
+def _signal_cancel(job_id: int) -> None:
+    with _cancel_lock:
+        event = _cancel_events.get(job_id)
+    if event is not None:
+        event.set()
+
+
+def _release_upload(db: Session, upload_id: int) -> None:
+    """Возвращает загрузку в uploaded, если её генерацию отменили и новой не ставили.
+
+    Карточки, которые отменённая задача успела сохранить, остаются.
+    """
+    upload = db.query(Upload).filter(Upload.id == upload_id).first()
+    if not upload or upload.status != UploadStatus.generating:
+        return
+    if repo.get_active_for_upload(db, upload_id):
+        return
+    upload.status = UploadStatus.uploaded
+    db.add(upload)
+    db.commit()
+    publish_status(upload)
+
+
+def cancel_job(db: Session, job: GenerationJob, *, reason: str = "Отменено пользователем") -> None:
+    """Отменяет задачу: ожидающая снимается сразу, выполняющаяся — как только воркер заметит флаг."""
+    repo.request_cancel(db, job, reason=reason)
+    _signal_cancel(job.id)
+    if job.status == JobStatus.cancelled:
+        _release_upload(db, job.upload_id)
+
+
+def cancel_for_uploads(db: Session, upload_ids: list[int]) -> int:
+    """Отменяет активные задачи перед удалением загрузок, чтобы воркеры не тратили модель впустую."""
+    jobs = repo.list_active_for_uploads(db, upload_ids) if upload_ids else []
+    for job in jobs:
+        repo.request_cancel(db, job, reason="Файл удалён")
+        _signal_cancel(job.id)
+    return len(jobs)
+
+
+def check_cancel(job_id: int) -> bool:
+    """Проверяет флаг отмены в базе и передаёт его генерации. True — генерация оповещена."""
+    db = SessionLocal()
+    try:
+        if not repo.should_stop(db, job_id):
+            return False
+    finally:
+        db.close()
+    with _cancel_lock:
+        event = _cancel_events.get(job_id)
+    if event is None:
+        return False
+    event.set()
+    return True
+
+
+def ensure_capacity(db: Session, count: int, *, user_id: int) -> None:
+    """Проверяет, что в очереди есть место для count задач — всего и у пользователя.
+
+    На Postgres проверка и последующие вставки до коммита идут под
+    advisory-блокировкой, поэтому одновременные запросы не превышают лимиты.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADMISSION_LOCK_KEY})
+
+    if repo.count_active(db) + count > JOB_QUEUE_LIMIT:
+        db.rollback()
+        raise QueueFull(JOB_QUEUE_RETRY_AFTER)
+    if repo.count_active(db, user_id=user_id) + count > JOB_QUEUE_LIMIT_PER_USER:
+        db.rollback()
+        raise QueueFull(JOB_QUEUE_RETRY_AFTER, f"Не больше {JOB_QUEUE_LIMIT_PER_USER} задач генерации на пользователя")
+
+
+def complete_from_cache(db: Session, upload: Upload, *, max_windows: int | None = None) -> int | None:
+    """Завершает генерацию сразу, если результат уже есть в кэше генерации.
+
+    Возвращает число карточек или None, если нужна задача в очереди.
+    """
+    created = _apply_from_cache(db, upload, max_windows=max_windows)
+    if created is None:
+        return None
+
+    db.commit()
+    publish_status(upload)
+    return created
+
+
+def _apply_from_cache(db: Session, upload: Upload, *, max_windows: int | None) -> int | None:
+    if repo.get_active_for_upload(db, upload.id):
+        return None
+
+    created = apply_cached_cards(db, upload, max_windows=max_windows)
+    if created is None:
+        return None
+
+    upload.status = UploadStatus.done
+    db.add(upload)
+    return created
+
+
+def schedule_batch(
+    db: Session,
+    uploads: list[Upload],
+    *,
+    user_id: int,
+    priority: int = 0,
+    max_parallel: int | None = None,
+    max_windows: int | None = None,
+    force: bool = False,
+) -> tuple[GenerationBatch, list[GenerationJob]]:
+    """Ставит генерацию для нескольких загрузок одним пакетом.
+
+    Результаты из кэша сразу записываются завершёнными задачами пакета; для
+    загрузок, у которых уже идёт генерация, возвращается текущая задача.
+    Пакет ставится одной транзакцией: целиком или, при QueueFull и любой
+    другой ошибке, никак.
+    """
+    ensure_capacity(db, len(uploads), user_id=user_id)
+
+    jobs, superseded = [], []
+    try:
+        batch = repo.create_batch(
+            db,
+            user_id=user_id,
+            priority=priority,
+            max_parallel=min(max_parallel or BATCH_MAX_PARALLEL, BATCH_MAX_PARALLEL),
+            commit=False,
+        )
+        for upload in uploads:
+            created = None if force else _apply_from_cache(db, upload, max_windows=max_windows)
+            if created is not None:
+                jobs.append(
+                    repo.record_done(
+                        db,
+                        upload_id=upload.id,
+                        user_id=upload.user_id,
+                        created=created,
+                        batch_id=batch.id,
+                        priority=priority,
+                        commit=False,
+                    )
+                )
+                continue
+
+            active = repo.get_active_for_upload(db, upload.id)
+            if _same_request(active, max_windows=max_windows, force=force):
+                jobs.append(active)
+                continue
+            if active:
+                superseded.append(active.id)
+            jobs.append(
+                _add_job(
+                    db,
+                    upload,
+                    active,
+                    max_windows=max_windows,
+                    force=force,
+                    batch_id=batch.id,
+                    priority=priority,
+                )
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for job_id in superseded:
+        _signal_cancel(job_id)
+    for upload in uploads:
+        publish_status(upload)
+    return batch, jobs
+
+
+def _throughput(rows, elapsed: float) -> dict:
+    """rows — (started_at, finished_at, created) завершённых задач."""
+    durations = [(f - s).total_seconds() for s, f, _ in rows if s and f]
+    cards = sum(created or 0 for _, _, created in rows)
+    minutes = elapsed / 60 if elapsed > 0 else None
+    return {
+        "jobs_per_minute": round(len(rows) / minutes, 3) if minutes else None,
+        "cards_per_minute": round(cards / minutes, 3) if minutes else None,
+        "avg_job_seconds": round(sum(durations) / len(durations), 3) if durations else None,
+    }
+
+
+def batch_progress(db: Session, batch: GenerationBatch) -> dict:
+    jobs = repo.list_batch_jobs(db, batch.id)
+    counts = {status.value: 0 for status in JobStatus}
+    for job in jobs:
+        counts[job.status.value] += 1
+
+    finished = [job for job in jobs if job.status in (JobStatus.done, JobStatus.error, JobStatus.cancelled)]
+    now = datetime.utcnow()
+    last_finished = max((job.finished_at for job in finished if job.finished_at), default=None)
+    elapsed = ((last_finished if len(finished) == len(jobs) else now) - batch.created_at).total_seconds()
+
+    done = [(job.started_at, job.finished_at, job.created) for job in jobs if job.status == JobStatus.done]
+    remaining = len(jobs) - len(finished)
+    eta = round(elapsed / len(finished) * remaining, 1) if finished and remaining else None
+
+    return {
+        "batch_id": batch.id,
+        "priority": batch.priority,
+        "max_parallel": batch.max_parallel,
+        "total": len(jobs),
+        "counts": counts,
+        "cards_created": sum(job.created or 0 for job in jobs),
+        "elapsed_seconds": round(elapsed, 3),
+        "eta_seconds": eta,
+        **_throughput(done, elapsed),
+        "jobs": jobs,
+    }
+
+
+def queue_metrics(db: Session) -> dict:
+    stats = repo.queue_stats(db, since=datetime.utcnow() - timedelta(seconds=THROUGHPUT_WINDOW))
+    return {
+        "window_seconds": THROUGHPUT_WINDOW,
+        "counts": stats["counts"],
+        **_throughput(stats["finished"], THROUGHPUT_WINDOW),
+    }
+
+
+def _retry_delay(attempts: int) -> int:
+    return JOB_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0))
+
+
+def process_job(job_id: int) -> None:
+    cancel = threading.Event()
+    with _cancel_lock:
+        _cancel_events[job_id] = cancel
+
+    db = SessionLocal()
+    try:
+        job = repo.get(db, job_id)
+        if not job or job.status != JobStatus.running:
+            return
+
+        lease = job.locked_by
+        with _cancel_lock:
+            _leases[job_id] = lease
+
+        upload_id = job.upload_id
+        if job.cancel_requested:
+            if repo.mark_cancelled(db, job, reason=job.last_error or "Генерация отменена", lease=lease):
+                _release_upload(db, upload_id)
+            return
+
+        upload = db.query(Upload).filter(Upload.id == upload_id).first()
+        if not upload:
+            repo.fail(db, job, error="Файл не найден", retry_delay=None, lease=lease)
+            return
+
+        try:
+            created = generate_cards_for_upload(
+                db, upload, max_windows=job.max_windows, force=job.force, cancel=cancel
+            )
+        except GenerationCancelled:
+            db.rollback()
+            # Задачу могли удалить вместе с загрузкой — тогда отмечать нечего.
+            job = repo.get(db, job_id)
+            if job and repo.mark_cancelled(db, job, reason=job.last_error or "Генерация отменена", lease=lease):
+                _release_upload(db, upload_id)
+            logger.info("generation job %s cancelled", job_id)
+            return
+        except Exception as e:
+            db.rollback()
+            retryable = not isinstance(e, GenerationError) or e.retryable
+            delay = _retry_delay(job.attempts)
+            if isinstance(e, GenerationError) and e.retry_after:
+                delay = max(delay, e.retry_after)
+            status = repo.fail(
+                db,
+                job,
+                error=str(e) or e.__class__.__name__,
+                retry_delay=delay if retryable else None,
+                lease=lease,
+                upload=upload,
+            )
+            if status is None:
+                logger.warning("generation job %s lost its lock, error discarded: %s", job_id, e)
+                return
+            if status == JobStatus.error:
+                publish_status(upload)
+            logger.warning("generation job %s failed (status=%s): %s", job_id, status.value, e)
+            return
+
+        upload.status = UploadStatus.done
+        db.add(upload)
+        if not repo.complete(db, job, created=created, lease=lease):
+            # Задачу уже вернули в очередь и, возможно, выполняет другой воркер.
+            logger.warning("generation job %s lost its lock, result discarded", job_id)
+            return
+        publish_status(upload)
+    finally:
+        db.close()
+        with _cancel_lock:
+            _cancel_events.pop(job_id, None)
+            _leases.pop(job_id, None)
+
+
+def heartbeat(job_id: int) -> bool:
+    """Продлевает блокировку задачи; если аренда потеряна, останавливает её генерацию."""
+    with _cancel_lock:
+        if job_id not in _leases:
+            return False
+        lease = _leases[job_id]
+
+    db = SessionLocal()
+    try:
+        alive = repo.heartbeat(db, job_id, lease=lease, visibility_timeout=JOB_VISIBILITY_TIMEOUT)
+    finally:
+        db.close()
+    if not alive:
+        logger.warning("generation job %s lost its lock, stopping", job_id)
+        _signal_cancel(job_id)
+    return alive
+
+
+def claim_next_job() -> int | None:
+    db = SessionLocal()
+    try:
+        job = repo.claim_next(
+            db,
+            visibility_timeout=JOB_VISIBILITY_TIMEOUT,
+            max_running_per_user=JOB_MAX_RUNNING_PER_USER,
+        )
+        return job.id if job else None
+    finally:
+        db.close()
+
+
+def recover(db: Session) -> dict:
+    """Возвращает в очередь задачи упавших воркеров и перезапускает «зависшие» загрузки.
+
+    Задача running с истёкшим locked_until считается брошенной: она снова
+    становится queued либо, если попытки исчерпаны, переводится в error.
+    Брошенная задача, которую успели отменить, просто закрывается как cancelled.
+    Загрузка в статусе generating без активной задачи (например, после падения
+    процесса, начавшего генерацию) получает новую задачу.
+    """
+    requeued = 0
+    failed = 0
+
+    for job in repo.list_expired(db):
+        # Условия на аренду и истёкшую блокировку: если воркер успел продлить её или
+        # закрыть задачу после list_expired, recover ничего не меняет.
+        lease = job.locked_by
+        if job.cancel_requested:
+            if repo.mark_cancelled(
+                db, job, reason=job.last_error or "Генерация отменена", lease=lease, expired=True
+            ):
+                _release_upload(db, job.upload_id)
+            continue
+
+        upload = db.query(Upload).filter(Upload.id == job.upload_id).first()
+        status = repo.fail(
+            db, job, error="Истекло время ожидания воркера", retry_delay=0, lease=lease, expired=True, upload=upload
+        )
+        if status == JobStatus.queued:
+            requeued += 1
+        elif status == JobStatus.error:
+            failed += 1
+            if upload:
+                publish_status(upload)
+
+    stuck = db.query(Upload).filter(Upload.status == UploadStatus.generating).all()
+    restarted = 0
+    for upload in stuck:
+        # Учитываются и задачи с запрошенной отменой: загрузку освободит сам воркер.
+        if repo.list_active_for_uploads(db, [upload.id]):
+            continue
+        repo.enqueue(db, upload_id=upload.id, user_id=upload.user_id, max_attempts=JOB_MAX_ATTEMPTS)
+        restarted += 1
+
+    return {"requeued": requeued, "failed": failed, "restarted": restarted}
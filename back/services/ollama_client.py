@@ -0,0 +1,277 @@
+"""Клиент Ollama с пулом соединений и ограничением параллелизма.
+
+Запросы идут через один httpx.AsyncClient, который живёт в отдельном потоке
+с собственным циклом событий: соединения к OLLAMA_URL переиспользуются всеми
+генерациями процесса. Синхронный код (генерация в потоках воркера) читает
+ответ через iter_chat.
+
+Перед запросом генерация занимает слот у ConcurrencyGovernor: общий
+(OLLAMA_MAX_CONCURRENCY) и отдельный для модели (OLLAMA_MODEL_CONCURRENCY,
+точечно — OLLAMA_MODEL_LIMITS="llama3=1,mistral=2"). Не больше
+OLLAMA_MAX_QUEUE генераций ждут слот, и не дольше OLLAMA_QUEUE_TIMEOUT
+секунд; иначе поднимается ModelBusy с подсказкой retry_after.
+Лимиты действуют в пределах одного процесса.
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator
+
+import httpx
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "8"))
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+OLLAMA_MODEL_CONCURRENCY = int(os.getenv("OLLAMA_MODEL_CONCURRENCY", str(OLLAMA_MAX_CONCURRENCY)))
+OLLAMA_MODEL_LIMITS = os.getenv("OLLAMA_MODEL_LIMITS", "")
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", "16"))
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "60"))
+OLLAMA_RETRY_AFTER = int(os.getenv("OLLAMA_RETRY_AFTER", "30"))
+# Как часто ожидающий ответа поток проверяет флаг отмены.
+OLLAMA_CANCEL_POLL = float(os.getenv("OLLAMA_CANCEL_POLL", "0.2"))
+
+
+class OllamaError(RuntimeError):
+    pass
+
+
+class Cancelled(OllamaError):
+    pass
+
+
+class ModelBusy(OllamaError):
+    def __init__(self, message: str, *, retry_after: int = OLLAMA_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_model_limits(value: str) -> dict[str, int]:
+    limits = {}
+    for item in value.split(","):
+        name, sep, limit = item.strip().partition("=")
+        if sep and name.strip() and limit.strip().isdigit():
+            limits[name.strip()] = int(limit)
+    return limits
+
+
+class ConcurrencyGovernor:
+    def __init__(
+        self,
+        global_limit: int,
+        *,
+        model_limit: int,
+        model_limits: dict[str, int] | None = None,
+        max_queue: int,
+        max_wait: float,
+        retry_after: int = OLLAMA_RETRY_AFTER,
+    ):
+        self.global_limit = global_limit
+        self.model_limit = model_limit
+        self.model_limits = model_limits or {}
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        # Семафоры создаются лениво: они привязываются к циклу, в котором их ждут.
+        self._global: asyncio.Semaphore | None = None
+        self._models: dict[str, asyncio.Semaphore] = {}
+        self.waiting = 0
+        self.active = 0
+        self.stats = {"acquired": 0, "rejected": 0, "timed_out": 0}
+
+    def _semaphores(self, model: str) -> tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.global_limit)
+        if model not in self._models:
+            self._models[model] = asyncio.Semaphore(self.model_limits.get(model, self.model_limit))
+        return self._models[model], self._global
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        if self.waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise ModelBusy("Очередь к модели переполнена", retry_after=self.retry_after)
+
+        model_sem, global_sem = self._semaphores(model)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        self.waiting += 1
+        try:
+            # Сначала слот модели, потом общий: ожидание занятой модели не держит общий слот.
+            await asyncio.wait_for(model_sem.acquire(), timeout=self.max_wait)
+            try:
+                await asyncio.wait_for(global_sem.acquire(), timeout=max(deadline - loop.time(), 0))
+            except BaseException:
+                model_sem.release()
+                raise
+        except asyncio.TimeoutError:
+            self.stats["timed_out"] += 1
+            raise ModelBusy("Модель занята, время ожидания истекло", retry_after=self.retry_after)
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.stats["acquired"] += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            global_sem.release()
+            model_sem.release()
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "active": self.active,
+            "waiting": self.waiting,
+            "global_limit": self.global_limit,
+            "model_limit": self.model_limit,
+            "model_limits": self.model_limits,
+            "max_queue": self.max_queue,
+        }
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        *,
+        governor: ConcurrencyGovernor,
+        timeout: float = OLLAMA_TIMEOUT,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.base_url = base_url
+        self.governor = governor
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.transport = transport
+        self._http: httpx.AsyncClient | None = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self.transport,
+            )
+        return self._http
+
+    async def stream_chat(self, model: str, messages: list[dict]) -> AsyncIterator[str]:
+        """Куски текста ответа /api/chat. Закрытие генератора обрывает запрос к модели."""
+        async with self.governor.slot(model):
+            async with self._client().stream(
+                "POST",
+                "/api/chat",
+                json={"model": model, "stream": True, "messages": messages},
+            ) as resp:
+                if resp.status_code != 200:
+                    raise OllamaError(f"Ollama ответила {resp.status_code}")
+
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    try:
+                        data = json.loads(line)
+                    except ValueError:
+                        continue
+                    piece = data.get("message", {}).get("content", "")
+                    if piece:
+                        yield piece
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class _LoopThread:
+    """Фоновый цикл событий, в котором живёт клиент и его пул соединений."""
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="ollama-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+
+_loop_thread = _LoopThread()
+
+governor = ConcurrencyGovernor(
+    OLLAMA_MAX_CONCURRENCY,
+    model_limit=OLLAMA_MODEL_CONCURRENCY,
+    model_limits=parse_model_limits(OLLAMA_MODEL_LIMITS),
+    max_queue=OLLAMA_MAX_QUEUE,
+    max_wait=OLLAMA_QUEUE_TIMEOUT,
+)
+
+client = OllamaClient(governor=governor)
+
+
+def iter_chat(
+    model: str,
+    messages: list[dict],
+    *,
+    ollama: OllamaClient | None = None,
+    cancel: threading.Event | None = None,
+) -> Iterator[str]:
+    """Синхронная обёртка над stream_chat для кода, работающего в потоках.
+
+    Ответ читается задачей в цикле клиента; закрытие генератора или
+    установленный cancel отменяют её — HTTP-запрос к Ollama обрывается,
+    слот governor освобождается, даже если модель ещё не прислала ни токена.
+    """
+    ollama = ollama or client
+    loop = _loop_thread.get()
+    pieces: queue.Queue = queue.Queue()
+    finished = threading.Event()
+
+    async def pump():
+        try:
+            async for piece in ollama.stream_chat(model, messages):
+                pieces.put(("piece", piece))
+            pieces.put(("end", None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            pieces.put(("error", e))
+        finally:
+            finished.set()
+
+    future = asyncio.run_coroutine_threadsafe(pump(), loop)
+    try:
+        while True:
+            try:
+                kind, value = pieces.get(timeout=OLLAMA_CANCEL_POLL)
+            except queue.Empty:
+                kind, value = None, None
+            # Проверяется и между токенами: при непрерывном потоке get не ждёт таймаута.
+            if cancel is not None and cancel.is_set():
+                raise Cancelled("Генерация отменена")
+            if kind is None:
+                continue
+
+            if kind == "end":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        if not finished.is_set():
+            future.cancel()
+            finished.wait(timeout=OLLAMA_CANCEL_POLL * 10)
@@ -0,0 +1,210 @@
+"""Хэширование паролей на отдельном ограниченном пуле потоков.
+
+argon2 намеренно дорогой по CPU и памяти. Если считать его прямо в
+обработчиках запросов, волна логинов занимает общий пул потоков API и
+тормозит все остальные запросы. Здесь хэши считаются на
+PASSWORD_HASH_WORKERS потоках (argon2-cffi отпускает GIL), а сверх
+PASSWORD_HASH_MAX_QUEUE ожидающих задач запрос сразу получает HashingBusy —
+API отвечает 503 с Retry-After вместо того, чтобы копить очередь.
+Обработчики auth асинхронные и ждут хэш через await, поэтому ожидающие
+входы не занимают потоки threadpool, на котором работают остальные
+синхронные эндпоинты.
+
+Параметры argon2 задаются PASSWORD_ARGON2_*; при PASSWORD_HASH_TARGET_MS > 0
+time_cost подбирается при старте так, чтобы один хэш занимал не больше
+заданного времени на этой машине. Хэши со старыми параметрами
+пересчитываются при успешном входе.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from back.services import auth
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "10"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "2"))
+PASSWORD_ARGON2_TIME_COST = int(os.getenv("PASSWORD_ARGON2_TIME_COST", "3"))
+PASSWORD_ARGON2_MEMORY_COST = int(os.getenv("PASSWORD_ARGON2_MEMORY_COST", "65536"))
+PASSWORD_ARGON2_PARALLELISM = int(os.getenv("PASSWORD_ARGON2_PARALLELISM", "4"))
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "0"))
+PASSWORD_ARGON2_MAX_TIME_COST = int(os.getenv("PASSWORD_ARGON2_MAX_TIME_COST", "10"))
+
+
+class HashingBusy(RuntimeError):
+    def __init__(self, message: str, *, retry_after: int = PASSWORD_HASH_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class HashingPool:
+    def __init__(self, workers: int, *, max_queue: int, max_wait: float, retry_after: int = PASSWORD_HASH_RETRY_AFTER):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.stats = {"completed": 0, "rejected": 0, "timed_out": 0, "busy_seconds": 0.0}
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+        return self._executor
+
+    def submit(self, fn, *args) -> Future:
+        """Ставит fn(*args) в очередь пула; при переполнении — HashingBusy."""
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.stats["rejected"] += 1
+                raise HashingBusy("Слишком много запросов входа, повторите позже", retry_after=self.retry_after)
+            self.pending += 1
+            future = self._pool().submit(self._timed, fn, *args)
+
+        future.add_done_callback(self._done)
+        return future
+
+    def run(self, fn, *args):
+        """Выполняет fn(*args) на пуле, блокируя вызывающий поток до результата."""
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.max_wait)
+        except FutureTimeout:
+            raise self._timed_out(future)
+
+    async def run_async(self, fn, *args):
+        """То же, что run, но ожидание не занимает поток: вызывающий только await-ит future."""
+        future = self.submit(fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            raise self._timed_out(future)
+
+    def _timed_out(self, future: Future) -> HashingBusy:
+        future.cancel()
+        with self._lock:
+            self.stats["timed_out"] += 1
+        return HashingBusy("Время ожидания проверки пароля истекло", retry_after=self.retry_after)
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stats["busy_seconds"] += elapsed
+
+    def _done(self, future):
+        with self._lock:
+            self.pending -= 1
+            if not future.cancelled():
+                self.stats["completed"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            completed = self.stats["completed"]
+            return {
+                **self.stats,
+                "busy_seconds": round(self.stats["busy_seconds"], 3),
+                "avg_ms": round(self.stats["busy_seconds"] / completed * 1000, 2) if completed else None,
+                "pending": self.pending,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "cost": current_cost(),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def configure_cost(*, time_cost: int, memory_cost: int, parallelism: int) -> None:
+    auth.pwd_context.update(
+        argon2__time_cost=time_cost,
+        argon2__memory_cost=memory_cost,
+        argon2__parallelism=parallelism,
+    )
+    _cost.update(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+
+def current_cost() -> dict:
+    return dict(_cost)
+
+
+def _measure_ms(time_cost: int, memory_cost: int, parallelism: int, repeat: int = 2) -> float:
+    from argon2.low_level import Type, hash_secret_raw
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        hash_secret_raw(
+            b"calibration", b"calibration-salt", time_cost=time_cost, memory_cost=memory_cost,
+            parallelism=parallelism, hash_len=32, type=Type.ID,
+        )
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def calibrate(
+    target_ms: float,
+    *,
+    memory_cost: int = PASSWORD_ARGON2_MEMORY_COST,
+    parallelism: int = PASSWORD_ARGON2_PARALLELISM,
+    max_time_cost: int = PASSWORD_ARGON2_MAX_TIME_COST,
+) -> tuple[int, float]:
+    """Наибольший time_cost, при котором хэш укладывается в target_ms (но не меньше 1).
+
+    Возвращает (time_cost, измеренное время в мс).
+    """
+    chosen, chosen_ms = 1, _measure_ms(1, memory_cost, parallelism)
+    for time_cost in range(2, max_time_cost + 1):
+        elapsed = _measure_ms(time_cost, memory_cost, parallelism)
+        if elapsed > target_ms:
+            break
+        chosen, chosen_ms = time_cost, elapsed
+    return chosen, chosen_ms
+
+
+def calibrate_on_startup() -> None:
+    if PASSWORD_HASH_TARGET_MS <= 0:
+        return
+    time_cost, elapsed = calibrate(PASSWORD_HASH_TARGET_MS)
+    configure_cost(
+        time_cost=time_cost,
+        memory_cost=PASSWORD_ARGON2_MEMORY_COST,
+        parallelism=PASSWORD_ARGON2_PARALLELISM,
+    )
+    logger.info("argon2 calibrated: time_cost=%s (%.1f ms, target %.0f ms)", time_cost, elapsed, PASSWORD_HASH_TARGET_MS)
+
+
+_cost: dict = {}
+configure_cost(
+    time_cost=PASSWORD_ARGON2_TIME_COST,
+    memory_cost=PASSWORD_ARGON2_MEMORY_COST,
+    parallelism=PASSWORD_ARGON2_PARALLELISM,
+)
+
+pool = HashingPool(
+    PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+    max_wait=PASSWORD_HASH_QUEUE_TIMEOUT,
+)
+
+
+async def hash_password(password: str) -> str:
+    return await pool.run_async(auth.hash_password, password)
+
+
+async def verify_password(password: str, hashed: str) -> tuple[bool, str | None]:
+    """(совпал ли пароль, новый хэш, если старый посчитан с устаревшими параметрами)."""
+    return await pool.run_async(auth.pwd_context.verify_and_update, password, hashed)
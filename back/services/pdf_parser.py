@@ -1,18 +1,309 @@
-from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional, Union
+import atexit
 import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
 import pdfplumber
+import pypdfium2
+
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pdfium")
+PDF_POOL_SIZE = int(os.getenv("PDF_POOL_SIZE", str(os.cpu_count() or 2)))
+PDF_PAGES_PER_CHUNK = int(os.getenv("PDF_PAGES_PER_CHUNK", "16"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+PDF_STREAM_PAGES_PER_CHUNK = int(os.getenv("PDF_STREAM_PAGES_PER_CHUNK", "4"))
+
+Source = Union[bytes, str]
+
+
+class TextExtractor:
+    """Бэкенд извлечения текста. source — байты PDF или путь к файлу."""
+
+    name = ""
+
+    def page_count(self, source: Source) -> int:
+        raise NotImplementedError
+
+    def extract(self, source: Source, page_numbers: list[int]) -> list[str]:
+        raise NotImplementedError
+
+
+# pdfium не потокобезопасен: внутри одного процесса вызовы сериализуются.
+_pdfium_lock = threading.Lock()
+
+
+class PdfiumExtractor(TextExtractor):
+    name = "pdfium"
+
+    def page_count(self, source: Source) -> int:
+        with _pdfium_lock:
+            doc = pypdfium2.PdfDocument(source)
+            try:
+                return len(doc)
+            finally:
+                doc.close()
+
+    def extract(self, source: Source, page_numbers: list[int]) -> list[str]:
+        result = []
+        with _pdfium_lock:
+            doc = pypdfium2.PdfDocument(source)
+            try:
+                for number in page_numbers:
+                    page = doc[number]
+                    textpage = page.get_textpage()
+                    try:
+                        text = textpage.get_text_bounded()
+                    finally:
+                        textpage.close()
+                        page.close()
+                    result.append(text.replace("\r\n", "\n").strip())
+            finally:
+                doc.close()
+        return result
+
+
+class PdfplumberExtractor(TextExtractor):
+    name = "pdfplumber"
+
+    def __init__(self, layout: bool = False):
+        self.layout = layout
+
+    def _open(self, source: Source):
+        return pdfplumber.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+    def page_count(self, source: Source) -> int:
+        with self._open(source) as pdf:
+            return len(pdf.pages)
+
+    def extract(self, source: Source, page_numbers: list[int]) -> list[str]:
+        with self._open(source) as pdf:
+            return [(pdf.pages[n].extract_text(layout=self.layout) or "").strip() for n in page_numbers]
+
+
+EXTRACTORS: dict[str, TextExtractor] = {
+    PdfiumExtractor.name: PdfiumExtractor(),
+    PdfplumberExtractor.name: PdfplumberExtractor(),
+}
+
+
+def get_extractor(name: str | None = None, *, layout: bool = False) -> TextExtractor:
+    if layout:
+        return PdfplumberExtractor(layout=True)
+
+    name = name or PDF_EXTRACTOR
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF extractor: {name}")
+    return EXTRACTORS[name]
+
+
+_stats: dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def record_timing(backend: str, pages: int, seconds: float):
+    with _stats_lock:
+        entry = _stats.setdefault(backend, {"calls": 0, "pages": 0, "seconds": 0.0})
+        entry["calls"] += 1
+        entry["pages"] += pages
+        entry["seconds"] += seconds
+
+
+def get_extractor_stats() -> dict[str, dict]:
+    with _stats_lock:
+        return {
+            name: {
+                **entry,
+                "ms_per_page": round(entry["seconds"] * 1000 / entry["pages"], 3) if entry["pages"] else None,
+            }
+            for name, entry in _stats.items()
+        }
+
+
+def reset_extractor_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _timed(extractor: TextExtractor, source: Source, page_numbers: list[int], timings: dict) -> list[str]:
+    started = time.perf_counter()
+    texts = extractor.extract(source, page_numbers)
+    pages, seconds = timings.get(extractor.name, (0, 0.0))
+    timings[extractor.name] = (pages + len(page_numbers), seconds + time.perf_counter() - started)
+    return texts
+
+
+def _extract_range(
+    source: Source,
+    start: int,
+    stop: int,
+    backend: str | None,
+    layout: bool,
+) -> tuple[list[str], dict]:
+    """Извлекает страницы [start, stop) и возвращает тексты вместе с замерами по бэкендам.
+
+    Замеры возвращаются вызывающему, а не пишутся в _stats напрямую:
+    функция выполняется и в процессах пула, где общая статистика не видна.
+    """
+    timings: dict = {}
+    primary = get_extractor(backend, layout=layout)
+    numbers = list(range(start, stop))
+    texts = _timed(primary, source, numbers, timings)
+
+    # Страницы, где быстрый бэкенд ничего не нашёл, перепроверяются pdfplumber.
+    fallback = EXTRACTORS[PdfplumberExtractor.name]
+    if primary.name != fallback.name:
+        empty = [i for i, text in enumerate(texts) if not text]
+        if empty:
+            recovered = _timed(fallback, source, [numbers[i] for i in empty], timings)
+            for i, text in zip(empty, recovered):
+                texts[i] = text
+
+    return texts, timings
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, а не fork: API и воркер многопоточные, fork таких процессов небезопасен.
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _chunk_ranges(total: int, pages_per_chunk: int) -> list[tuple[int, int]]:
+    return [(start, min(start + pages_per_chunk, total)) for start in range(0, total, pages_per_chunk)]
+
+
+def _collect(results) -> list[str]:
+    pages: list[str] = []
+    for texts, timings in results:
+        pages.extend(texts)
+        for backend, (count, seconds) in timings.items():
+            record_timing(backend, count, seconds)
+    return pages
+
+
+def _extract_parallel(
+    data: bytes,
+    total: int,
+    pages_per_chunk: int,
+    backend: str | None,
+    layout: bool,
+) -> list[str]:
+    # Воркерам передаётся путь к временному файлу, а не сами байты:
+    # иначе каждый чанк заново сериализовал бы весь документ.
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(data)
+        path = tmp.name
+
+    try:
+        pool = get_pool()
+        futures = [
+            pool.submit(_extract_range, path, start, stop, backend, layout)
+            for start, stop in _chunk_ranges(total, pages_per_chunk)
+        ]
+        return _collect(future.result() for future in futures)
+    finally:
+        os.unlink(path)
+
+
+def extract_pages_from_pdf_bytes(
+    data: bytes,
+    max_pages: Optional[int] = 5,
+    *,
+    parallel: Optional[bool] = None,
+    pages_per_chunk: Optional[int] = None,
+    backend: Optional[str] = None,
+    layout: bool = False,
+) -> list[str]:
+    """Возвращает текст по страницам в исходном порядке (пустые страницы — пустые строки).
+
+    По умолчанию используется бэкенд PDF_EXTRACTOR (pdfium); pdfplumber
+    подключается для страниц без текста или целиком при layout=True.
+    parallel=None включает пул процессов автоматически для документов от
+    PDF_PARALLEL_MIN_PAGES страниц; pages_per_chunk переопределяет
+    PDF_PAGES_PER_CHUNK для конкретного документа.
+    """
+    total = EXTRACTORS[PdfiumExtractor.name].page_count(data)
+    if max_pages is not None:
+        total = min(total, max_pages)
+
+    if total == 0:
+        return []
+
+    if parallel is None:
+        parallel = PDF_POOL_SIZE > 1 and total >= PDF_PARALLEL_MIN_PAGES
+
+    if not parallel:
+        return _collect([_extract_range(data, 0, total, backend, layout)])
+
+    chunk = pages_per_chunk or PDF_PAGES_PER_CHUNK
+    # Не меньше чанков, чем процессов в пуле, иначе часть ядер простаивает.
+    chunk = max(1, min(chunk, -(-total // PDF_POOL_SIZE)))
+    return _extract_parallel(data, total, chunk, backend, layout)
+
 
+def iter_pages_from_pdf_bytes(
+    data: bytes,
+    start: int = 0,
+    stop: Optional[int] = None,
+    *,
+    pages_per_chunk: Optional[int] = None,
+    backend: Optional[str] = None,
+    layout: bool = False,
+) -> Iterator[tuple[int, str]]:
+    """Отдаёт пары (номер страницы с 0, текст) для [start, stop) по мере извлечения.
 
-def extract_text_from_pdf_bytes(data: bytes, max_pages: Optional[int] = 5) -> str:
-    parts = []
+    Страницы извлекаются небольшими чанками в текущем процессе, поэтому
+    первая страница доступна сразу, а в памяти держится только один чанк.
+    """
+    total = EXTRACTORS[PdfiumExtractor.name].page_count(data)
+    stop = total if stop is None else min(stop, total)
+    chunk = pages_per_chunk or PDF_STREAM_PAGES_PER_CHUNK
 
-    with pdfplumber.open(io.BytesIO(data)) as pdf:
-        pages = pdf.pages if max_pages is None else pdf.pages[:max_pages]
+    for chunk_start in range(start, stop, chunk):
+        chunk_stop = min(chunk_start + chunk, stop)
+        texts = _collect([_extract_range(data, chunk_start, chunk_stop, backend, layout)])
+        yield from enumerate(texts, start=chunk_start)
 
-        for page in pages:
-            text = page.extract_text() or ""
-            text = text.strip()
-            if text:
-                parts.append(text)
 
-    return "\n\n".join(parts)
\ No newline at end of file
+def extract_text_from_pdf_bytes(
+    data: bytes,
+    max_pages: Optional[int] = 5,
+    *,
+    parallel: Optional[bool] = None,
+    pages_per_chunk: Optional[int] = None,
+    backend: Optional[str] = None,
+    layout: bool = False,
+) -> str:
+    pages = extract_pages_from_pdf_bytes(
+        data,
+        max_pages=max_pages,
+        parallel=parallel,
+        pages_per_chunk=pages_per_chunk,
+        backend=backend,
+        layout=layout,
+    )
+    return "\n\n".join(text for text in pages if text)
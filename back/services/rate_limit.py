@@ -0,0 +1,177 @@
+"""Token bucket для вызовов внешних API, общий для всех процессов.
+
+Корзина вмещает capacity токенов и пополняется со скоростью rate токенов в
+секунду; вызов забирает по токену сразу из всех своих корзин (глобальной и
+пользовательской) или не забирает ни одного. Если токенов нет, acquire ждёт
+до max_wait секунд, пока они появятся, и только потом отказывает с
+RateLimited и временем до следующего токена.
+
+Состояние корзин хранится в таблице rate_limit_buckets (DatabaseBucketStore),
+поэтому лимит действует на все процессы API вместе. MemoryBucketStore —
+замена в пределах одного процесса для тестов и локального запуска.
+"""
+import threading
+import time
+from typing import Callable, NamedTuple
+
+from back.db.database import SessionLocal
+from back.repositories.rate_limit_buckets import RateLimitBucketRepository
+
+# Сколько раз перечитывать корзины, если их одновременно изменил другой процесс.
+STORE_CONFLICT_RETRIES = 5
+
+
+class BucketSpec(NamedTuple):
+    key: str
+    capacity: float
+    rate: float  # токенов в секунду
+
+
+class RateLimited(RuntimeError):
+    def __init__(self, scope: str, retry_after: float):
+        super().__init__("Rate limit exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def _refill(spec: BucketSpec, state: tuple | None, now: float) -> float:
+    if state is None:
+        return spec.capacity
+    tokens, updated_at = state[0], state[1]
+    return min(spec.capacity, tokens + max(now - updated_at, 0) * spec.rate)
+
+
+def _deficit(specs: list[BucketSpec], tokens: dict[str, float]) -> tuple[float, str | None]:
+    """(сколько ждать следующего токена, ключ самой пустой корзины); (0, None) — токены есть везде."""
+    wait, key = 0.0, None
+    for spec in specs:
+        if tokens[spec.key] < 1:
+            need = (1 - tokens[spec.key]) / spec.rate if spec.rate > 0 else float("inf")
+            if need > wait:
+                wait, key = need, spec.key
+    return wait, key
+
+
+class MemoryBucketStore:
+    def __init__(self):
+        self._state: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, specs: list[BucketSpec], now: float) -> tuple[float, str | None]:
+        with self._lock:
+            tokens = {spec.key: _refill(spec, self._state.get(spec.key), now) for spec in specs}
+            wait, key = _deficit(specs, tokens)
+            if key is None:
+                for spec in specs:
+                    self._state[spec.key] = (tokens[spec.key] - 1, now)
+            return wait, key
+
+    def reset(self):
+        with self._lock:
+            self._state.clear()
+
+
+class DatabaseBucketStore:
+    def __init__(self, session_factory: Callable | None = None):
+        self._session_factory = session_factory
+        self.repo = RateLimitBucketRepository()
+
+    def _session(self):
+        # SessionLocal берётся из модуля при каждом вызове, чтобы его можно было подменить в тестах.
+        return (self._session_factory or SessionLocal)()
+
+    def take(self, specs: list[BucketSpec], now: float) -> tuple[float, str | None]:
+        keys = [spec.key for spec in specs]
+        db = self._session()
+        try:
+            for _ in range(STORE_CONFLICT_RETRIES):
+                state = self.repo.load(db, keys)
+                db.rollback()
+                tokens = {spec.key: _refill(spec, state.get(spec.key), now) for spec in specs}
+                wait, key = _deficit(specs, tokens)
+                if key is not None:
+                    return wait, key
+                changes = {
+                    spec.key: (tokens[spec.key] - 1, now, state[spec.key][2] if spec.key in state else None)
+                    for spec in specs
+                }
+                if self.repo.save(db, changes):
+                    return 0.0, None
+            # Корзины непрерывно меняют другие процессы: это и есть конкуренция за токены.
+            return 0.05, keys[0]
+        finally:
+            db.close()
+
+
+class TokenBucketLimiter:
+    def __init__(
+        self,
+        store,
+        *,
+        name: str,
+        global_capacity: float,
+        global_per_minute: float,
+        user_capacity: float,
+        user_per_minute: float,
+        max_wait: float,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.store = store
+        self.name = name
+        self.global_spec = BucketSpec(f"{name}:global", global_capacity, global_per_minute / 60)
+        self.user_capacity = user_capacity
+        self.user_rate = user_per_minute / 60
+        self.max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "queued": 0, "rejected_global": 0, "rejected_user": 0, "wait_seconds": 0.0}
+
+    def _specs(self, user_id: int | None) -> list[BucketSpec]:
+        specs = [self.global_spec]
+        if user_id is not None:
+            specs.append(BucketSpec(f"{self.name}:user:{user_id}", self.user_capacity, self.user_rate))
+        return specs
+
+    def _scope(self, key: str) -> str:
+        return "global" if key == self.global_spec.key else "user"
+
+    def acquire(self, user_id: int | None = None) -> None:
+        """Забирает токен из глобальной корзины и корзины пользователя, подождав не дольше max_wait."""
+        specs = self._specs(user_id)
+        started = self._clock()
+        deadline = started + self.max_wait
+        queued = False
+
+        while True:
+            now = self._clock()
+            wait, key = self.store.take(specs, now)
+            if key is None:
+                with self._lock:
+                    self.stats["acquired"] += 1
+                    self.stats["queued"] += int(queued)
+                    self.stats["wait_seconds"] += now - started
+                return
+
+            scope = self._scope(key)
+            if now + wait > deadline:
+                with self._lock:
+                    self.stats[f"rejected_{scope}"] += 1
+                raise RateLimited(scope, retry_after=wait)
+
+            queued = True
+            self._sleep(wait)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "wait_seconds": round(self.stats["wait_seconds"], 3),
+                "global_capacity": self.global_spec.capacity,
+                "global_per_minute": round(self.global_spec.rate * 60, 3),
+                "user_capacity": self.user_capacity,
+                "user_per_minute": round(self.user_rate * 60, 3),
+                "max_wait": self.max_wait,
+                "store": type(self.store).__name__,
+            }
@@ -6,10 +6,11 @@ from sqlalchemy.orm import Session
 
 from back.repositories.refresh_tokens import RefreshTokenRepository
 from back.models.user import User
-from back.services.auth import SECRET_KEY, ALGORITHM, create_access_token
+from back.services.auth import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token
+from back.services import token_revocation, user_cache
 
 
-ACCESS_TTL_MINUTES = 60
+ACCESS_TTL_MINUTES = ACCESS_TOKEN_EXPIRE_MINUTES
 REFRESH_TTL_DAYS = 7
 
 
@@ -17,23 +18,39 @@ def _hash_token(token: str) -> str:
     return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
 
+def _access_token(user: User, sid: str) -> str:
+    """Access-токен с данными для авторизации без чтения БД (см. token_revocation)."""
+    role = user.role.value if hasattr(user.role, "value") else user.role
+    claims = {
+        "sub": user.username,
+        "uid": user.id,
+        "role": role,
+        "ver": user.token_version or 0,
+        "sid": sid,
+        "type": "access",
+    }
+    return create_access_token(claims, timedelta(minutes=ACCESS_TTL_MINUTES))
+
+
+def _refresh_token(user: User) -> tuple[str, str, datetime]:
+    jti = str(uuid.uuid4())
+    refresh_exp = datetime.utcnow() + timedelta(days=REFRESH_TTL_DAYS)
+
+    refresh_payload = {
+        "sub": user.username,
+        "jti": jti,
+        "type": "refresh",
+        "exp": refresh_exp,
+    }
+    return jwt.encode(refresh_payload, SECRET_KEY, algorithm=ALGORITHM), jti, refresh_exp
+
+
 class SessionService:
     def __init__(self, repo: RefreshTokenRepository):
         self.repo = repo
 
     def issue_tokens(self, db: Session, user: User) -> dict:
-        access = create_access_token({"sub": user.username}, timedelta(minutes=ACCESS_TTL_MINUTES))
-
-        jti = str(uuid.uuid4())
-        refresh_exp = datetime.utcnow() + timedelta(days=REFRESH_TTL_DAYS)
-
-        refresh_payload = {
-            "sub": user.username,
-            "jti": jti,
-            "type": "refresh",
-            "exp": refresh_exp,
-        }
-        refresh = jwt.encode(refresh_payload, SECRET_KEY, algorithm=ALGORITHM)
+        refresh, jti, refresh_exp = _refresh_token(user)
 
         self.repo.create(
             db,
@@ -43,9 +60,10 @@ class SessionService:
             expires_at=refresh_exp,
         )
 
-        return {"access_token": access, "refresh_token": refresh, "token_type": "bearer"}
+        return {"access_token": _access_token(user, jti), "refresh_token": refresh, "token_type": "bearer"}
 
     def refresh(self, db: Session, refresh_token: str) -> dict:
+        """Обменивает refresh-токен на новую пару: одно чтение и одна транзакция."""
         try:
             payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
             if payload.get("type") != "refresh":
@@ -57,9 +75,10 @@ class SessionService:
         except JWTError:
             raise ValueError("Invalid refresh token")
 
-        rt = self.repo.get_by_jti(db, jti)
-        if not rt:
+        found = self.repo.get_with_user(db, jti)
+        if not found:
             raise ValueError("Refresh token not found")
+        rt, user = found
         if rt.revoked:
             raise ValueError("Refresh token revoked")
         if rt.expires_at < datetime.utcnow():
@@ -69,13 +88,21 @@ class SessionService:
             self.repo.revoke(db, rt)
             raise ValueError("Refresh token mismatch")
 
-        self.repo.revoke(db, rt)
-
-        user = db.query(User).filter(User.username == username).first()
-        if not user:
+        if user.username != username:
             raise ValueError("User not found")
 
-        return self.issue_tokens(db, user)
+        refresh, new_jti, refresh_exp = _refresh_token(user)
+        rotated = self.repo.rotate(
+            db,
+            rt,
+            jti=new_jti,
+            token_hash=_hash_token(refresh),
+            expires_at=refresh_exp,
+        )
+        if not rotated:
+            raise ValueError("Refresh token revoked")
+
+        return {"access_token": _access_token(user, new_jti), "refresh_token": refresh, "token_type": "bearer"}
 
     def logout(self, db: Session, refresh_token: str, *, all_sessions: bool = False) -> None:
         if all_sessions:
@@ -87,7 +114,11 @@ class SessionService:
 
             user = db.query(User).filter(User.username == username).first()
             if user:
+                token_revocation.revoke_user_tokens(db, user)
                 self.repo.revoke_all_for_user(db, user.id)
+                token_revocation.revocations.refresh()
+            if username:
+                user_cache.invalidate(username)
             return
 
         try:
@@ -101,4 +132,6 @@ class SessionService:
 
         rt = self.repo.get_by_jti(db, jti)
         if rt and not rt.revoked:
-            self.repo.revoke(db, rt)
\ No newline at end of file
+            token_revocation.revoke_session(db, rt.user_id, rt.jti)
+            self.repo.revoke(db, rt)
+            token_revocation.revocations.refresh()
@@ -0,0 +1,209 @@
+"""Шина событий о смене статуса загрузок.
+
+Код, меняющий Upload.status, вызывает publish_status после commit; SSE-подписчики
+получают события из шины вместо регулярного опроса БД.
+
+Бэкенд выбирается через STATUS_BUS_BACKEND:
+- local — доставка внутри одного процесса (по умолчанию, подходит для тестов);
+- postgres — LISTEN/NOTIFY через DATABASE_URL, события видят все процессы API
+  и воркер генерации.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy import text
+
+from back.db.database import DATABASE_URL, engine
+
+logger = logging.getLogger(__name__)
+
+STATUS_BUS_BACKEND = os.getenv("STATUS_BUS_BACKEND", "local")
+STATUS_BUS_CHANNEL = os.getenv("STATUS_BUS_CHANNEL", "upload_status")
+STATUS_BUS_QUEUE_SIZE = int(os.getenv("STATUS_BUS_QUEUE_SIZE", "256"))
+
+
+class BusBackend:
+    def start(self, on_message: Callable[[str], None]) -> None:
+        raise NotImplementedError
+
+    def publish(self, payload: str) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        pass
+
+
+class LocalBackend(BusBackend):
+    def __init__(self):
+        self._on_message: Callable[[str], None] | None = None
+
+    def start(self, on_message):
+        self._on_message = on_message
+
+    def publish(self, payload):
+        if self._on_message:
+            self._on_message(payload)
+
+
+class PostgresBackend(BusBackend):
+    def __init__(self, url: str, channel: str):
+        # psycopg принимает обычный DSN, без суффикса драйвера SQLAlchemy.
+        self.dsn = url.replace("postgresql+psycopg://", "postgresql://", 1)
+        self.channel = channel
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def start(self, on_message):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._listen, args=(on_message,), daemon=True)
+        self._thread.start()
+
+    def _listen(self, on_message):
+        import psycopg
+
+        while not self._stopped.is_set():
+            try:
+                with psycopg.connect(self.dsn, autocommit=True) as conn:
+                    conn.execute(f'LISTEN "{self.channel}"')
+                    for notify in conn.notifies():
+                        on_message(notify.payload)
+                        if self._stopped.is_set():
+                            break
+            except Exception:
+                logger.exception("status bus listener failed, reconnecting")
+                time.sleep(1)
+
+    def publish(self, payload):
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+
+    def stop(self):
+        self._stopped.set()
+
+
+class Subscription:
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=STATUS_BUS_QUEUE_SIZE)
+        self.dropped = 0
+        self.coalesced = 0
+        # Последнее ещё не прочитанное событие прогресса по каждой загрузке.
+        self._progress: dict[int, dict] = {}
+
+    def _put(self, event: dict):
+        if "progress" in event:
+            # Прогресс склеивается: в очереди лежит не больше одного события на загрузку,
+            # а при чтении отдаётся самое свежее состояние.
+            upload_id = event["upload_id"]
+            pending = upload_id in self._progress
+            self._progress[upload_id] = event
+            if pending:
+                self.coalesced += 1
+                return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Медленный клиент: событие теряется, его догонит сверка с БД.
+            self.dropped += 1
+            if "progress" in event:
+                self._progress.pop(event["upload_id"], None)
+
+    async def get(self, timeout: float) -> dict | None:
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        if "progress" in event:
+            return self._progress.pop(event["upload_id"], event)
+        return event
+
+
+class StatusBus:
+    def __init__(self, backend: BusBackend):
+        self.backend = backend
+        self._subscribers: dict[int, set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0, "coalesced": 0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.backend.start(self._dispatch)
+
+    def _dispatch(self, payload: str):
+        try:
+            event = json.loads(payload)
+            user_id = int(event["user_id"])
+        except (ValueError, KeyError, TypeError):
+            return
+
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, ()))
+
+        for sub in targets:
+            self.stats["delivered"] += 1
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, event)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт.
+                pass
+
+    def publish(self, event: dict) -> None:
+        self.stats["published"] += 1
+        try:
+            self.backend.publish(json.dumps(event))
+        except Exception:
+            logger.exception("status bus publish failed")
+
+    def subscribe(self, user_id: int) -> Subscription:
+        self._ensure_started()
+        sub = Subscription(user_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.user_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    self._subscribers.pop(sub.user_id, None)
+        self.stats["dropped"] += sub.dropped
+        self.stats["coalesced"] += sub.coalesced
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            subscribers = sum(len(s) for s in self._subscribers.values())
+        return {**self.stats, "backend": type(self.backend).__name__, "subscribers": subscribers}
+
+
+def make_backend(name: str = STATUS_BUS_BACKEND) -> BusBackend:
+    if name == "postgres":
+        return PostgresBackend(DATABASE_URL, STATUS_BUS_CHANNEL)
+    if name == "local":
+        return LocalBackend()
+    raise ValueError(f"Unknown status bus backend: {name}")
+
+
+bus = StatusBus(make_backend())
+
+
+def publish_status(upload) -> None:
+    status = upload.status.value if hasattr(upload.status, "value") else upload.status
+    bus.publish({"user_id": upload.user_id, "upload_id": upload.id, "status": status})
+
+
+def publish_progress(upload, progress: dict) -> None:
+    """Промежуточное событие генерации: токены, карточки, скорость и ETA."""
+    bus.publish({"user_id": upload.user_id, "upload_id": upload.id, "status": "generating", "progress": progress})
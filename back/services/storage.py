@@ -1,9 +1,14 @@
 import io
+import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from botocore.client import Config
 import boto3
 from botocore.exceptions import ClientError
 
+logger = logging.getLogger(__name__)
+
 
 S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "http://127.0.0.1:9000")
 S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "minioadmin")
@@ -11,27 +16,89 @@ S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "minioadmin")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "pdflashcards")
 S3_REGION = os.getenv("S3_REGION", "us-east-1")
 
-MAX_FILE_SIZE = 10 * 1024 * 1024
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+S3_CONNECT_TIMEOUT = float(os.getenv("S3_CONNECT_TIMEOUT", "5"))
+S3_READ_TIMEOUT = float(os.getenv("S3_READ_TIMEOUT", "60"))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "3"))
+S3_RETRY_MODE = os.getenv("S3_RETRY_MODE", "standard")
+S3_TCP_KEEPALIVE = os.getenv("S3_TCP_KEEPALIVE", "1") == "1"
+S3_WARMUP = os.getenv("S3_WARMUP", "1") == "1"
+S3_WARMUP_CONNECTIONS = int(os.getenv("S3_WARMUP_CONNECTIONS", "4"))
+
+MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "10"))
+MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
+# S3 требует не меньше 5 МБ на каждую часть, кроме последней.
+S3_MULTIPART_PART_SIZE = max(int(os.getenv("S3_MULTIPART_PART_SIZE", str(8 * 1024 * 1024))), 5 * 1024 * 1024)
 ALLOWED_CONTENT_TYPES = {"application/pdf"}
 
+_client = None
+_client_lock = threading.Lock()
+_bucket_ready = False
 
-def get_s3_client():
-    return boto3.client(
+
+def build_s3_client():
+    # Отдельная boto3.Session: создание клиентов через общую сессию по умолчанию не потокобезопасно.
+    return boto3.session.Session().client(
         "s3",
         endpoint_url=S3_ENDPOINT_URL,
         aws_access_key_id=S3_ACCESS_KEY,
         aws_secret_access_key=S3_SECRET_KEY,
         region_name=S3_REGION,
-        config=Config(signature_version="s3v4"),
+        config=Config(
+            signature_version="s3v4",
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            connect_timeout=S3_CONNECT_TIMEOUT,
+            read_timeout=S3_READ_TIMEOUT,
+            retries={"max_attempts": S3_MAX_ATTEMPTS, "mode": S3_RETRY_MODE},
+            tcp_keepalive=S3_TCP_KEEPALIVE,
+        ),
     )
 
 
+def get_s3_client():
+    """Общий для процесса клиент S3 с пулом соединений; клиенты boto3 потокобезопасны."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_s3_client()
+    return _client
+
+
+def reset_s3_client():
+    global _client, _bucket_ready
+    with _client_lock:
+        _client = None
+        _bucket_ready = False
+
+
 def ensure_bucket():
+    global _bucket_ready
+    if _bucket_ready:
+        return
+
     client = get_s3_client()
     try:
         client.head_bucket(Bucket=S3_BUCKET_NAME)
     except ClientError:
         client.create_bucket(Bucket=S3_BUCKET_NAME)
+    _bucket_ready = True
+
+
+def warm_up():
+    """Создаёт клиент и открывает несколько соединений пула заранее, до первых запросов."""
+    client = get_s3_client()
+    try:
+        ensure_bucket()
+        with ThreadPoolExecutor(max_workers=S3_WARMUP_CONNECTIONS) as executor:
+            list(executor.map(lambda _: client.head_bucket(Bucket=S3_BUCKET_NAME), range(S3_WARMUP_CONNECTIONS)))
+    except Exception as e:
+        logger.warning("S3 warm-up failed: %s", e)
+
+
+def start_warm_up():
+    if S3_WARMUP:
+        threading.Thread(target=warm_up, name="s3-warm-up", daemon=True).start()
 
 
 def upload_bytes(data: bytes, object_key: str, content_type: str):
@@ -44,6 +111,78 @@ def upload_bytes(data: bytes, object_key: str, content_type: str):
     )
 
 
+class S3MultipartWriter:
+    """Потоковая запись объекта в S3: в памяти держится не больше одной части.
+
+    Файл меньше одной части уходит обычным put_object; multipart-загрузка
+    создаётся только при переполнении первой части.
+    """
+
+    def __init__(self, object_key: str, content_type: str, part_size: int = S3_MULTIPART_PART_SIZE):
+        self.object_key = object_key
+        self.content_type = content_type
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.upload_id: str | None = None
+        self.parts: list[dict] = []
+
+    def write(self, chunk: bytes):
+        self.buffer += chunk
+        while len(self.buffer) >= self.part_size:
+            self._upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+
+    def _upload_part(self, body: bytes):
+        client = get_s3_client()
+        if self.upload_id is None:
+            response = client.create_multipart_upload(
+                Bucket=S3_BUCKET_NAME,
+                Key=self.object_key,
+                ContentType=self.content_type,
+            )
+            self.upload_id = response["UploadId"]
+
+        part_number = len(self.parts) + 1
+        response = client.upload_part(
+            Bucket=S3_BUCKET_NAME,
+            Key=self.object_key,
+            PartNumber=part_number,
+            UploadId=self.upload_id,
+            Body=body,
+        )
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    def complete(self):
+        if self.upload_id is None:
+            upload_bytes(bytes(self.buffer), self.object_key, self.content_type)
+            self.buffer.clear()
+            return
+
+        if self.buffer:
+            self._upload_part(bytes(self.buffer))
+            self.buffer.clear()
+
+        get_s3_client().complete_multipart_upload(
+            Bucket=S3_BUCKET_NAME,
+            Key=self.object_key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+
+    def abort(self):
+        self.buffer.clear()
+        if self.upload_id is None:
+            return
+        try:
+            get_s3_client().abort_multipart_upload(
+                Bucket=S3_BUCKET_NAME,
+                Key=self.object_key,
+                UploadId=self.upload_id,
+            )
+        except Exception as e:
+            logger.warning("abort_multipart_upload failed for %s: %s", self.object_key, e)
+
+
 def download_bytes(object_key: str) -> bytes:
     client = get_s3_client()
     response = client.get_object(Bucket=S3_BUCKET_NAME, Key=object_key)
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+from typing import Iterator, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from back.db.database import SessionLocal
+from back.models.page_text import PageText
+from back.models.upload import Upload
+from back.services.pdf_parser import extract_pages_from_pdf_bytes, iter_pages_from_pdf_bytes
+from back.services.storage import download_bytes
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_SIZE = 32
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def load_pages(db: Session, digest: str, max_pages: Optional[int] = None) -> list[str]:
+    query = db.query(PageText.text).filter(PageText.content_hash == digest)
+    if max_pages is not None:
+        query = query.filter(PageText.page_no < max_pages)
+    return [text for (text,) in query.order_by(PageText.page_no).all()]
+
+
+def cached_page_count(db: Session, digest: str) -> int | None:
+    """Число страниц документа по кэшу или None, если документ ещё не разобран."""
+    last = db.query(func.max(PageText.page_no)).filter(PageText.content_hash == digest).scalar()
+    return None if last is None else last + 1
+
+
+def store_pages(db: Session, digest: str, pages: list[str]) -> None:
+    db.add_all(PageText(content_hash=digest, page_no=i, text=text) for i, text in enumerate(pages))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Тот же документ параллельно закэшировал другой запрос.
+        db.rollback()
+
+
+def purge(db: Session, digest: str | None) -> None:
+    """Удаляет кэш страниц документа; коммит остаётся за вызывающим."""
+    if digest:
+        db.query(PageText).filter(PageText.content_hash == digest).delete(synchronize_session=False)
+
+
+def fill_from_bytes(db: Session, upload: Upload, data: bytes) -> list[str]:
+    if not upload.content_hash:
+        upload.content_hash = content_hash(data)
+        db.add(upload)
+        db.commit()
+
+    pages = extract_pages_from_pdf_bytes(data, max_pages=None)
+    store_pages(db, upload.content_hash, pages)
+
+    upload.page_count = len(pages)
+    db.add(upload)
+    db.commit()
+    return pages
+
+
+def get_pages(db: Session, upload: Upload, max_pages: Optional[int] = None) -> list[str]:
+    """Текст страниц загрузки: из page_texts, а при промахе — из S3 с записью в кэш."""
+    if upload.content_hash:
+        pages = load_pages(db, upload.content_hash, max_pages)
+        if pages:
+            return pages
+
+    pages = fill_from_bytes(db, upload, download_bytes(upload.object_key))
+    return pages if max_pages is None else pages[:max_pages]
+
+
+def get_text(db: Session, upload: Upload, max_pages: Optional[int] = None) -> str:
+    return "\n\n".join(text for text in get_pages(db, upload, max_pages) if text)
+
+
+def iter_pages(
+    upload_id: int,
+    start: int = 0,
+    stop: Optional[int] = None,
+    *,
+    layout: bool = False,
+) -> Iterator[tuple[int, str]]:
+    """Постранично отдаёт (номер страницы с 0, текст) для [start, stop).
+
+    Открывает собственную сессию, чтобы генератор можно было отдавать в
+    StreamingResponse. Из кэша строки читаются пачками; при промахе (или
+    layout=True) страницы извлекаются из PDF по мере чтения, без записи в кэш.
+    """
+    db = SessionLocal()
+    try:
+        upload = db.query(Upload).filter(Upload.id == upload_id).first()
+        if not upload:
+            return
+
+        if not layout and upload.content_hash and load_pages(db, upload.content_hash, max_pages=1):
+            query = db.query(PageText.page_no, PageText.text).filter(
+                PageText.content_hash == upload.content_hash,
+                PageText.page_no >= start,
+            )
+            if stop is not None:
+                query = query.filter(PageText.page_no < stop)
+            for page_no, text in query.order_by(PageText.page_no).yield_per(STREAM_BATCH_SIZE):
+                yield page_no, text
+            return
+
+        object_key = upload.object_key
+    finally:
+        db.close()
+
+    yield from iter_pages_from_pdf_bytes(download_bytes(object_key), start, stop, layout=layout)
+
+
+def warm(upload_id: int, data: bytes | None = None) -> None:
+    """Фоновое заполнение кэша сразу после загрузки файла."""
+    db = SessionLocal()
+    try:
+        upload = db.query(Upload).filter(Upload.id == upload_id).first()
+        if not upload:
+            return
+        if upload.content_hash:
+            cached = cached_page_count(db, upload.content_hash)
+            if cached is not None:
+                # Тот же документ уже разобран для другой загрузки — переносим только число страниц.
+                if upload.page_count != cached:
+                    upload.page_count = cached
+                    db.commit()
+                return
+        if data is None:
+            data = download_bytes(upload.object_key)
+        fill_from_bytes(db, upload, data)
+    except Exception:
+        logger.exception("text cache warm-up failed for upload %s", upload_id)
+    finally:
+        db.close()
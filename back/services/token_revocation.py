@@ -0,0 +1,130 @@
+"""Отзыв access-токенов без чтения БД на каждом запросе.
+
+Access-токен несёт uid, role, ver (users.token_version) и sid (jti
+refresh-токена, с которым он выдан), поэтому get_current_user проверяет
+его по подписи и по этому набору в памяти:
+
+- для пользователя — минимальная действующая версия токенов (растёт при
+  смене пароля и роли и при выходе со всех устройств);
+- отозванные сессии (sid) после обычного выхода.
+
+Набор подтягивает новые записи token_revocations не чаще раза в
+TOKEN_REVOCATION_REFRESH_INTERVAL секунд, поэтому отзыв, сделанный другим
+процессом, вступает в силу с такой задержкой. В своём процессе — сразу.
+Записи старше времени жизни access-токена не нужны и выбрасываются.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from back.db.database import SessionLocal
+from back.models.user import User
+from back.repositories.token_revocations import TokenRevocationRepository
+from back.services.auth import ACCESS_TOKEN_EXPIRE_MINUTES
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REVOCATION_REFRESH_INTERVAL = float(os.getenv("TOKEN_REVOCATION_REFRESH_INTERVAL", "5"))
+# Сколько последних id перечитывается при каждом обновлении: запись с меньшим id
+# может закоммититься позже записи с большим.
+TOKEN_REVOCATION_OVERLAP = 100
+
+repo = TokenRevocationRepository()
+
+
+class RevocationSet:
+    def __init__(self, *, refresh_interval: float = TOKEN_REVOCATION_REFRESH_INTERVAL, clock=time.monotonic):
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._min_version: dict[int, tuple[int, datetime]] = {}
+            self._sids: dict[str, datetime] = {}
+            self._last_id = 0
+            self._next_refresh = float("-inf")
+            self.stats = {"refreshes": 0, "loaded": 0, "rejected": 0}
+
+    def is_revoked(self, *, user_id: int, version: int, sid: str | None) -> bool:
+        if self._refresh_due():
+            try:
+                self.refresh()
+            except Exception:
+                # Недоступная БД не должна ронять авторизацию: работаем по последнему набору.
+                logger.exception("token revocation refresh failed")
+        with self._lock:
+            floor = self._min_version.get(user_id)
+            revoked = (floor is not None and version < floor[0]) or (sid is not None and sid in self._sids)
+            if revoked:
+                self.stats["rejected"] += 1
+            return revoked
+
+    def _refresh_due(self) -> bool:
+        with self._lock:
+            now = self.clock()
+            if now < self._next_refresh:
+                return False
+            # Один поток обновляет, остальные пока проверяют по текущему набору.
+            self._next_refresh = now + self.refresh_interval
+            return True
+
+    def refresh(self) -> int:
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            rows = repo.list_after(db, max(self._last_id - TOKEN_REVOCATION_OVERLAP, 0), now=now)
+        finally:
+            db.close()
+
+        with self._lock:
+            for row in rows:
+                if row.min_version is not None:
+                    current = self._min_version.get(row.user_id)
+                    if current is None or row.min_version > current[0]:
+                        self._min_version[row.user_id] = (row.min_version, row.expires_at)
+                if row.sid:
+                    self._sids[row.sid] = row.expires_at
+                self._last_id = max(self._last_id, row.id)
+            self._min_version = {uid: v for uid, v in self._min_version.items() if v[1] > now}
+            self._sids = {sid: exp for sid, exp in self._sids.items() if exp > now}
+            self._next_refresh = self.clock() + self.refresh_interval
+            self.stats["refreshes"] += 1
+            self.stats["loaded"] += len(rows)
+        return len(rows)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "users": len(self._min_version),
+                "sessions": len(self._sids),
+                "last_id": self._last_id,
+            }
+
+
+revocations = RevocationSet()
+
+
+def _expires_at() -> datetime:
+    return datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+
+def revoke_user_tokens(db: Session, user: User) -> None:
+    """Делает недействительными все выданные пользователю access-токены.
+
+    Версия меняется в текущей транзакции; вызывающий коммитит, затем
+    вызывает revocations.refresh(), чтобы отзыв сразу действовал в этом процессе.
+    """
+    user.token_version = (user.token_version or 0) + 1
+    repo.add(db, user_id=user.id, min_version=user.token_version, expires_at=_expires_at())
+
+
+def revoke_session(db: Session, user_id: int, sid: str) -> None:
+    """Отзывает access-токены одной сессии; коммит и refresh — как в revoke_user_tokens."""
+    repo.add(db, user_id=user_id, sid=sid, expires_at=_expires_at())
@@ -0,0 +1,120 @@
+"""Фоновая очистка refresh_tokens и token_revocations.
+
+Каждый вход и каждый refresh добавляют строку в refresh_tokens, поэтому
+таблица без очистки растёт бесконечно. Раз в TOKEN_SWEEP_INTERVAL секунд
+удаляются истёкшие токены и отозванные старше TOKEN_REVOKED_RETENTION
+секунд, а также истёкшие записи журнала отзыва. Удаление идёт пачками по
+TOKEN_SWEEP_BATCH строк, не больше TOKEN_SWEEP_MAX_BATCHES пачек за проход:
+остаток дочистит следующий проход.
+
+Очистка запускается в каждом процессе API; параллельные проходы безопасны,
+лишь делают часть работы дважды. TOKEN_SWEEP_INTERVAL=0 отключает её.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from back.db.database import SessionLocal
+from back.repositories.refresh_tokens import RefreshTokenRepository
+from back.repositories.token_revocations import TokenRevocationRepository
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SWEEP_INTERVAL = float(os.getenv("TOKEN_SWEEP_INTERVAL", "3600"))
+TOKEN_SWEEP_BATCH = int(os.getenv("TOKEN_SWEEP_BATCH", "1000"))
+TOKEN_SWEEP_MAX_BATCHES = int(os.getenv("TOKEN_SWEEP_MAX_BATCHES", "100"))
+TOKEN_REVOKED_RETENTION = int(os.getenv("TOKEN_REVOKED_RETENTION", str(24 * 3600)))
+
+refresh_tokens = RefreshTokenRepository()
+revocations = TokenRevocationRepository()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "failures": 0,
+    "refresh_tokens_deleted": 0,
+    "revocations_deleted": 0,
+    "batches": 0,
+    "last_run_at": None,
+    "last_duration_ms": None,
+    "last_deleted": 0,
+    # Последний проход упёрся в TOKEN_SWEEP_MAX_BATCHES — в таблице ещё есть что чистить.
+    "backlog": False,
+}
+
+
+def _drain(delete_batch, max_batches: int) -> tuple[int, int, bool]:
+    deleted = batches = 0
+    while batches < max_batches:
+        count = delete_batch()
+        batches += 1
+        deleted += count
+        if count < TOKEN_SWEEP_BATCH:
+            return deleted, batches, False
+    return deleted, batches, True
+
+
+def sweep_once(*, max_batches: int = TOKEN_SWEEP_MAX_BATCHES) -> dict:
+    started = time.perf_counter()
+    revoked_before = datetime.utcnow() - timedelta(seconds=TOKEN_REVOKED_RETENTION)
+    db = SessionLocal()
+    try:
+        tokens, token_batches, token_backlog = _drain(
+            lambda: refresh_tokens.delete_expired(db, revoked_before=revoked_before, batch_size=TOKEN_SWEEP_BATCH),
+            max_batches,
+        )
+        revoked, revoked_batches, revoked_backlog = _drain(
+            lambda: revocations.delete_expired(db, batch_size=TOKEN_SWEEP_BATCH),
+            max_batches,
+        )
+    finally:
+        db.close()
+
+    result = {
+        "refresh_tokens_deleted": tokens,
+        "revocations_deleted": revoked,
+        "batches": token_batches + revoked_batches,
+        "backlog": token_backlog or revoked_backlog,
+    }
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["refresh_tokens_deleted"] += tokens
+        _stats["revocations_deleted"] += revoked
+        _stats["batches"] += result["batches"]
+        _stats["last_run_at"] = datetime.utcnow().isoformat()
+        _stats["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        _stats["last_deleted"] = tokens + revoked
+        _stats["backlog"] = result["backlog"]
+    return result
+
+
+async def run_forever(interval: float = TOKEN_SWEEP_INTERVAL) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await asyncio.to_thread(sweep_once)
+            if result["refresh_tokens_deleted"] or result["revocations_deleted"]:
+                logger.info("token sweep: %s", result)
+        except Exception:
+            with _stats_lock:
+                _stats["failures"] += 1
+            logger.exception("token sweep failed")
+
+
+def start() -> asyncio.Task | None:
+    if TOKEN_SWEEP_INTERVAL <= 0:
+        return None
+    return asyncio.get_running_loop().create_task(run_forever())
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        return {
+            **_stats,
+            "interval": TOKEN_SWEEP_INTERVAL,
+            "batch_size": TOKEN_SWEEP_BATCH,
+            "max_batches": TOKEN_SWEEP_MAX_BATCHES,
+        }
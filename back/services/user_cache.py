@@ -0,0 +1,47 @@
+"""Кэш личности пользователя для /auth/me и токенов старого формата (без uid).
+
+Хранится не ORM-объект, а неизменяемый снимок (id, username, email, role):
+его безопасно отдавать нескольким запросам одновременно. Запись
+сбрасывается при смене роли, смене пароля и выходе со всех устройств.
+"""
+import os
+from dataclasses import dataclass
+
+from back.models.user import User, UserRole
+from back.services.ttl_cache import TTLCache
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    username: str
+    email: str | None
+    role: UserRole
+
+
+_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def get(username: str) -> CachedUser | None:
+    return _cache.get(username)
+
+
+def put(user: User) -> CachedUser:
+    cached = CachedUser(id=user.id, username=user.username, email=user.email, role=user.role)
+    _cache.set(user.username, cached)
+    return cached
+
+
+def invalidate(username: str) -> None:
+    _cache.invalidate(username)
+
+
+def clear() -> None:
+    _cache.clear()
+
+
+def stats() -> dict:
+    return _cache.stats()
@@ -1,3 +1,4 @@
+import os
 import sys
 from pathlib import Path
 
@@ -10,11 +11,18 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
+os.environ.setdefault("S3_WARMUP", "0")
+
 from back.main import app
 from back.db.database import Base, get_db
 from back.models.user import User, UserRole
 from back.services.auth import hash_password
 import back.routers.auth as auth_router
+import back.services.books_api as books_api
+import back.services.rate_limit as rate_limit
+import back.services.text_cache as text_cache
+import back.services.token_revocation as token_revocation
+import back.services.user_cache as user_cache
 
 
 TEST_DATABASE_URL = "sqlite:///./test_app.db"
@@ -41,12 +49,19 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 auth_router.SessionLocal = TestingSessionLocal
+text_cache.SessionLocal = TestingSessionLocal
+token_revocation.SessionLocal = TestingSessionLocal
+books_api.SessionLocal = TestingSessionLocal
+rate_limit.SessionLocal = TestingSessionLocal
 
 
 @pytest.fixture(autouse=True)
 def setup_test_db():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    user_cache.clear()
+    token_revocation.revocations.reset()
+    books_api.clear_cache()
     yield
     Base.metadata.drop_all(bind=engine)
     engine.dispose()
@@ -67,6 +82,11 @@ def db_session():
         db.close()
 
 
+@pytest.fixture
+def session_factory():
+    return TestingSessionLocal
+
+
 @pytest.fixture
 def user(db_session):
     user = User(
@@ -0,0 +1,179 @@
+from datetime import datetime
+
+from back.models.upload import Upload, UploadStatus
+
+
+def _make_upload(db_session, owner):
+    upload = Upload(
+        user_id=owner.id,
+        filename="lecture.pdf",
+        title="lecture",
+        object_key=f"user_{owner.id}/lecture.pdf",
+        content_type="application/pdf",
+        size=100,
+        timestamp=datetime.utcnow(),
+        status=UploadStatus.uploaded,
+    )
+    db_session.add(upload)
+    db_session.commit()
+    db_session.refresh(upload)
+    return upload
+
+
+def test_generate_cards_returns_job_immediately(client, user, db_session):
+    upload = _make_upload(db_session, user)
+    headers = {"Authorization": _get_auth_header(client)}
+
+    response = client.post(f"/ai/generate_cards/{upload.id}", headers=headers)
+
+    assert response.status_code == 202
+    data = response.json()
+    assert data["upload_id"] == upload.id
+    assert data["status"] == "queued"
+
+    job_response = client.get(f"/ai/jobs/{data['job_id']}", headers=headers)
+    assert job_response.status_code == 200
+    assert job_response.json()["status"] == "queued"
+
+    db_session.refresh(upload)
+    assert upload.status == UploadStatus.generating
+
+
+def test_cancel_job_endpoint(client, user, db_session):
+    upload = _make_upload(db_session, user)
+    headers = {"Authorization": _get_auth_header(client)}
+    job_id = client.post(f"/ai/generate_cards/{upload.id}", headers=headers).json()["job_id"]
+
+    response = client.post(f"/ai/jobs/{job_id}/cancel", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    db_session.refresh(upload)
+    assert upload.status == UploadStatus.uploaded
+
+    assert client.post(f"/ai/jobs/{job_id}/cancel", headers=headers).status_code == 409
+    assert client.post("/ai/jobs/999999/cancel", headers=headers).status_code == 404
+
+
+def test_generate_cards_returns_503_when_queue_is_full(client, user, db_session, monkeypatch):
+    from back.services import generation_queue
+
+    monkeypatch.setattr(generation_queue, "JOB_QUEUE_LIMIT", 1)
+    monkeypatch.setattr(generation_queue, "JOB_QUEUE_RETRY_AFTER", 42)
+    first = _make_upload(db_session, user)
+    second = _make_upload(db_session, user)
+    headers = {"Authorization": _get_auth_header(client)}
+
+    assert client.post(f"/ai/generate_cards/{first.id}", headers=headers).status_code == 202
+    # Повторный запрос той же загрузки не ставит новую задачу и не упирается в лимит.
+    assert client.post(f"/ai/generate_cards/{first.id}", headers=headers).status_code == 202
+
+    response = client.post(f"/ai/generate_cards/{second.id}", headers=headers)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "42"
+    db_session.refresh(second)
+    assert second.status == UploadStatus.uploaded
+
+
+def test_generate_cards_returns_cached_result_without_queueing(client, user, db_session, monkeypatch):
+    import json
+
+    from back.models.generation_job import GenerationJob
+    from back.services import card_generation, text_cache
+
+    upload = _make_upload(db_session, user)
+    upload.content_hash = "c" * 64
+    db_session.commit()
+    text_cache.store_pages(db_session, upload.content_hash, ["Текст лекции."])
+
+    def stream(prompt, cancel=None):
+        yield json.dumps({"cards": [{"q": "Q", "a": "A"}]})
+
+    monkeypatch.setattr(card_generation, "_stream_model", stream)
+    card_generation.generate_cards_for_upload(db_session, upload)
+    db_session.commit()
+
+    headers = {"Authorization": _get_auth_header(client)}
+    response = client.post(f"/ai/generate_cards/{upload.id}", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["cached"] is True
+    assert response.json()["created"] == 1
+    assert db_session.query(GenerationJob).count() == 0
+
+    forced = client.post(f"/ai/generate_cards/{upload.id}?force=true", headers=headers)
+    assert forced.status_code == 202
+    assert db_session.query(GenerationJob).one().force is True
+
+
+def test_generate_cards_not_found(client, user):
+    response = client.post(
+        "/ai/generate_cards/9999",
+        headers={"Authorization": _get_auth_header(client)},
+    )
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Файл не найден"
+
+
+def test_generate_cards_forbidden_for_other_user(client, user, admin, db_session):
+    upload = _make_upload(db_session, admin)
+
+    response = client.post(
+        f"/ai/generate_cards/{upload.id}",
+        headers={"Authorization": _get_auth_header(client)},
+    )
+
+    assert response.status_code == 403
+
+
+def test_generate_cards_batch_schedules_owned_uploads(client, user, admin, db_session):
+    own = [_make_upload(db_session, user) for _ in range(2)]
+    foreign = _make_upload(db_session, admin)
+    headers = {"Authorization": _get_auth_header(client)}
+
+    response = client.post(
+        "/ai/generate_cards/batch",
+        headers=headers,
+        json={"upload_ids": [own[0].id, foreign.id, 9999, own[1].id, own[0].id], "max_parallel": 1},
+    )
+
+    assert response.status_code == 202
+    data = response.json()
+    assert [item["upload_id"] for item in data["items"]] == [own[0].id, foreign.id, 9999, own[1].id]
+    assert [item["status"] for item in data["items"]] == ["queued", "rejected", "rejected", "queued"]
+    assert data["items"][1]["error"] == "Forbidden"
+    assert data["items"][2]["error"] == "Файл не найден"
+
+    progress = client.get(f"/ai/batches/{data['batch_id']}", headers=headers)
+    assert progress.status_code == 200
+    body = progress.json()
+    assert body["total"] == 2
+    assert body["max_parallel"] == 1
+    assert body["counts"]["queued"] == 2
+    assert [item["upload_id"] for item in body["items"]] == [own[0].id, own[1].id]
+
+
+def test_generate_cards_batch_high_priority_requires_admin(client, user, db_session):
+    upload = _make_upload(db_session, user)
+
+    response = client.post(
+        "/ai/generate_cards/batch",
+        headers={"Authorization": _get_auth_header(client)},
+        json={"upload_ids": [upload.id], "priority": "high"},
+    )
+
+    assert response.status_code == 403
+
+
+def _get_auth_header(client):
+    login_response = client.post(
+        "/auth/login",
+        json={
+            "username": "testuser",
+            "password": "123456",
+        },
+    )
+    token = login_response.json()["access_token"]
+    return f"Bearer {token}"
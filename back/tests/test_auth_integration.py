@@ -1,3 +1,7 @@
+import back.routers.auth as auth_router
+from back.models.user import UserRole
+
+
 def test_register_user(client):
     response = client.post(
         "/auth/register",
@@ -34,6 +38,37 @@ def test_login_user(client, user):
     assert data["token_type"] == "bearer"
 
 
+def test_login_returns_503_when_hashing_pool_is_busy(client, user, monkeypatch):
+    from back.services import passwords
+
+    async def busy(*args):
+        raise passwords.HashingBusy("busy", retry_after=3)
+
+    monkeypatch.setattr(passwords.pool, "run_async", busy)
+
+    response = client.post("/auth/login", json={"username": "testuser", "password": "123456"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+
+def test_login_rehashes_password_after_cost_change(client, user, db_session):
+    from back.services import passwords
+
+    old_hash = user.hashed_password
+    cost = passwords.current_cost()
+    passwords.configure_cost(time_cost=1, memory_cost=8192, parallelism=1)
+    try:
+        response = client.post("/auth/login", json={"username": "testuser", "password": "123456"})
+    finally:
+        passwords.configure_cost(**cost)
+
+    assert response.status_code == 200
+    db_session.refresh(user)
+    assert user.hashed_password != old_hash
+    assert "m=8192,t=1,p=1" in user.hashed_password
+
+
 def test_login_with_wrong_password(client, user):
     response = client.post(
         "/auth/login",
@@ -154,4 +189,85 @@ def test_refresh_after_logout_fails(client, user):
         json={"refresh_token": tokens["refresh_token"]},
     )
 
-    assert refresh_response.status_code == 401
\ No newline at end of file
+    assert refresh_response.status_code == 401
+
+def test_role_change_invalidates_cached_user(client, user, admin):
+    user_tokens = client.post(
+        "/auth/login",
+        json={"username": "testuser", "password": "123456"},
+    ).json()
+    user_token, user_refresh = user_tokens["access_token"], user_tokens["refresh_token"]
+    admin_token = client.post(
+        "/auth/login",
+        json={"username": "adminuser", "password": "123456"},
+    ).json()["access_token"]
+
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {user_token}"})
+    assert me.json()["role"] == "user"
+
+    response = client.put(
+        "/auth/admin/set-role",
+        json={"username": "testuser", "role": "admin"},
+        headers={"Authorization": f"Bearer {admin_token}"},
+    )
+    assert response.status_code == 200
+
+    # Роль зашита в токен: старый отозван, обновлённый несёт новую роль.
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {user_token}"})
+    assert me.status_code == 401
+
+    refreshed = client.post("/auth/refresh", json={"refresh_token": user_refresh}).json()["access_token"]
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {refreshed}"})
+    assert me.json()["role"] == "admin"
+
+
+def test_protected_route_authorizes_without_db(client, user, monkeypatch):
+    token = client.post("/auth/login", json={"username": "testuser", "password": "123456"}).json()["access_token"]
+
+    def no_db():
+        raise AssertionError("get_current_user не должен читать БД")
+
+    monkeypatch.setattr(auth_router, "SessionLocal", no_db)
+    user = auth_router.get_current_user(token)
+
+    assert user.username == "testuser"
+    assert user.role == UserRole.user
+
+
+def test_logout_revokes_access_token_of_that_session(client, user):
+    first = client.post("/auth/login", json={"username": "testuser", "password": "123456"}).json()
+    second = client.post("/auth/login", json={"username": "testuser", "password": "123456"}).json()
+
+    client.post("/auth/logout", json={"refresh_token": first["refresh_token"], "all_sessions": False})
+
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {first['access_token']}"}).status_code == 401
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {second['access_token']}"}).status_code == 200
+
+
+def test_refresh_rotation_rejects_reused_token(client, user):
+    tokens = client.post("/auth/login", json={"username": "testuser", "password": "123456"}).json()
+
+    rotated = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert rotated.status_code == 200
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": rotated.json()["refresh_token"]}).status_code == 200
+
+
+def test_change_password(client, user):
+    token = client.post(
+        "/auth/login",
+        json={"username": "testuser", "password": "123456"},
+    ).json()["access_token"]
+
+    response = client.put(
+        "/auth/change-password",
+        json={"old_password": "123456", "new_password": "654321"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 200
+
+    login_response = client.post(
+        "/auth/login",
+        json={"username": "testuser", "password": "654321"},
+    )
+    assert login_response.status_code == 200
@@ -27,4 +27,90 @@ def test_create_access_token_returns_string():
     token = create_access_token({"sub": "testuser"})
 
     assert isinstance(token, str)
-    assert len(token) > 10
\ No newline at end of file
+    assert len(token) > 10
+
+def test_hashing_pool_run_async_waits_without_blocking_loop():
+    import asyncio
+    import time
+
+    import pytest
+
+    from back.services.passwords import HashingBusy, HashingPool
+
+    pool = HashingPool(1, max_queue=4, max_wait=0.2)
+
+    def slow(value):
+        time.sleep(0.05)
+        return value
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(pool.run_async(slow, i) for i in range(3)))
+        with pytest.raises(HashingBusy):
+            await pool.run_async(time.sleep, 1)
+        task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(main())
+    pool.shutdown()
+
+    assert results == [0, 1, 2]
+    assert ticks > 10
+    assert pool.get_stats()["timed_out"] == 1
+
+
+def test_hashing_pool_rejects_beyond_queue_limit():
+    import threading
+    import time
+
+    import pytest
+
+    from back.services.passwords import HashingBusy, HashingPool
+
+    pool = HashingPool(1, max_queue=1, max_wait=5, retry_after=4)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        return "ok"
+
+    runners = [threading.Thread(target=pool.run, args=(slow,)) for _ in range(2)]
+    for runner in runners:
+        runner.start()
+    started.wait(timeout=1)
+    while pool.pending < 2:
+        time.sleep(0.001)
+
+    with pytest.raises(HashingBusy) as exc:
+        pool.run(slow)
+
+    release.set()
+    for runner in runners:
+        runner.join()
+    pool.shutdown()
+
+    assert exc.value.retry_after == 4
+    stats = pool.get_stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["pending"] == 0
+
+
+def test_calibrate_picks_time_cost_within_target():
+    from back.services import passwords
+
+    time_cost, elapsed = passwords.calibrate(10_000, memory_cost=1024, parallelism=1, max_time_cost=3)
+    assert time_cost == 3
+    assert elapsed > 0
+
+    assert passwords.calibrate(0, memory_cost=1024, parallelism=1, max_time_cost=3)[0] == 1
@@ -1,4 +1,9 @@
+import threading
+import time
+
+import back.services.books_api as books_api
 from back.services.books_api import _normalize_item
+from back.services.rate_limit import RateLimited
 
 
 def test_normalize_item_returns_expected_structure():
@@ -36,4 +41,138 @@ def test_normalize_item_handles_missing_fields():
     assert result["description"] == ""
     assert result["thumbnail"] is None
     assert result["info_url"] is None
-    assert result["published_date"] is None
\ No newline at end of file
+    assert result["published_date"] is None
+
+
+def _counting_fetch(monkeypatch, items):
+    calls = []
+
+    def fake(query, user_id=None):
+        calls.append(query)
+        return items
+
+    monkeypatch.setattr(books_api, "_fetch", fake)
+    return calls
+
+
+def test_search_books_caches_by_normalized_query(monkeypatch):
+    calls = _counting_fetch(monkeypatch, [{"id": "b1"}])
+
+    first = books_api.search_books("Война  и мир")
+    second = books_api.search_books("  война и МИР ")
+
+    assert first["items"] == [{"id": "b1"}]
+    assert second == first
+    assert len(calls) == 1
+
+
+def test_search_books_persistent_cache_survives_memory_clear(monkeypatch):
+    calls = _counting_fetch(monkeypatch, [{"id": "b1"}])
+
+    books_api.search_books("python")
+    books_api.clear_cache()
+    result = books_api.search_books("python")
+
+    assert result["items"] == [{"id": "b1"}]
+    assert len(calls) == 1
+
+
+def test_search_books_caches_empty_result_with_negative_ttl(monkeypatch):
+    calls = _counting_fetch(monkeypatch, [])
+    monkeypatch.setattr(books_api, "BOOKS_NEGATIVE_TTL", 0.05)
+
+    books_api.search_books("nothing")
+    books_api.search_books("nothing")
+    assert len(calls) == 1
+
+    time.sleep(0.1)
+    books_api.clear_cache()
+    books_api.search_books("nothing")
+    assert len(calls) == 2
+
+
+def test_search_books_coalesces_concurrent_requests(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def slow(query, user_id=None):
+        calls.append(query)
+        release.wait(2)
+        return [{"id": "b1"}]
+
+    monkeypatch.setattr(books_api, "_fetch", slow)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(books_api.search_books("same"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert [r["items"] for r in results] == [[{"id": "b1"}]] * 5
+
+
+def test_search_books_serves_stale_entry_when_rate_limited(monkeypatch):
+    _counting_fetch(monkeypatch, [{"id": "old"}])
+    monkeypatch.setattr(books_api, "BOOKS_CACHE_TTL", 0)
+    books_api.search_books("python")
+    books_api.clear_cache()
+
+    def limited(query, user_id=None):
+        raise RateLimited("global", retry_after=1)
+
+    monkeypatch.setattr(books_api, "_fetch", limited)
+    result = books_api.search_books("python")
+
+    assert result["items"] == [{"id": "old"}]
+    assert result["stale"] is True
+
+
+def test_search_books_degrades_to_empty_when_rate_limited_without_cache(monkeypatch):
+    def limited(query, user_id=None):
+        raise RateLimited("global", retry_after=1)
+
+    monkeypatch.setattr(books_api, "_fetch", limited)
+    result = books_api.search_books("python")
+
+    assert result["items"] == []
+    assert result["degraded"] is True
+
+
+def test_user_rate_limit_of_leader_is_not_shared_with_other_users(monkeypatch):
+    calls = []
+    coalesced = books_api.cache_stats()["coalesced"]
+
+    def fetch(query, user_id=None):
+        calls.append(user_id)
+        if user_id == 1:
+            # Ждём, пока второй пользователь присоединится к этому же запросу.
+            deadline = time.monotonic() + 2
+            while books_api.cache_stats()["coalesced"] == coalesced and time.monotonic() < deadline:
+                time.sleep(0.005)
+            raise RateLimited("user", retry_after=5)
+        return [{"id": "b1"}]
+
+    monkeypatch.setattr(books_api, "_fetch", fetch)
+    results = {}
+
+    def search(user_id):
+        try:
+            results[user_id] = books_api.search_books("shared", user_id=user_id)
+        except RateLimited as e:
+            results[user_id] = e
+
+    first = threading.Thread(target=search, args=(1,))
+    first.start()
+    while not calls:
+        time.sleep(0.001)
+    second = threading.Thread(target=search, args=(2,))
+    second.start()
+    first.join()
+    second.join()
+
+    assert isinstance(results[1], RateLimited)
+    assert results[2]["items"] == [{"id": "b1"}]
+    assert calls == [1, 2]
@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from back.models.upload import Upload, UploadStatus
+from back.services.rate_limit import RateLimited
 
 
 def test_get_books_by_upload_success(client, user, db_session, monkeypatch):
@@ -20,7 +21,7 @@ def test_get_books_by_upload_success(client, user, db_session, monkeypatch):
     db_session.commit()
     db_session.refresh(upload)
 
-    def fake_search_books(query: str):
+    def fake_search_books(query: str, user_id=None):
         return {
             "items": [
                 {
@@ -103,8 +104,8 @@ def test_get_books_by_upload_rate_limit(client, user, db_session, monkeypatch):
     db_session.commit()
     db_session.refresh(upload)
 
-    def fake_search_books(query: str):
-        raise RuntimeError("Rate limit exceeded")
+    def fake_search_books(query: str, user_id=None):
+        raise RateLimited("user", retry_after=2.5)
 
     monkeypatch.setattr(books_router, "search_books", fake_search_books)
 
@@ -116,6 +117,7 @@ def test_get_books_by_upload_rate_limit(client, user, db_session, monkeypatch):
     assert response.status_code == 429
     data = response.json()
     assert data["detail"] == "Слишком много запросов к внешнему API"
+    assert response.headers["Retry-After"] == "3"
 
 
 def test_get_books_by_upload_external_error(client, user, db_session, monkeypatch):
@@ -135,7 +137,7 @@ def test_get_books_by_upload_external_error(client, user, db_session, monkeypatc
     db_session.commit()
     db_session.refresh(upload)
 
-    def fake_search_books(query: str):
+    def fake_search_books(query: str, user_id=None):
         raise RuntimeError("external_api_error")
 
     monkeypatch.setattr(books_router, "search_books", fake_search_books)
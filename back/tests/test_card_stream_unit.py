@@ -0,0 +1,41 @@
+import json
+
+from back.services.card_stream import CardStreamParser
+
+
+def _feed_in_pieces(text, size):
+    parser = CardStreamParser()
+    cards = []
+    for i in range(0, len(text), size):
+        cards.extend(parser.feed(text[i:i + size]))
+    return parser, cards
+
+
+def test_cards_are_emitted_as_soon_as_they_close():
+    parser = CardStreamParser()
+
+    assert parser.feed('Вот ответ: {"cards": [{"q": "Что') == []
+    assert parser.feed(' это?", "a": "Ответ"}, {"q"') == [{"q": "Что это?", "a": "Ответ"}]
+    assert parser.feed(': "Ещё?", "a": "Да"}]}') == [{"q": "Ещё?", "a": "Да"}]
+
+
+def test_braces_and_quotes_inside_strings_are_ignored():
+    reply = json.dumps({"cards": [{"q": 'Что такое "{x}"?', "a": "Множество \\ {1, 2}"}]}, ensure_ascii=False)
+
+    for size in (1, 3, len(reply)):
+        _, cards = _feed_in_pieces(reply, size)
+        assert cards == [{"q": 'Что такое "{x}"?', "a": "Множество \\ {1, 2}"}]
+
+
+def test_objects_without_question_and_answer_are_skipped():
+    parser, cards = _feed_in_pieces('{"cards": [{"q": "1"}, {"q": "2", "a": "b"}, {broken}]}', 5)
+
+    assert cards == [{"q": "2", "a": "b"}]
+    assert parser.seen_json
+
+
+def test_reply_without_json():
+    parser, cards = _feed_in_pieces("Не могу помочь", 4)
+
+    assert cards == []
+    assert not parser.seen_json
@@ -36,6 +36,69 @@ def test_get_cards_success(client, user, db_session):
     assert data[0]["answer"] == "A1"
 
 
+def _upload_with_cards(db_session, user, count):
+    from back.repositories.flashcards import FlashcardRepository
+
+    upload = Upload(
+        user_id=user.id,
+        filename="many.pdf",
+        title="many",
+        object_key="user_1/many.pdf",
+        content_type="application/pdf",
+        size=100,
+        timestamp=datetime.utcnow(),
+        status=UploadStatus.done,
+    )
+    db_session.add(upload)
+    db_session.commit()
+    FlashcardRepository().insert_many(db_session, upload.id, [{"q": f"Q{i}", "a": f"A{i}"} for i in range(count)])
+    db_session.commit()
+    db_session.refresh(upload)
+    return upload
+
+
+def test_get_cards_pages_by_cursor_and_projects_fields(client, user, db_session):
+    upload = _upload_with_cards(db_session, user, 5)
+    headers = {"Authorization": _get_auth_header(client)}
+
+    first = client.get(f"/cards/{upload.id}?limit=3&fields=question", headers=headers)
+    assert first.status_code == 200
+    assert first.json() == [{"question": "Q0"}, {"question": "Q1"}, {"question": "Q2"}]
+
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get(f"/cards/{upload.id}", params={"limit": 3, "cursor": cursor, "fields": "question,answer"}, headers=headers)
+    assert second.json() == [{"question": "Q3", "answer": "A3"}, {"question": "Q4", "answer": "A4"}]
+    assert "X-Next-Cursor" not in second.headers
+
+    assert client.get(f"/cards/{upload.id}?fields=secret", headers=headers).status_code == 400
+    assert client.get(f"/cards/{upload.id}?cursor=broken", headers=headers).status_code == 400
+
+
+def test_get_cards_etag_changes_with_card_set(client, user, db_session):
+    from back.repositories.flashcards import FlashcardRepository
+
+    upload = _upload_with_cards(db_session, user, 2)
+    headers = {"Authorization": _get_auth_header(client)}
+
+    response = client.get(f"/cards/{upload.id}", headers=headers)
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    cached = client.get(f"/cards/{upload.id}", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    assert client.get(f"/cards/{upload.id}?fields=question", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+    FlashcardRepository().replace(db_session, upload.id, [{"q": "New", "a": "A"}])
+    db_session.commit()
+
+    fresh = client.get(f"/cards/{upload.id}", headers={**headers, "If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
+    assert [c["question"] for c in fresh.json()] == ["New"]
+
+
 def test_get_cards_not_found(client, user):
     response = client.get(
         "/cards/9999",
@@ -0,0 +1,45 @@
+from back.services.chunking import CHARS_PER_TOKEN, estimate_tokens, split_windows
+
+
+def _words(n, word="слово"):
+    return " ".join([word] * n)
+
+
+def test_small_pages_are_packed_into_one_window():
+    pages = ["Первая страница.", "", "Вторая страница."]
+
+    assert split_windows(pages, token_budget=100) == ["Первая страница.\n\nВторая страница."]
+
+
+def test_windows_respect_token_budget_and_page_boundaries():
+    pages = [_words(30) for _ in range(10)]
+
+    windows = split_windows(pages, token_budget=100)
+
+    assert len(windows) > 1
+    assert all(estimate_tokens(w) <= 100 for w in windows)
+    assert "\n\n".join(windows).count("слово") == 300
+
+
+def test_oversized_page_is_split_by_paragraphs_and_sentences():
+    paragraph = ". ".join(_words(10) for _ in range(20)) + "."
+    page = paragraph + "\n\n" + "Короткий абзац."
+
+    windows = split_windows([page], token_budget=50)
+
+    assert all(len(w) <= 50 * CHARS_PER_TOKEN for w in windows)
+    assert windows[-1].endswith("Короткий абзац.")
+
+
+def test_max_windows_spreads_over_whole_document():
+    pages = [f"Страница {i}. " + _words(60) for i in range(10)]
+
+    windows = split_windows(pages, token_budget=100, max_windows=3)
+
+    assert len(windows) == 3
+    assert windows[0].startswith("Страница 0.")
+    assert windows[-1].startswith("Страница 9.")
+
+
+def test_empty_document_has_no_windows():
+    assert split_windows(["", "  "], token_budget=100) == []
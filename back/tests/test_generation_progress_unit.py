@@ -0,0 +1,49 @@
+from back.services.generation_progress import GEN_TOKENS_PER_CARD, GenerationProgress
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _progress(clock, published, **kwargs):
+    options = {"windows": 2, "expected_cards": 2, "interval": 1.0, "clock": clock}
+    options.update(kwargs)
+    return GenerationProgress(published.append, **options)
+
+
+def test_publishes_at_most_once_per_interval():
+    clock = FakeClock()
+    published = []
+    progress = _progress(clock, published)
+
+    for _ in range(50):
+        progress.add_tokens()
+    clock.now = 1.5
+    progress.add_tokens()
+    progress.finish()
+
+    assert [p["tokens"] for p in published] == [1, 51, 51]
+
+
+def test_eta_uses_measured_rate_and_finished_windows():
+    clock = FakeClock()
+    published = []
+    progress = _progress(clock, published)
+
+    clock.now = 2.0
+    progress.add_tokens(20)
+    snapshot = progress.snapshot()
+    assert snapshot["tokens_per_second"] == 10.0
+    assert snapshot["eta_seconds"] == (2 * GEN_TOKENS_PER_CARD - 20) / 10.0
+
+    progress.window_done(20)
+    progress.set_cards(3)
+    snapshot = progress.snapshot()
+    # Одно окно из двух дало 20 токенов — ждём ещё столько же.
+    assert snapshot["eta_seconds"] == 2.0
+    assert snapshot["cards"] == 3
+    assert snapshot["windows_done"] == 1
@@ -0,0 +1,509 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from back.models.generation_batch import GenerationBatch
+from back.models.generation_job import GenerationJob, JobStatus
+from back.models.upload import Upload, UploadStatus
+from back.services import generation_queue
+from back.services.card_generation import GenerationCancelled, GenerationError
+
+
+@pytest.fixture(autouse=True)
+def use_test_sessions(monkeypatch, session_factory):
+    monkeypatch.setattr(generation_queue, "SessionLocal", session_factory)
+
+
+def _make_upload(db_session, user, status=UploadStatus.uploaded):
+    upload = Upload(
+        user_id=user.id,
+        filename="doc.pdf",
+        title="doc",
+        object_key=f"user_{user.id}/doc-{datetime.utcnow().timestamp()}.pdf",
+        content_type="application/pdf",
+        size=100,
+        timestamp=datetime.utcnow(),
+        status=status,
+    )
+    db_session.add(upload)
+    db_session.commit()
+    db_session.refresh(upload)
+    return upload
+
+
+def test_enqueue_marks_upload_generating_and_is_idempotent(db_session, user):
+    upload = _make_upload(db_session, user)
+
+    job = generation_queue.enqueue_generation(db_session, upload)
+    again = generation_queue.enqueue_generation(db_session, upload)
+
+    db_session.refresh(upload)
+    assert job.id == again.id
+    assert job.status == JobStatus.queued
+    assert upload.status == UploadStatus.generating
+
+
+def test_new_parameters_supersede_active_job(db_session, user):
+    upload = _make_upload(db_session, user)
+    first = generation_queue.enqueue_generation(db_session, upload)
+    assert generation_queue.claim_next_job() == first.id
+
+    second = generation_queue.enqueue_generation(db_session, upload, force=True)
+
+    db_session.refresh(first)
+    assert second.id != first.id
+    assert first.cancel_requested is True
+    # Пока прежняя задача не остановилась, новую по той же загрузке не выдают.
+    assert generation_queue.claim_next_job() is None
+    assert generation_queue.enqueue_generation(db_session, upload, force=True).id == second.id
+
+
+def test_cancel_queued_job_releases_upload(db_session, user):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+
+    generation_queue.cancel_job(db_session, job)
+
+    db_session.refresh(upload)
+    assert job.status == JobStatus.cancelled
+    assert upload.status == UploadStatus.uploaded
+    assert generation_queue.claim_next_job() is None
+
+
+def test_claim_is_exclusive(db_session, user):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+
+    assert generation_queue.claim_next_job() == job.id
+    assert generation_queue.claim_next_job() is None
+
+    db_session.refresh(job)
+    assert job.status == JobStatus.running
+    assert job.attempts == 1
+    assert job.locked_until > datetime.utcnow()
+
+
+def _make_user(db_session, name):
+    from back.models.user import User
+
+    other = User(username=name, email=f"{name}@example.com", hashed_password="x")
+    db_session.add(other)
+    db_session.commit()
+    return other
+
+
+def test_claim_alternates_between_users(db_session, user, monkeypatch):
+    other = _make_user(db_session, "other")
+    heavy = [generation_queue.enqueue_generation(db_session, _make_upload(db_session, user)) for _ in range(3)]
+    light = generation_queue.enqueue_generation(db_session, _make_upload(db_session, other))
+
+    claimed = [generation_queue.claim_next_job() for _ in range(3)]
+
+    # Задача второго пользователя не ждёт, пока выполнится весь пакет первого.
+    assert claimed == [heavy[0].id, light.id, heavy[1].id]
+
+
+def test_claim_respects_priority_and_per_user_limit(db_session, user, monkeypatch):
+    monkeypatch.setattr(generation_queue, "JOB_MAX_RUNNING_PER_USER", 1)
+    other = _make_user(db_session, "other")
+    normal = generation_queue.enqueue_generation(db_session, _make_upload(db_session, user))
+    second = generation_queue.enqueue_generation(db_session, _make_upload(db_session, user))
+    urgent = generation_queue.enqueue_generation(db_session, _make_upload(db_session, other), priority=1)
+
+    assert generation_queue.claim_next_job() == urgent.id
+    assert generation_queue.claim_next_job() == normal.id
+    assert generation_queue.claim_next_job() is None
+    db_session.refresh(second)
+    assert second.status == JobStatus.queued
+
+
+def test_batch_runs_at_most_max_parallel_jobs(db_session, user):
+    uploads = [_make_upload(db_session, user) for _ in range(3)]
+    batch, jobs = generation_queue.schedule_batch(db_session, uploads, user_id=user.id, max_parallel=1)
+
+    assert generation_queue.claim_next_job() == jobs[0].id
+    assert generation_queue.claim_next_job() is None
+
+    first = generation_queue.repo.get(db_session, jobs[0].id)
+    generation_queue.repo.complete(db_session, first, created=4, lease=first.locked_by)
+    assert generation_queue.claim_next_job() == jobs[1].id
+
+    progress = generation_queue.batch_progress(db_session, batch)
+    assert progress["counts"] == {"queued": 1, "running": 1, "done": 1, "error": 0, "cancelled": 0}
+    assert progress["cards_created"] == 4
+    assert progress["jobs_per_minute"] is not None
+
+
+def test_batch_admission_is_capped_per_user(db_session, user, monkeypatch):
+    monkeypatch.setattr(generation_queue, "JOB_QUEUE_LIMIT", 5)
+    monkeypatch.setattr(generation_queue, "JOB_QUEUE_LIMIT_PER_USER", 3)
+    other = _make_user(db_session, "other")
+
+    generation_queue.schedule_batch(db_session, [_make_upload(db_session, user) for _ in range(3)], user_id=user.id)
+    with pytest.raises(generation_queue.QueueFull):
+        generation_queue.enqueue_generation(db_session, _make_upload(db_session, user))
+
+    # Пакет первого пользователя не занимает чужое место в очереди.
+    job = generation_queue.enqueue_generation(db_session, _make_upload(db_session, other))
+    assert job.status == JobStatus.queued
+
+
+def test_batch_is_enqueued_whole_or_not_at_all(db_session, user, monkeypatch):
+    uploads = [_make_upload(db_session, user) for _ in range(3)]
+    enqueue = generation_queue.repo.enqueue
+    calls = []
+
+    def flaky(db, **kwargs):
+        calls.append(kwargs["upload_id"])
+        if len(calls) == 2:
+            raise RuntimeError("db down")
+        return enqueue(db, **kwargs)
+
+    monkeypatch.setattr(generation_queue.repo, "enqueue", flaky)
+    with pytest.raises(RuntimeError):
+        generation_queue.schedule_batch(db_session, uploads, user_id=user.id)
+
+    assert db_session.query(GenerationJob).count() == 0
+    assert db_session.query(GenerationBatch).count() == 0
+    for upload in uploads:
+        db_session.refresh(upload)
+        assert upload.status == UploadStatus.uploaded
+
+
+def test_process_job_success(db_session, user, monkeypatch):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+    monkeypatch.setattr(generation_queue, "generate_cards_for_upload", lambda db, u, **kwargs: 3)
+
+    generation_queue.process_job(generation_queue.claim_next_job())
+
+    db_session.refresh(job)
+    db_session.refresh(upload)
+    assert job.status == JobStatus.done
+    assert job.created == 3
+    assert upload.status == UploadStatus.done
+
+
+def test_process_job_stops_when_cancelled(db_session, user, monkeypatch):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+    job_id = generation_queue.claim_next_job()
+
+    def generate(db, u, *, cancel, **kwargs):
+        db_session.refresh(job)
+        generation_queue.cancel_job(db_session, job)
+        assert cancel.is_set()
+        raise GenerationCancelled("Генерация отменена")
+
+    monkeypatch.setattr(generation_queue, "generate_cards_for_upload", generate)
+
+    generation_queue.process_job(job_id)
+
+    db_session.refresh(job)
+    db_session.refresh(upload)
+    assert job.status == JobStatus.cancelled
+    assert job.attempts == 1
+    assert upload.status == UploadStatus.uploaded
+    assert generation_queue._cancel_events == {}
+
+
+def test_check_cancel_sees_deleted_job(db_session, user):
+    upload = _make_upload(db_session, user)
+    generation_queue.enqueue_generation(db_session, upload)
+    job_id = generation_queue.claim_next_job()
+    generation_queue._cancel_events[job_id] = event = generation_queue.threading.Event()
+    try:
+        assert generation_queue.check_cancel(job_id) is False
+
+        db_session.query(GenerationJob).filter(GenerationJob.id == job_id).delete()
+        db_session.commit()
+
+        assert generation_queue.check_cancel(job_id) is True
+        assert event.is_set()
+    finally:
+        generation_queue._cancel_events.pop(job_id, None)
+
+
+def test_process_job_retries_then_fails(db_session, user, monkeypatch):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+
+    def boom(db, u, **kwargs):
+        raise GenerationError("Ошибка модели")
+
+    monkeypatch.setattr(generation_queue, "generate_cards_for_upload", boom)
+    monkeypatch.setattr(generation_queue, "_retry_delay", lambda attempts: 0)
+
+    for _ in range(job.max_attempts):
+        generation_queue.process_job(generation_queue.claim_next_job())
+
+    db_session.refresh(job)
+    db_session.refresh(upload)
+    assert job.status == JobStatus.error
+    assert job.attempts == job.max_attempts
+    assert job.last_error == "Ошибка модели"
+    assert upload.status == UploadStatus.error
+
+
+def test_busy_model_postpones_retry_by_retry_after(db_session, user, monkeypatch):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+
+    def busy(db, u, **kwargs):
+        raise GenerationError("Модель занята", retry_after=120)
+
+    monkeypatch.setattr(generation_queue, "generate_cards_for_upload", busy)
+    monkeypatch.setattr(generation_queue, "_retry_delay", lambda attempts: 0)
+
+    generation_queue.process_job(generation_queue.claim_next_job())
+
+    db_session.refresh(job)
+    assert job.status == JobStatus.queued
+    assert job.run_after >= datetime.utcnow() + timedelta(seconds=100)
+
+
+def test_non_retryable_error_fails_immediately(db_session, user, monkeypatch):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+
+    def no_text(db, u, **kwargs):
+        raise GenerationError("Нет текста", retryable=False)
+
+    monkeypatch.setattr(generation_queue, "generate_cards_for_upload", no_text)
+
+    generation_queue.process_job(generation_queue.claim_next_job())
+
+    db_session.refresh(job)
+    assert job.status == JobStatus.error
+    assert job.attempts == 1
+
+
+def test_recover_requeues_expired_and_restarts_stuck(db_session, user):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+    generation_queue.claim_next_job()
+
+    db_session.refresh(job)
+    job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+
+    stuck = _make_upload(db_session, user, status=UploadStatus.generating)
+
+    result = generation_queue.recover(db_session)
+
+    db_session.refresh(job)
+    assert result == {"requeued": 1, "failed": 0, "restarted": 1}
+    assert job.status == JobStatus.queued
+    restarted = db_session.query(GenerationJob).filter(GenerationJob.upload_id == stuck.id).one()
+    assert restarted.status == JobStatus.queued
+
+
+def test_generation_cache_skips_model_for_same_text(db_session, user, monkeypatch):
+    from back.models.flashcards import Flashcard
+    from back.services import card_generation, text_cache
+
+    monkeypatch.setattr(text_cache, "get_pages", lambda db, u, max_pages=None: ["Текст документа."])
+    calls = []
+
+    def stream(prompt, cancel=None):
+        calls.append(prompt)
+        yield json.dumps({"cards": [{"q": "Q", "a": "A"}]})
+
+    monkeypatch.setattr(card_generation, "_stream_model", stream)
+
+    first = _make_upload(db_session, user)
+    second = _make_upload(db_session, user)
+    assert card_generation.generate_cards_for_upload(db_session, first) == 1
+    db_session.commit()
+
+    created = card_generation.generate_cards_for_upload(db_session, second)
+    db_session.commit()
+
+    assert created == 1
+    assert len(calls) == 1
+    cards = db_session.query(Flashcard).filter(Flashcard.upload_id == second.id).all()
+    assert [(c.question, c.answer) for c in cards] == [("Q", "A")]
+
+    card_generation.generate_cards_for_upload(db_session, second, force=True)
+    assert len(calls) == 2
+
+
+def test_generation_cache_key_depends_on_model_and_prompt_version(monkeypatch):
+    from back.services import card_generation
+
+    key, _, _ = card_generation._cache_key(["текст"])
+    monkeypatch.setattr(card_generation, "PROMPT_VERSION", "next")
+    assert card_generation._cache_key(["текст"])[0] != key
+    monkeypatch.setattr(card_generation, "MODEL_NAME", "other")
+    assert card_generation._cache_key(["текст"])[0] != key
+
+
+def test_generation_cache_evicts_expired_and_least_recently_used(db_session):
+    from back.models.generation_cache import GenerationCacheEntry
+    from back.repositories.generation_cache import GenerationCacheRepository
+
+    repo = GenerationCacheRepository()
+    for key in ("old", "a", "b", "c"):
+        repo.put(db_session, key=key, text_hash="h", model="m", prompt_version="1", max_cards=1, cards=[])
+
+    db_session.query(GenerationCacheEntry).filter(GenerationCacheEntry.key == "old").update(
+        {"created_at": datetime.utcnow() - timedelta(days=2)}
+    )
+    db_session.query(GenerationCacheEntry).filter(GenerationCacheEntry.key == "a").update(
+        {"last_used_at": datetime.utcnow() - timedelta(hours=1)}
+    )
+    db_session.commit()
+
+    assert repo.get(db_session, "old", ttl=86400) is None
+    assert repo.get(db_session, "c", ttl=86400).hits == 1
+
+    assert repo.evict(db_session, ttl=86400, max_entries=2) == 1
+    keys = {k for (k,) in db_session.query(GenerationCacheEntry.key)}
+    assert keys == {"b", "c"}
+
+
+def test_generation_covers_all_windows_and_dedups_cards(db_session, user, monkeypatch):
+    from back.models.flashcards import Flashcard
+    from back.services import card_generation, text_cache
+
+    upload = _make_upload(db_session, user)
+    pages = [f"Глава {i}. " + "текст " * 200 for i in range(4)]
+    monkeypatch.setattr(text_cache, "get_pages", lambda db, u, max_pages=None: pages)
+    monkeypatch.setattr(card_generation, "GEN_WINDOW_TOKENS", 400)
+
+    prompts = []
+
+    def ask(prompt, cancel=None):
+        prompts.append(prompt)
+        chapter = prompt.split("Глава ")[1][0]
+        reply = json.dumps({"cards": [
+            {"q": "Общий вопрос?", "a": "Ответ"},
+            {"q": f"Что в главе {chapter}?", "a": "Текст"},
+        ]}, ensure_ascii=False)
+        for i in range(0, len(reply), 7):
+            yield reply[i:i + 7]
+
+    monkeypatch.setattr(card_generation, "_stream_model", ask)
+
+    created = card_generation.generate_cards_for_upload(db_session, upload, max_windows=3)
+    db_session.commit()
+
+    assert len(prompts) == 3
+    questions = [c.question for c in db_session.query(Flashcard).filter(Flashcard.upload_id == upload.id)]
+    assert created == len(questions) == 4
+    assert questions.count("Общий вопрос?") == 1
+    assert {"Что в главе 0?", "Что в главе 3?"} <= set(questions)
+
+
+def test_generation_fails_only_when_every_window_fails(db_session, user, monkeypatch):
+    from back.models.flashcards import Flashcard
+    from back.services import card_generation, text_cache
+
+    upload = _make_upload(db_session, user)
+    db_session.add(Flashcard(upload_id=upload.id, question="Старый", answer="A"))
+    db_session.commit()
+    monkeypatch.setattr(text_cache, "get_pages", lambda db, u, max_pages=None: ["текст " * 400])
+    monkeypatch.setattr(card_generation, "GEN_WINDOW_TOKENS", 400)
+
+    def down(prompt, cancel=None):
+        raise GenerationError("Модель недоступна")
+
+    monkeypatch.setattr(card_generation, "_stream_model", down)
+
+    with pytest.raises(GenerationError):
+        card_generation.generate_cards_for_upload(db_session, upload)
+
+    db_session.rollback()
+    # Прежний набор заменяется только вместе с первой пачкой новых карточек.
+    assert [c.question for c in db_session.query(Flashcard).filter(Flashcard.upload_id == upload.id)] == ["Старый"]
+
+
+def test_flashcard_replace_is_atomic(db_session, user):
+    from back.models.flashcards import Flashcard
+    from back.repositories.flashcards import FlashcardRepository
+
+    repo = FlashcardRepository()
+    upload = _make_upload(db_session, user)
+    repo.insert_many(db_session, upload.id, [{"q": f"Q{i}", "a": "A"} for i in range(3)])
+    db_session.commit()
+
+    assert repo.replace(db_session, upload.id, [{"q": "New", "a": "A"}]) == 1
+    db_session.rollback()
+    assert db_session.query(Flashcard).filter(Flashcard.upload_id == upload.id).count() == 3
+
+    repo.replace(db_session, upload.id, [{"q": "New", "a": "A"}])
+    db_session.commit()
+    assert [c.question for c in db_session.query(Flashcard).filter(Flashcard.upload_id == upload.id)] == ["New"]
+
+
+def test_window_stops_reading_model_after_max_cards(monkeypatch):
+    from back.services import card_generation
+
+    monkeypatch.setattr(card_generation, "GEN_CARDS_PER_WINDOW", 2)
+    monkeypatch.setattr(card_generation, "GEN_WINDOW_TOKENS", 10)
+    consumed = []
+
+    def stream(prompt, cancel=None):
+        try:
+            for i in range(10):
+                consumed.append(i)
+                yield json.dumps({"q": f"q{i}", "a": "a"})
+        finally:
+            consumed.append("closed")
+
+    monkeypatch.setattr(card_generation, "_stream_model", stream)
+
+    cards = []
+    found = card_generation._generate_window("окно " * 20, cards.append)
+
+    assert found == 2
+    assert [c["q"] for c in cards] == ["q0", "q1"]
+    assert consumed == [0, 1, "closed"]
+
+
+def test_worker_that_lost_its_lock_does_not_overwrite_job(db_session, user, monkeypatch):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+    job_id = generation_queue.claim_next_job()
+
+    def slow_generate(db, u, **kwargs):
+        # Пока «зависший» воркер работал, recover вернул задачу в очередь, её забрал другой.
+        db_session.refresh(job)
+        job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+        db_session.commit()
+        assert generation_queue.recover(db_session)["requeued"] == 1
+        assert generation_queue.claim_next_job() == job_id
+        assert generation_queue.heartbeat(job_id) is False
+        assert generation_queue._cancel_events[job_id].is_set()
+        return 5
+
+    monkeypatch.setattr(generation_queue, "generate_cards_for_upload", slow_generate)
+
+    generation_queue.process_job(job_id)
+
+    db_session.refresh(job)
+    db_session.refresh(upload)
+    assert job.status == JobStatus.running
+    assert job.created is None
+    assert job.attempts == 2
+    assert upload.status == UploadStatus.generating
+
+
+def test_recover_fails_exhausted_job_and_upload_together(db_session, user):
+    upload = _make_upload(db_session, user)
+    job = generation_queue.enqueue_generation(db_session, upload)
+    generation_queue.claim_next_job()
+
+    db_session.refresh(job)
+    job.max_attempts = 1
+    job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db_session.commit()
+
+    assert generation_queue.recover(db_session) == {"requeued": 0, "failed": 1, "restarted": 0}
+
+    db_session.refresh(job)
+    db_session.refresh(upload)
+    assert job.status == JobStatus.error
+    assert job.locked_by is None
+    assert upload.status == UploadStatus.error
@@ -0,0 +1,49 @@
+def test_pdf_extractor_metrics_requires_admin(client, user):
+    response = client.get(
+        "/metrics/pdf-extractors",
+        headers={"Authorization": _get_auth_header(client, "testuser")},
+    )
+
+    assert response.status_code == 403
+
+
+def test_pdf_extractor_metrics_for_admin(client, admin):
+    response = client.get(
+        "/metrics/pdf-extractors",
+        headers={"Authorization": _get_auth_header(client, "adminuser")},
+    )
+
+    assert response.status_code == 200
+    assert isinstance(response.json(), dict)
+
+
+def test_generation_cache_metrics_for_admin(client, admin):
+    response = client.get(
+        "/metrics/generation-cache",
+        headers={"Authorization": _get_auth_header(client, "adminuser")},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"entries": 0, "hits": 0}
+
+
+def test_generation_queue_metrics_for_admin(client, admin):
+    response = client.get(
+        "/metrics/generation-queue",
+        headers={"Authorization": _get_auth_header(client, "adminuser")},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["counts"] == {"queued": 0, "running": 0, "done": 0, "error": 0, "cancelled": 0}
+
+
+def _get_auth_header(client, username):
+    login_response = client.post(
+        "/auth/login",
+        json={
+            "username": username,
+            "password": "123456",
+        },
+    )
+    token = login_response.json()["access_token"]
+    return f"Bearer {token}"
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from back.services import ollama_client
+from back.services.ollama_client import ConcurrencyGovernor, ModelBusy, OllamaClient
+
+
+def _governor(global_limit=2, **overrides):
+    options = {"model_limit": 2, "max_queue": 10, "max_wait": 1.0, **overrides}
+    return ConcurrencyGovernor(global_limit, **options)
+
+
+def test_governor_limits_concurrency_per_model_and_globally():
+    governor = _governor(global_limit=3, model_limit=2, model_limits={"small": 1})
+    peak = {"llama3": 0, "small": 0, "total": 0}
+    running = {"llama3": 0, "small": 0, "total": 0}
+
+    async def job(model):
+        async with governor.slot(model):
+            running[model] += 1
+            running["total"] += 1
+            peak[model] = max(peak[model], running[model])
+            peak["total"] = max(peak["total"], running["total"])
+            await asyncio.sleep(0.01)
+            running[model] -= 1
+            running["total"] -= 1
+
+    async def main():
+        await asyncio.gather(*(job("llama3") for _ in range(5)), *(job("small") for _ in range(5)))
+
+    asyncio.run(main())
+
+    assert peak == {"llama3": 2, "small": 1, "total": 3}
+    assert governor.get_stats()["acquired"] == 10
+    assert governor.active == 0 and governor.waiting == 0
+
+
+def test_governor_rejects_when_queue_is_full():
+    governor = _governor(global_limit=1, model_limit=1, max_queue=1, retry_after=7)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with governor.slot("m"):
+                await release.wait()
+
+        async def wait_for_slot():
+            async with governor.slot("m"):
+                pass
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(wait_for_slot())
+        await asyncio.sleep(0)
+
+        with pytest.raises(ModelBusy) as exc:
+            async with governor.slot("m"):
+                pass
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        return exc.value
+
+    error = asyncio.run(main())
+
+    assert error.retry_after == 7
+    assert governor.stats["rejected"] == 1
+
+
+def test_governor_times_out_waiting_for_slot():
+    governor = _governor(global_limit=1, model_limit=1, max_wait=0.05)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with governor.slot("m"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(ModelBusy):
+            async with governor.slot("m"):
+                pass
+        release.set()
+        await holder
+
+    asyncio.run(main())
+
+    assert governor.stats["timed_out"] == 1
+    assert governor.waiting == 0
+
+
+def test_iter_chat_streams_pieces_over_shared_client():
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(json.loads(request.content))
+        lines = [json.dumps({"message": {"content": piece}}) for piece in ("Прив", "ет")]
+        return httpx.Response(200, text="\n".join(lines + ["", "not json"]))
+
+    client = OllamaClient(
+        "http://ollama",
+        governor=_governor(),
+        transport=httpx.MockTransport(handler),
+    )
+
+    for _ in range(2):
+        assert list(ollama_client.iter_chat("llama3", [{"role": "user", "content": "hi"}], ollama=client)) == ["Прив", "ет"]
+
+    assert requests_seen[0]["model"] == "llama3"
+    assert requests_seen[0]["stream"] is True
+    assert client.governor.active == 0
+
+
+def test_iter_chat_raises_on_error_status():
+    client = OllamaClient(
+        "http://ollama",
+        governor=_governor(),
+        transport=httpx.MockTransport(lambda request: httpx.Response(500)),
+    )
+
+    with pytest.raises(ollama_client.OllamaError):
+        list(ollama_client.iter_chat("llama3", [], ollama=client))
+    assert client.governor.active == 0
+
+
+def test_iter_chat_cancel_aborts_request_before_first_token(monkeypatch):
+    monkeypatch.setattr(ollama_client, "OLLAMA_CANCEL_POLL", 0.01)
+
+    async def slow(request):
+        await asyncio.sleep(5)
+        return httpx.Response(200, text="")
+
+    client = OllamaClient("http://ollama", governor=_governor(), transport=httpx.MockTransport(slow))
+    cancel = threading.Event()
+    cancel.set()
+
+    started = time.monotonic()
+    with pytest.raises(ollama_client.Cancelled):
+        list(ollama_client.iter_chat("llama3", [], ollama=client, cancel=cancel))
+
+    assert time.monotonic() - started < 1
+    assert client.governor.active == 0
+
+
+def test_iter_chat_cancel_stops_continuous_token_stream(monkeypatch):
+    monkeypatch.setattr(ollama_client, "OLLAMA_CANCEL_POLL", 0.5)
+
+    async def endless():
+        while True:
+            yield (json.dumps({"message": {"content": "x"}}) + "\n").encode()
+            await asyncio.sleep(0.001)
+
+    client = OllamaClient(
+        "http://ollama",
+        governor=_governor(),
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, content=endless())),
+    )
+    cancel = threading.Event()
+    received = []
+
+    started = time.monotonic()
+    with pytest.raises(ollama_client.Cancelled):
+        for piece in ollama_client.iter_chat("llama3", [], ollama=client, cancel=cancel):
+            received.append(piece)
+            if len(received) == 5:
+                cancel.set()
+
+    assert len(received) == 5
+    assert time.monotonic() - started < 1
+    assert client.governor.active == 0
+
+
+def test_parse_model_limits():
+    assert ollama_client.parse_model_limits("llama3=1, mistral=2,bad,x=") == {"llama3": 1, "mistral": 2}
@@ -0,0 +1,61 @@
+from back.benchmarks.sample_pdf import make_text_pdf
+from back.services import pdf_parser
+
+
+def _pdf(page_count):
+    return make_text_pdf([f"Page {i + 1} text" for i in range(page_count)])
+
+
+def test_extract_text_respects_max_pages():
+    text = pdf_parser.extract_text_from_pdf_bytes(_pdf(8), max_pages=3)
+
+    assert text == "Page 1 text\n\nPage 2 text\n\nPage 3 text"
+
+
+def test_extract_pages_keeps_empty_pages():
+    data = make_text_pdf(["first", "", "third"])
+
+    assert pdf_parser.extract_pages_from_pdf_bytes(data, max_pages=None) == ["first", "", "third"]
+
+
+def test_chunk_ranges_cover_all_pages():
+    assert pdf_parser._chunk_ranges(10, 4) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_parallel_extraction_preserves_page_order():
+    data = _pdf(13)
+
+    sequential = pdf_parser.extract_pages_from_pdf_bytes(data, max_pages=None, parallel=False)
+    parallel = pdf_parser.extract_pages_from_pdf_bytes(data, max_pages=None, parallel=True, pages_per_chunk=3)
+
+    assert parallel == sequential
+    assert parallel[12] == "Page 13 text"
+
+
+def test_pdfium_is_default_and_timings_are_recorded():
+    pdf_parser.reset_extractor_stats()
+
+    pdf_parser.extract_pages_from_pdf_bytes(_pdf(4), max_pages=None, parallel=False)
+
+    stats = pdf_parser.get_extractor_stats()
+    assert stats["pdfium"]["pages"] == 4
+    assert "pdfplumber" not in stats
+
+
+def test_empty_pages_fall_back_to_pdfplumber(monkeypatch):
+    pdf_parser.reset_extractor_stats()
+    pdfium = pdf_parser.EXTRACTORS["pdfium"]
+    monkeypatch.setattr(pdfium, "extract", lambda source, numbers: ["" if n == 1 else "fast" for n in numbers])
+
+    pages = pdf_parser.extract_pages_from_pdf_bytes(_pdf(3), max_pages=None, parallel=False)
+
+    assert pages == ["fast", "Page 2 text", "fast"]
+    assert pdf_parser.get_extractor_stats()["pdfplumber"]["pages"] == 1
+
+
+def test_layout_mode_uses_pdfplumber_only():
+    pdf_parser.reset_extractor_stats()
+
+    pdf_parser.extract_pages_from_pdf_bytes(_pdf(2), max_pages=None, parallel=False, layout=True)
+
+    assert set(pdf_parser.get_extractor_stats()) == {"pdfplumber"}
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from back.services.rate_limit import DatabaseBucketStore, MemoryBucketStore, RateLimited, TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _limiter(store, clock, *, max_wait=0.0, global_capacity=10, user_capacity=2):
+    return TokenBucketLimiter(
+        store,
+        name="test",
+        global_capacity=global_capacity,
+        global_per_minute=60,
+        user_capacity=user_capacity,
+        user_per_minute=60,
+        max_wait=max_wait,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+
+def test_limiter_rejects_user_over_burst_without_touching_other_users():
+    clock = FakeClock()
+    limiter = _limiter(MemoryBucketStore(), clock)
+
+    limiter.acquire(user_id=1)
+    limiter.acquire(user_id=1)
+    with pytest.raises(RateLimited) as exc:
+        limiter.acquire(user_id=1)
+
+    assert exc.value.scope == "user"
+    assert exc.value.retry_after == pytest.approx(1.0)
+    limiter.acquire(user_id=2)
+
+
+def test_limiter_global_bucket_is_shared_by_all_users():
+    clock = FakeClock()
+    limiter = _limiter(MemoryBucketStore(), clock, global_capacity=3)
+
+    for user_id in (1, 2, 3):
+        limiter.acquire(user_id=user_id)
+    with pytest.raises(RateLimited) as exc:
+        limiter.acquire(user_id=4)
+
+    assert exc.value.scope == "global"
+
+
+def test_limiter_rejected_call_does_not_spend_user_token():
+    clock = FakeClock()
+    store = MemoryBucketStore()
+    limiter = _limiter(store, clock, global_capacity=1)
+
+    limiter.acquire(user_id=1)
+    with pytest.raises(RateLimited):
+        limiter.acquire(user_id=2)
+
+    assert store.take([limiter._specs(2)[1]], clock.now) == (0.0, None)
+    assert limiter.get_stats()["rejected_global"] == 1
+
+
+def test_limiter_queues_briefly_until_token_refills():
+    clock = FakeClock()
+    limiter = _limiter(MemoryBucketStore(), clock, max_wait=2.0, user_capacity=1)
+
+    limiter.acquire(user_id=1)
+    limiter.acquire(user_id=1)
+
+    assert clock.slept == [pytest.approx(1.0)]
+    assert limiter.get_stats()["queued"] == 1
+
+
+def test_database_store_shares_buckets_between_limiters(session_factory):
+    clock = FakeClock()
+    first = _limiter(DatabaseBucketStore(session_factory), clock, global_capacity=3)
+    second = _limiter(DatabaseBucketStore(session_factory), clock, global_capacity=3)
+
+    first.acquire(user_id=1)
+    second.acquire(user_id=2)
+    first.acquire(user_id=3)
+    with pytest.raises(RateLimited):
+        second.acquire(user_id=4)
+
+    clock.now += 1
+    second.acquire(user_id=4)
+
+
+def test_database_store_does_not_overspend_under_concurrency(session_factory):
+    store = DatabaseBucketStore(session_factory)
+    limiter = TokenBucketLimiter(
+        store, name="race", global_capacity=5, global_per_minute=0.0001,
+        user_capacity=100, user_per_minute=60, max_wait=0,
+    )
+    granted = []
+
+    def worker():
+        for _ in range(5):
+            try:
+                limiter.acquire()
+                granted.append(1)
+            except RateLimited:
+                pass
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(granted) <= 5
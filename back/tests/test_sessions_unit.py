@@ -1,6 +1,10 @@
 from datetime import datetime, timedelta
 from types import SimpleNamespace
 
+from jose import jwt
+
+from back.models.user import UserRole
+from back.services.auth import ALGORITHM, SECRET_KEY
 from back.services.sessions import SessionService, _hash_token
 
 
@@ -52,6 +56,9 @@ class FakeDB:
     def query(self, model):
         return FakeQuery(self.user)
 
+    def add(self, obj):
+        self.added = getattr(self, "added", []) + [obj]
+
 
 def test_hash_token_is_deterministic():
     value = "abc"
@@ -61,7 +68,7 @@ def test_hash_token_is_deterministic():
 def test_issue_tokens_returns_access_and_refresh():
     repo = FakeRepo()
     service = SessionService(repo)
-    user = SimpleNamespace(id=1, username="testuser")
+    user = SimpleNamespace(id=1, username="testuser", role=UserRole.user, token_version=0)
     db = FakeDB(user)
 
     tokens = service.issue_tokens(db, user)
@@ -71,6 +78,12 @@ def test_issue_tokens_returns_access_and_refresh():
     assert tokens["token_type"] == "bearer"
     assert len(repo.created) == 1
 
+    claims = jwt.decode(tokens["access_token"], SECRET_KEY, algorithms=[ALGORITHM])
+    assert claims["uid"] == 1
+    assert claims["role"] == "user"
+    assert claims["ver"] == 0
+    assert claims["sid"] == repo.created[0].jti
+
 
 def test_logout_with_invalid_token_does_not_crash():
     repo = FakeRepo()
@@ -85,10 +98,64 @@ def test_logout_with_invalid_token_does_not_crash():
 def test_logout_all_sessions_revokes_user_tokens():
     repo = FakeRepo()
     service = SessionService(repo)
-    user = SimpleNamespace(id=5, username="testuser")
+    user = SimpleNamespace(id=5, username="testuser", role=UserRole.user, token_version=0)
     db = FakeDB(user)
 
     tokens = service.issue_tokens(db, user)
     service.logout(db, tokens["refresh_token"], all_sessions=True)
 
-    assert repo.revoked_all_for_user == [5]
\ No newline at end of file
+    assert repo.revoked_all_for_user == [5]
+    assert user.token_version == 1
+
+def test_revocation_set_picks_up_other_processes_on_refresh_interval(db_session, user):
+    from back.services import token_revocation
+
+    now = [0.0]
+    revocations = token_revocation.RevocationSet(refresh_interval=5, clock=lambda: now[0])
+    assert revocations.is_revoked(user_id=user.id, version=0, sid="s1") is False
+
+    # Запись другого процесса: видна только после следующего обновления набора.
+    token_revocation.revoke_user_tokens(db_session, user)
+    token_revocation.revoke_session(db_session, user.id, "s1")
+    db_session.commit()
+
+    now[0] = 4
+    assert revocations.is_revoked(user_id=user.id, version=0, sid=None) is False
+
+    now[0] = 5
+    assert revocations.is_revoked(user_id=user.id, version=0, sid=None) is True
+    assert revocations.is_revoked(user_id=user.id, version=1, sid=None) is False
+    assert revocations.is_revoked(user_id=user.id, version=1, sid="s1") is True
+    assert revocations.get_stats()["loaded"] == 2
+
+
+def test_token_sweeper_deletes_in_bounded_batches(db_session, user, session_factory, monkeypatch):
+    from back.models.refresh_token import RefreshToken
+    from back.services import token_sweeper
+
+    monkeypatch.setattr(token_sweeper, "SessionLocal", session_factory)
+    monkeypatch.setattr(token_sweeper, "TOKEN_SWEEP_BATCH", 1)
+
+    now = datetime.utcnow()
+    rows = {
+        "expired": dict(expires_at=now - timedelta(days=1)),
+        "expired-2": dict(expires_at=now - timedelta(days=1)),
+        "revoked-old": dict(expires_at=now + timedelta(days=1), revoked=True, created_at=now - timedelta(days=3)),
+        "revoked-new": dict(expires_at=now + timedelta(days=1), revoked=True),
+        "active": dict(expires_at=now + timedelta(days=1)),
+    }
+    for jti, fields in rows.items():
+        db_session.add(RefreshToken(jti=jti, token_hash="h", user_id=user.id, **fields))
+    db_session.commit()
+
+    first = token_sweeper.sweep_once(max_batches=2)
+    assert first["refresh_tokens_deleted"] == 2
+    assert first["backlog"] is True
+
+    second = token_sweeper.sweep_once(max_batches=10)
+    assert second["refresh_tokens_deleted"] == 1
+    assert second["backlog"] is False
+
+    left = {jti for (jti,) in db_session.query(RefreshToken.jti)}
+    assert left == {"revoked-new", "active"}
+    assert token_sweeper.get_stats()["refresh_tokens_deleted"] >= 3
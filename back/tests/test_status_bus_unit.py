@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+from back.routers.events import _flush_progress, _status_message
+from back.services.status_bus import LocalBackend, StatusBus
+
+
+def test_local_bus_delivers_to_matching_user_only():
+    bus = StatusBus(LocalBackend())
+
+    async def scenario():
+        mine = bus.subscribe(1)
+        other = bus.subscribe(2)
+
+        thread = threading.Thread(
+            target=bus.publish, args=({"user_id": 1, "upload_id": 10, "status": "done"},)
+        )
+        thread.start()
+        thread.join()
+
+        received = await mine.get(timeout=1)
+        nothing = await other.get(timeout=0.05)
+
+        bus.unsubscribe(mine)
+        bus.unsubscribe(other)
+        return received, nothing
+
+    received, nothing = asyncio.run(scenario())
+
+    assert received == {"user_id": 1, "upload_id": 10, "status": "done"}
+    assert nothing is None
+    assert bus.get_stats()["subscribers"] == 0
+
+
+def test_full_queue_drops_events_instead_of_blocking(monkeypatch):
+    import back.services.status_bus as status_bus
+
+    monkeypatch.setattr(status_bus, "STATUS_BUS_QUEUE_SIZE", 1)
+    bus = StatusBus(LocalBackend())
+
+    async def scenario():
+        sub = bus.subscribe(1)
+        for status in ("uploaded", "generating", "done"):
+            bus.publish({"user_id": 1, "upload_id": 1, "status": status})
+        await asyncio.sleep(0)
+        first = await sub.get(timeout=1)
+        bus.unsubscribe(sub)
+        return first
+
+    assert asyncio.run(scenario())["status"] == "uploaded"
+    assert bus.get_stats()["dropped"] == 2
+
+
+def test_status_message_skips_unchanged_and_marks_final():
+    last = {}
+
+    assert '"status_update"' in _status_message(last, 1, "generating")
+    assert _status_message(last, 1, "generating") is None
+    assert '"final"' in _status_message(last, 1, "done")
+
+
+def test_progress_events_are_coalesced_per_upload():
+    bus = StatusBus(LocalBackend())
+
+    async def scenario():
+        sub = bus.subscribe(1)
+        for tokens in (1, 2, 3):
+            bus.publish({"user_id": 1, "upload_id": 5, "status": "generating", "progress": {"tokens": tokens}})
+        bus.publish({"user_id": 1, "upload_id": 5, "status": "done"})
+        await asyncio.sleep(0)
+        events = [await sub.get(timeout=1), await sub.get(timeout=1), await sub.get(timeout=0.05)]
+        bus.unsubscribe(sub)
+        return events
+
+    progress, final, nothing = asyncio.run(scenario())
+
+    assert progress["progress"] == {"tokens": 3}
+    assert final["status"] == "done"
+    assert nothing is None
+    assert bus.get_stats()["coalesced"] == 2
+
+
+def test_flush_progress_rate_limits_each_upload(monkeypatch):
+    import back.routers.events as events
+
+    monkeypatch.setattr(events, "SSE_PROGRESS_INTERVAL", 1.0)
+    pending = {1: {"status": "generating", "progress": {"tokens": 5}}}
+    sent = {}
+
+    assert len(_flush_progress(pending, sent, now=10.0)) == 1
+
+    pending[1] = {"status": "generating", "progress": {"tokens": 9}}
+    assert _flush_progress(pending, sent, now=10.5) == []
+    assert events._next_flush_in(pending, sent, now=10.5) == 0.5
+
+    messages = _flush_progress(pending, sent, now=11.0)
+    assert '"tokens": 9' in messages[0]
+    assert pending == {}
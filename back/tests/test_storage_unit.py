@@ -0,0 +1,96 @@
+from back.services import storage
+
+
+class FakeClient:
+    def __init__(self):
+        self.head_calls = 0
+
+    def head_bucket(self, Bucket):
+        self.head_calls += 1
+
+
+def test_s3_client_is_shared(monkeypatch):
+    storage.reset_s3_client()
+    built = []
+    monkeypatch.setattr(storage, "build_s3_client", lambda: built.append(1) or object())
+
+    first = storage.get_s3_client()
+    second = storage.get_s3_client()
+
+    assert first is second
+    assert built == [1]
+    storage.reset_s3_client()
+
+
+def test_ensure_bucket_checks_only_once(monkeypatch):
+    storage.reset_s3_client()
+    client = FakeClient()
+    monkeypatch.setattr(storage, "build_s3_client", lambda: client)
+
+    storage.ensure_bucket()
+    storage.ensure_bucket()
+
+    assert client.head_calls == 1
+    storage.reset_s3_client()
+
+
+class FakeMultipartClient:
+    def __init__(self):
+        self.calls = []
+
+    def create_multipart_upload(self, **kwargs):
+        self.calls.append(("create", kwargs["Key"]))
+        return {"UploadId": "up-1"}
+
+    def upload_part(self, **kwargs):
+        self.calls.append(("part", kwargs["PartNumber"], len(kwargs["Body"])))
+        return {"ETag": f"etag-{kwargs['PartNumber']}"}
+
+    def complete_multipart_upload(self, **kwargs):
+        self.calls.append(("complete", [p["PartNumber"] for p in kwargs["MultipartUpload"]["Parts"]]))
+
+    def abort_multipart_upload(self, **kwargs):
+        self.calls.append(("abort", kwargs["UploadId"]))
+
+    def put_object(self, **kwargs):
+        self.calls.append(("put", len(kwargs["Body"])))
+
+
+def test_multipart_writer_uploads_fixed_size_parts(monkeypatch):
+    client = FakeMultipartClient()
+    monkeypatch.setattr(storage, "get_s3_client", lambda: client)
+
+    writer = storage.S3MultipartWriter("user_1/a.pdf", "application/pdf", part_size=4)
+    for chunk in (b"abc", b"defgh", b"ij"):
+        writer.write(chunk)
+    writer.complete()
+
+    assert client.calls == [
+        ("create", "user_1/a.pdf"),
+        ("part", 1, 4),
+        ("part", 2, 4),
+        ("part", 3, 2),
+        ("complete", [1, 2, 3]),
+    ]
+
+
+def test_multipart_writer_small_file_uses_put_object(monkeypatch):
+    client = FakeMultipartClient()
+    monkeypatch.setattr(storage, "get_s3_client", lambda: client)
+
+    writer = storage.S3MultipartWriter("user_1/a.pdf", "application/pdf", part_size=4)
+    writer.write(b"abc")
+    writer.complete()
+
+    assert client.calls == [("put", 3)]
+
+
+def test_multipart_writer_abort(monkeypatch):
+    client = FakeMultipartClient()
+    monkeypatch.setattr(storage, "get_s3_client", lambda: client)
+
+    writer = storage.S3MultipartWriter("user_1/a.pdf", "application/pdf", part_size=4)
+    writer.write(b"abcdef")
+    writer.abort()
+
+    assert client.calls[-1] == ("abort", "up-1")
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from back.benchmarks.sample_pdf import make_text_pdf
+from back.models.page_text import PageText
+from back.models.upload import Upload, UploadStatus
+from back.services import text_cache
+
+PDF = make_text_pdf(["first page", "", "third page"])
+
+
+def _make_upload(db_session, user, key, digest=None):
+    upload = Upload(
+        user_id=user.id,
+        filename="doc.pdf",
+        title=key,
+        object_key=key,
+        content_type="application/pdf",
+        size=len(PDF),
+        content_hash=digest,
+        timestamp=datetime.utcnow(),
+        status=UploadStatus.uploaded,
+    )
+    db_session.add(upload)
+    db_session.commit()
+    db_session.refresh(upload)
+    return upload
+
+
+def _counting_download(monkeypatch):
+    calls = []
+
+    def fake_download(object_key):
+        calls.append(object_key)
+        return PDF
+
+    monkeypatch.setattr(text_cache, "download_bytes", fake_download)
+    return calls
+
+
+def test_miss_extracts_once_then_serves_from_db(db_session, user, monkeypatch):
+    calls = _counting_download(monkeypatch)
+    upload = _make_upload(db_session, user, "user_1/a.pdf")
+
+    first = text_cache.get_pages(db_session, upload)
+    second = text_cache.get_pages(db_session, upload)
+
+    assert first == second == ["first page", "", "third page"]
+    assert calls == ["user_1/a.pdf"]
+    assert upload.content_hash == text_cache.content_hash(PDF)
+
+
+def test_max_pages_and_text_join(db_session, user, monkeypatch):
+    _counting_download(monkeypatch)
+    upload = _make_upload(db_session, user, "user_1/a.pdf")
+
+    assert text_cache.get_pages(db_session, upload, max_pages=1) == ["first page"]
+    assert text_cache.get_text(db_session, upload) == "first page\n\nthird page"
+
+
+def test_pages_are_shared_by_content_hash(db_session, user, monkeypatch):
+    calls = _counting_download(monkeypatch)
+    digest = text_cache.content_hash(PDF)
+    first = _make_upload(db_session, user, "user_1/a.pdf", digest)
+    second = _make_upload(db_session, user, "user_1/b.pdf", digest)
+
+    text_cache.get_pages(db_session, first)
+    text_cache.get_pages(db_session, second)
+
+    assert calls == ["user_1/a.pdf"]
+    assert db_session.query(PageText).count() == 3
+
+
+def test_warm_fills_cache_without_download(db_session, user, monkeypatch):
+    calls = _counting_download(monkeypatch)
+    upload = _make_upload(db_session, user, "user_1/a.pdf", text_cache.content_hash(PDF))
+
+    text_cache.warm(upload.id, PDF)
+
+    assert calls == []
+    assert text_cache.load_pages(db_session, upload.content_hash) == ["first page", "", "third page"]
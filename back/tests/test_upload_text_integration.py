@@ -0,0 +1,94 @@
+import json
+from datetime import datetime
+
+from back.benchmarks.sample_pdf import make_text_pdf
+from back.models.upload import Upload, UploadStatus
+from back.services import text_cache
+
+PDF = make_text_pdf([f"Page {i + 1}" for i in range(5)])
+
+
+def _make_upload(db_session, user):
+    upload = Upload(
+        user_id=user.id,
+        filename="book.pdf",
+        title="book",
+        object_key="user_1/book.pdf",
+        content_type="application/pdf",
+        size=len(PDF),
+        timestamp=datetime.utcnow(),
+        status=UploadStatus.uploaded,
+    )
+    db_session.add(upload)
+    db_session.commit()
+    db_session.refresh(upload)
+    return upload
+
+
+def test_text_full_document(client, user, db_session, monkeypatch):
+    monkeypatch.setattr(text_cache, "download_bytes", lambda key: PDF)
+    upload = _make_upload(db_session, user)
+
+    response = client.get(f"/uploads/{upload.id}/text", headers={"Authorization": _get_auth_header(client)})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["text"] == "\n\n".join(f"Page {i + 1}" for i in range(5))
+    assert data["title"] == "book"
+
+
+def test_text_page_range_is_served_from_cache(client, user, db_session, monkeypatch):
+    monkeypatch.setattr(text_cache, "download_bytes", lambda key: PDF)
+    upload = _make_upload(db_session, user)
+    text_cache.warm(upload.id)
+    monkeypatch.setattr(text_cache, "download_bytes", lambda key: (_ for _ in ()).throw(AssertionError("S3 GET")))
+
+    response = client.get(
+        f"/uploads/{upload.id}/text?from_page=2&to_page=3",
+        headers={"Authorization": _get_auth_header(client)},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["text"] == "Page 2\n\nPage 3"
+    assert data["page_count"] == 5
+
+
+def test_text_ndjson_stream(client, user, db_session, monkeypatch):
+    monkeypatch.setattr(text_cache, "download_bytes", lambda key: PDF)
+    upload = _make_upload(db_session, user)
+
+    response = client.get(
+        f"/uploads/{upload.id}/text?from_page=4&stream=true",
+        headers={"Authorization": _get_auth_header(client)},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["id"] == upload.id
+    assert lines[1:] == [{"page": 4, "text": "Page 4"}, {"page": 5, "text": "Page 5"}]
+
+
+def test_text_invalid_range(client, user, db_session):
+    upload = _make_upload(db_session, user)
+
+    response = client.get(
+        f"/uploads/{upload.id}/text?from_page=3&to_page=2",
+        headers={"Authorization": _get_auth_header(client)},
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Некорректный диапазон страниц"
+
+
+def _get_auth_header(client):
+    login_response = client.post(
+        "/auth/login",
+        json={
+            "username": "testuser",
+            "password": "123456",
+        },
+    )
+    token = login_response.json()["access_token"]
+    return f"Bearer {token}"
@@ -1,11 +1,34 @@
 from io import BytesIO
 
 
+class FakeWriter:
+    instances = []
+
+    def __init__(self, object_key, content_type, part_size=None):
+        self.object_key = object_key
+        self.data = b""
+        self.completed = False
+        self.aborted = False
+        FakeWriter.instances.append(self)
+
+    def write(self, chunk):
+        self.data += chunk
+
+    def complete(self):
+        self.completed = True
+
+    def abort(self):
+        self.aborted = True
+
+
 def test_upload_pdf_success(client, user, monkeypatch):
     import back.routers.upload as upload_router
 
+    import back.services.text_cache as text_cache
+
     monkeypatch.setattr(upload_router, "ensure_bucket", lambda: None)
-    monkeypatch.setattr(upload_router, "upload_bytes", lambda data, object_key, content_type: None)
+    monkeypatch.setattr(upload_router, "S3MultipartWriter", FakeWriter)
+    monkeypatch.setattr(text_cache, "download_bytes", lambda object_key: fake_pdf)
 
     fake_pdf = b"%PDF-1.4 test pdf content"
 
@@ -19,6 +42,9 @@ def test_upload_pdf_success(client, user, monkeypatch):
     data = response.json()
     assert "id" in data
     assert data["filename"] == "test.pdf"
+    assert data["size"] == len(fake_pdf)
+    assert FakeWriter.instances[-1].data == fake_pdf
+    assert FakeWriter.instances[-1].completed
 
 
 def test_upload_non_pdf_fails(client, user, monkeypatch):
@@ -71,13 +97,46 @@ def test_upload_too_large_pdf_fails(client, user, monkeypatch):
     assert data["detail"] == "Файл превышает 10 МБ"
 
 
+def test_upload_limit_is_enforced_while_streaming(monkeypatch):
+    import asyncio
+
+    import pytest
+    from fastapi import HTTPException
+
+    import back.routers.upload as upload_router
+
+    class ChunkedFile:
+        content_type = "application/pdf"
+
+        def __init__(self, data):
+            self.data = data
+            self.reads = 0
+
+        async def read(self, size):
+            self.reads += 1
+            chunk, self.data = self.data[:size], self.data[size:]
+            return chunk
+
+    monkeypatch.setattr(upload_router, "S3MultipartWriter", FakeWriter)
+    monkeypatch.setattr(upload_router, "MAX_FILE_SIZE", 10)
+    monkeypatch.setattr(upload_router, "UPLOAD_CHUNK_SIZE", 4)
+    file = ChunkedFile(b"x" * 40)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(upload_router._stream_to_storage(file, "user_1/big.pdf"))
+
+    assert exc.value.status_code == 400
+    assert file.reads == 3
+    assert len(FakeWriter.instances[-1].data) == 8
+    assert FakeWriter.instances[-1].aborted
+
+
 def test_delete_upload_success(client, user, db_session, monkeypatch):
     import back.routers.upload as upload_router
     import back.routers.uploads as uploads_router
     from back.models.upload import Upload
 
     monkeypatch.setattr(upload_router, "ensure_bucket", lambda: None)
-    monkeypatch.setattr(upload_router, "upload_bytes", lambda data, object_key, content_type: None)
     monkeypatch.setattr(uploads_router, "delete_object", lambda object_key: None)
 
     upload = Upload(
@@ -102,6 +161,115 @@ def test_delete_upload_success(client, user, db_session, monkeypatch):
     assert data["message"] == "Файл удалён"
 
 
+def test_duplicate_upload_shares_stored_object(client, user, db_session, monkeypatch):
+    import back.routers.upload as upload_router
+    import back.routers.uploads as uploads_router
+    import back.services.text_cache as text_cache
+    from back.models.stored_object import StoredObject
+    from back.models.upload import Upload
+
+    fake_pdf = b"%PDF-1.4 same content"
+    removed = []
+    monkeypatch.setattr(upload_router, "ensure_bucket", lambda: None)
+    monkeypatch.setattr(upload_router, "S3MultipartWriter", FakeWriter)
+    monkeypatch.setattr(upload_router, "delete_object", removed.append)
+    monkeypatch.setattr(uploads_router, "delete_object", removed.append)
+    monkeypatch.setattr(text_cache, "download_bytes", lambda object_key: fake_pdf)
+
+    headers = {"Authorization": _get_auth_header(client)}
+    ids = []
+    for name in ("a.pdf", "b.pdf"):
+        response = client.post(
+            "/upload-pdf",
+            headers=headers,
+            files={"file": (name, BytesIO(fake_pdf), "application/pdf")},
+        )
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+
+    first, second = (db_session.get(Upload, i) for i in ids)
+    digest, shared_key = first.content_hash, first.object_key
+    assert second.object_key == shared_key
+    # Вторая копия удалена сразу после загрузки.
+    assert removed == [FakeWriter.instances[-1].object_key]
+    assert db_session.get(StoredObject, digest).ref_count == 2
+
+    assert client.delete(f"/uploads/{ids[0]}", headers=headers).status_code == 200
+    assert len(removed) == 1
+
+    assert client.delete(f"/uploads/{ids[1]}", headers=headers).status_code == 200
+    assert removed[-1] == shared_key
+    db_session.expire_all()
+    assert db_session.get(StoredObject, digest) is None
+
+
+def test_failed_upload_insert_releases_stored_object(client, user, db_session, monkeypatch):
+    import pytest
+    from sqlalchemy.exc import IntegrityError
+
+    import back.routers.upload as upload_router
+    from back.models.stored_object import StoredObject
+    from back.models.upload import Upload
+
+    fake_pdf = b"%PDF-1.4 same content"
+    removed = []
+    monkeypatch.setattr(upload_router, "ensure_bucket", lambda: None)
+    monkeypatch.setattr(upload_router, "S3MultipartWriter", FakeWriter)
+    monkeypatch.setattr(upload_router, "delete_object", removed.append)
+    monkeypatch.setattr(upload_router.text_cache, "warm", lambda upload_id: None)
+
+    headers = {"Authorization": _get_auth_header(client)}
+
+    def post(name):
+        return client.post(
+            "/upload-pdf",
+            headers=headers,
+            files={"file": (name, BytesIO(fake_pdf), "application/pdf")},
+        )
+
+    assert post("a.pdf").status_code == 200
+    digest = db_session.query(Upload).one().content_hash
+
+    # Вставка загрузки падает на NOT NULL — ссылка на объект должна откатиться вместе с ней.
+    monkeypatch.setattr(upload_router, "Upload", lambda **kw: Upload(**{**kw, "filename": None}))
+    with pytest.raises(IntegrityError):
+        post("b.pdf")
+
+    db_session.expire_all()
+    assert db_session.get(StoredObject, digest).ref_count == 1
+    assert removed == [FakeWriter.instances[-1].object_key]
+
+
+def test_duplicate_upload_gets_page_count_from_cache(client, user, db_session, monkeypatch):
+    import back.routers.upload as upload_router
+    import back.services.text_cache as text_cache
+    from back.benchmarks.sample_pdf import make_text_pdf
+    from back.models.upload import Upload
+
+    pdf = make_text_pdf(["first", "second", "third"])
+    downloads = []
+    monkeypatch.setattr(upload_router, "ensure_bucket", lambda: None)
+    monkeypatch.setattr(upload_router, "S3MultipartWriter", FakeWriter)
+    monkeypatch.setattr(upload_router, "delete_object", lambda key: None)
+    monkeypatch.setattr(text_cache, "download_bytes", lambda key: downloads.append(key) or pdf)
+
+    headers = {"Authorization": _get_auth_header(client)}
+    ids = [
+        client.post(
+            "/upload-pdf",
+            headers=headers,
+            files={"file": (name, BytesIO(pdf), "application/pdf")},
+        ).json()["id"]
+        for name in ("a.pdf", "b.pdf")
+    ]
+
+    first, second = (db_session.get(Upload, i) for i in ids)
+    assert first.page_count == 3
+    assert second.page_count == 3
+    # Второй документ не скачивался и не разбирался заново.
+    assert len(downloads) == 1
+
+
 def _get_auth_header(client):
     login_response = client.post(
         "/auth/login",
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from back.models.upload import Upload, UploadStatus
 
@@ -180,6 +180,97 @@ def test_clear_user_uploads(client, user, db_session, monkeypatch):
     assert check_data["total"] == 0
 
 
+def _add_uploads(db_session, user, count):
+    base = datetime(2024, 1, 1)
+    for i in range(count):
+        db_session.add(
+            Upload(
+                user_id=user.id,
+                filename=f"file{i}.pdf",
+                title=f"title{i % 3}",
+                object_key=f"user_1/page{i}.pdf",
+                content_type="application/pdf",
+                size=100 + i,
+                timestamp=base + timedelta(minutes=i),
+                status=UploadStatus.uploaded,
+            )
+        )
+    db_session.commit()
+
+
+def test_get_user_uploads_offset_pagination(client, user, db_session):
+    _add_uploads(db_session, user, 5)
+    headers = {"Authorization": _get_auth_header(client)}
+
+    response = client.get("/uploads/?page=2&limit=2&sort_by=timestamp&order=asc", headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["filename"] for item in data["items"]] == ["file2.pdf", "file3.pdf"]
+    assert data["total"] == 5
+    assert data["pages"] == 3
+    assert data["next_cursor"]
+
+
+def test_get_user_uploads_cursor_walks_all_rows(client, user, db_session):
+    _add_uploads(db_session, user, 7)
+    headers = {"Authorization": _get_auth_header(client)}
+
+    for sort_by, order in [("timestamp", "desc"), ("title", "asc"), ("status", "desc")]:
+        offset_ids = [
+            item["id"]
+            for item in client.get(
+                f"/uploads/?limit=100&sort_by={sort_by}&order={order}", headers=headers
+            ).json()["items"]
+        ]
+
+        seen = []
+        url = f"/uploads/?limit=3&sort_by={sort_by}&order={order}"
+        data = client.get(url, headers=headers).json()
+        seen += [item["id"] for item in data["items"]]
+        while data["next_cursor"]:
+            data = client.get(f"{url}&cursor={data['next_cursor']}", headers=headers).json()
+            assert data["total"] is None
+            seen += [item["id"] for item in data["items"]]
+
+        assert seen == offset_ids
+
+
+def test_get_user_uploads_cursor_walks_rows_with_null_sort_values(client, user, db_session):
+    _add_uploads(db_session, user, 7)
+    for u in db_session.query(Upload).filter(Upload.filename.in_(["file1.pdf", "file2.pdf", "file5.pdf"])):
+        u.timestamp = None
+    db_session.commit()
+    headers = {"Authorization": _get_auth_header(client)}
+
+    # NULL больше любого значения: в конце при asc, в начале при desc.
+    for order, expected in [("asc", [0, 3, 4, 6, 1, 2, 5]), ("desc", [5, 2, 1, 6, 4, 3, 0])]:
+        expected = [f"file{i}.pdf" for i in expected]
+        seen = []
+        url = f"/uploads/?limit=2&sort_by=timestamp&order={order}"
+        data = client.get(url, headers=headers).json()
+        seen += [item["filename"] for item in data["items"]]
+        while data["next_cursor"]:
+            response = client.get(f"{url}&cursor={data['next_cursor']}", headers=headers)
+            assert response.status_code == 200
+            data = response.json()
+            seen += [item["filename"] for item in data["items"]]
+
+        assert seen == expected
+        offset = client.get(f"/uploads/?limit=100&sort_by=timestamp&order={order}", headers=headers).json()
+        assert [item["filename"] for item in offset["items"]] == expected
+
+
+def test_get_user_uploads_rejects_foreign_cursor(client, user, db_session):
+    _add_uploads(db_session, user, 3)
+    headers = {"Authorization": _get_auth_header(client)}
+
+    cursor = client.get("/uploads/?limit=1&sort_by=title", headers=headers).json()["next_cursor"]
+
+    assert client.get(f"/uploads/?limit=1&sort_by=size&cursor={cursor}", headers=headers).status_code == 400
+    assert client.get("/uploads/?cursor=garbage", headers=headers).status_code == 400
+
+
 def _get_auth_header(client):
     login_response = client.post(
         "/auth/login",
@@ -0,0 +1,124 @@
+"""Воркер очереди генерации карточек.
+
+Запускается отдельно от API:
+
+    python -m back.worker
+
+Каждый из WORKER_CONCURRENCY обработчиков забирает задачу из таблицы
+generation_jobs, продлевает её блокировку, пока идёт генерация, и
+фиксирует результат. Раз в JOB_CANCEL_POLL_INTERVAL секунд обработчик
+проверяет, не отменили ли задачу, и обрывает генерацию. Раз в
+WORKER_RECOVERY_INTERVAL секунд воркер возвращает в очередь задачи
+упавших процессов.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import asyncio
+import logging
+import os
+
+from back.db.database import Base, engine, SessionLocal
+import back.models.user  # noqa: F401
+import back.models.refresh_token  # noqa: F401
+import back.models.upload  # noqa: F401
+import back.models.generation_job  # noqa: F401
+import back.models.generation_batch  # noqa: F401
+import back.models.page_text  # noqa: F401
+import back.models.stored_object  # noqa: F401
+import back.models.generation_cache  # noqa: F401
+import back.models.token_revocation  # noqa: F401
+import back.models.book_search_cache  # noqa: F401
+import back.models.rate_limit_bucket  # noqa: F401
+from back.services import generation_queue
+
+logger = logging.getLogger("back.worker")
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1"))
+WORKER_RECOVERY_INTERVAL = float(os.getenv("WORKER_RECOVERY_INTERVAL", "60"))
+
+
+async def _keep_alive(job_id: int):
+    interval = max(generation_queue.JOB_VISIBILITY_TIMEOUT / 3, 1)
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(generation_queue.heartbeat, job_id)
+
+
+async def _watch_cancel(job_id: int):
+    while True:
+        await asyncio.sleep(generation_queue.JOB_CANCEL_POLL_INTERVAL)
+        if await asyncio.to_thread(generation_queue.check_cancel, job_id):
+            return
+
+
+async def consumer(worker_id: int, stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            job_id = await asyncio.to_thread(generation_queue.claim_next_job)
+        except Exception:
+            logger.exception("worker %s: не удалось получить задачу", worker_id)
+            job_id = None
+
+        if job_id is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=WORKER_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        logger.info("worker %s: задача %s", worker_id, job_id)
+        keep_alive = asyncio.create_task(_keep_alive(job_id))
+        watch_cancel = asyncio.create_task(_watch_cancel(job_id))
+        try:
+            await asyncio.to_thread(generation_queue.process_job, job_id)
+        except Exception:
+            logger.exception("worker %s: задача %s завершилась с ошибкой", worker_id, job_id)
+        finally:
+            keep_alive.cancel()
+            watch_cancel.cancel()
+
+
+def _recover_once() -> dict:
+    db = SessionLocal()
+    try:
+        return generation_queue.recover(db)
+    finally:
+        db.close()
+
+
+async def recovery_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            result = await asyncio.to_thread(_recover_once)
+            if any(result.values()):
+                logger.info("recovery: %s", result)
+        except Exception:
+            logger.exception("recovery failed")
+
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=WORKER_RECOVERY_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(stop: asyncio.Event | None = None):
+    stop = stop or asyncio.Event()
+    Base.metadata.create_all(bind=engine)
+
+    tasks = [asyncio.create_task(recovery_loop(stop))]
+    tasks += [asyncio.create_task(consumer(i, stop)) for i in range(WORKER_CONCURRENCY)]
+    await asyncio.gather(*tasks)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,8 @@ import { API_URL } from "./config";
 interface StatusEvent {
   upload_id: number;
   status: 'uploaded' | 'generating' | 'done' | 'error';
-  type: 'initial' | 'status_update' | 'final' | 'error';
+  type: 'initial' | 'status_update' | 'final' | 'error' | 'progress';
+  progress?: { tokens: number; cards: number; tokens_per_second: number | null; eta_seconds: number | null };
   finished?: boolean;
   error?: string;
 }
@@ -89,8 +89,8 @@ const PdfUpload = () => {
 
       if (r.ok) {
         toast({
-          title: "Генерация завершена!",
-          description: "Перейдите в историю для просмотра",
+          title: "Генерация запущена",
+          description: "Статус обновится в истории загрузок",
           status: "info",
           duration: 5000,
           isClosable: true,
@@ -30,12 +30,20 @@ interface UploadItem {
   status: "uploaded" | "generating" | "done" | "error";
   size: number;
   content_type: string;
+  progress?: GenerationProgress;
+}
+
+interface GenerationProgress {
+  tokens: number;
+  cards: number;
+  eta_seconds: number | null;
 }
 
 interface StatusEvent {
   upload_id: number;
   status: "uploaded" | "generating" | "done" | "error";
-  type: "initial" | "status_update" | "final" | "error";
+  type: "initial" | "status_update" | "final" | "error" | "progress";
+  progress?: GenerationProgress;
 }
 
 const ITEMS_PER_PAGE = 4;
@@ -119,10 +127,12 @@ const Profile = () => {
     () => ({
       onStatusUpdate: (event: StatusEvent) => {
         setAllUploads((prev) =>
-          prev.map((upload) => (upload.id === event.upload_id ? { ...upload, status: event.status } : upload))
+          prev.map((upload) =>
+            upload.id === event.upload_id ? { ...upload, status: event.status, progress: event.progress } : upload
+          )
         );
 
-        if (event.type === "initial") return;
+        if (event.type === "initial" || event.type === "progress") return;
 
         if (event.status === "done" && event.type === "status_update") {
           if (toastIdRef.current) toast.close(toastIdRef.current);
@@ -367,7 +377,12 @@ const Profile = () => {
                     <Text fontWeight="bold" isTruncated>
                       {u.title}
                     </Text>
-                    <Badge colorScheme={status.color}>{status.label}</Badge>
+                    <Badge colorScheme={status.color}>
+                      {status.label}
+                      {u.status === "generating" && u.progress
+                        ? ` · ${u.progress.cards} карт.${u.progress.eta_seconds != null ? `, ~${Math.ceil(u.progress.eta_seconds)} с` : ""}`
+                        : ""}
+                    </Badge>
                   </HStack>
 
                   <Text fontSize="sm" color="gray.600" mb={1}>